@@ -217,3 +217,24 @@ def test_swagger_ui():
 def test_redoc_ui():
     response = client.get("/api/redoc/")
     assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_create_task_via_api_rate_limited(api_key, github_repo, settings):
+    settings.TASK_RATE_LIMIT = 1
+    data = {"prompt": "Hello, World!", "github_repo": github_repo.full_name}
+    response = client.post(
+        "/api/tasks/", data, headers={"X-Api-Key": api_key}, format="json"
+    )
+    assert response.status_code == 201
+    assert response.headers.get("Retry-After") is None
+
+    response = client.post(
+        "/api/tasks/", data, headers={"X-Api-Key": api_key}, format="json"
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert response.headers["X-RateLimit-Limit"] == "1"
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+    assert response.json()["error"] == "Rate limit exceeded"
+    assert Task.objects.count() == 1
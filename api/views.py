@@ -14,7 +14,7 @@ from rest_framework_api_key.permissions import BaseHasAPIKey
 from api.models import UserAPIKey
 from api.serializers import PromptSerializer, TaskSerializer
 from engine.models.task import Task, TaskType
-from engine.task_scheduler import SchedulerError
+from engine.task_scheduler import RateLimitExceeded, SchedulerError
 from webhooks.jwt_tools import get_installation_access_token
 from webhooks.models import GithubRepository
 
@@ -121,6 +121,18 @@ class TaskViewSet(APIView):
                 ],
                 description="The request data does not pass validation.",
             ),
+            status.HTTP_429_TOO_MANY_REQUESTS: OpenApiResponse(
+                response=inline_serializer(
+                    name="TooManyRequests",
+                    fields={
+                        "error": serializers.CharField(),
+                        "details": serializers.CharField(),
+                        "retry_after": serializers.FloatField(),
+                    },
+                ),
+                description="The user or the repository reached the rate limit. "
+                "The `Retry-After` header tells when to try again.",
+            ),
         },
         tags=["Task Creation"],
     )
@@ -174,6 +186,17 @@ class TaskViewSet(APIView):
             )
             try:
                 task.schedule()
+            except RateLimitExceeded as e:
+                task.delete()
+                return Response(
+                    {
+                        "error": "Rate limit exceeded",
+                        "details": str(e),
+                        "retry_after": e.retry_after,
+                    },
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers=e.rate_limit.headers(),
+                )
             except SchedulerError as e:
                 task.delete()
                 return Response(
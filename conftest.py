@@ -1,12 +1,18 @@
 """Global fixtures for pytest."""
 
-from unittest.mock import MagicMock, patch
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import fakeredis
 import pytest
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
 from django.conf import settings
 
 from accounts.models import PilotUser
 from engine.models.task import Task
+from engine.rate_limit import RateLimiter
+from prpilot.urls import websocket_urlpatterns
 
 
 @pytest.fixture(autouse=True)
@@ -39,6 +45,51 @@ def user():
 
 @pytest.fixture(autouse=True)
 def mock_get_channel_layer():
-    with patch("engine.channels.async_to_sync"):
-        with patch("engine.channels.get_channel_layer") as mock:
-            yield mock
+    with patch("engine.channels.get_channel_layer") as mock:
+        mock.return_value = MagicMock(group_send=AsyncMock())
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def rate_limiter():
+    limiter = RateLimiter(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+    with patch("engine.task_scheduler.RateLimiter", return_value=limiter):
+        yield limiter
+
+
+class WebsocketClient(ApplicationCommunicator):
+    """Websocket client of the ASGI application's websocket routes, without a server."""
+
+    def __init__(self, path: str, query: str = ""):
+        super().__init__(
+            URLRouter(websocket_urlpatterns),
+            {
+                "type": "websocket",
+                "path": path,
+                "query_string": query.encode("utf-8"),
+                "headers": [],
+                "subprotocols": [],
+            },
+        )
+
+    async def connect(self, timeout: float = 5):
+        await self.send_input({"type": "websocket.connect"})
+        response = await self.receive_output(timeout=timeout)
+        assert response["type"] == "websocket.accept"
+
+    async def receive_json(self, timeout: float = 5) -> dict:
+        response = await self.receive_output(timeout=timeout)
+        return json.loads(response["text"])
+
+    async def disconnect(self):
+        await self.send_input({"type": "websocket.disconnect", "code": 1000})
+        await self.wait(timeout=1)
+
+
+@pytest.fixture
+def websocket_client(settings):
+    """Connect websocket clients, over an in-memory channel layer."""
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    return WebsocketClient
@@ -1,15 +1,22 @@
+import logging
+
 import markdown
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.safestring import mark_safe
 from django.views.generic import DetailView
 from django_tables2 import SingleTableView
+from redis import RedisError
 
 from accounts.models import UserBudget
 from dashboard.tables import TaskTable, EventTable, CostItemTable, EventUndoTable
 from engine.models.task import Task
 from engine.models.task_bill import TaskBill
+from engine.task_queue import TaskQueue
+
+logger = logging.getLogger(__name__)
 
 
 class TaskListView(LoginRequiredMixin, SingleTableView):
@@ -74,6 +81,7 @@ class TaskDetailView(LoginRequiredMixin, DetailView):
         context["total_cost"] = sum([item.credits for item in task.cost_items.all()])
         context["discount_credits"] = discount_credits
         context["bill"] = bill
+        context["queue_status"] = self.queue_status(task)
         context["can_undo"] = (
             len(
                 [
@@ -86,6 +94,19 @@ class TaskDetailView(LoginRequiredMixin, DetailView):
         )
         return context
 
+    def queue_status(self, task):
+        """Position of a scheduled task in the task queue, if it is queued there."""
+        if task.status != "scheduled" or settings.JOB_STRATEGY not in (
+            "redis",
+            "warm_pool",
+        ):
+            return None
+        try:
+            return TaskQueue().status(task.id)
+        except RedisError:
+            logger.exception("Failed to look up the queue position")
+            return None
+
 
 class TaskUndoView(LoginRequiredMixin, DetailView):
     model = Task
@@ -37,6 +37,7 @@ from engine.models.task import Task
 from engine.models.task_event import TaskEvent
 from engine.project import Project
 from engine.util import replace_string_in_directory_path
+from engine.workspace import current_workspace
 
 logger = logging.getLogger(__name__)
 
@@ -87,7 +88,7 @@ Current date and time: {current_time}
 @tool
 def delete_file(path: str):
     """Delete a file from the repository."""
-    fs = FileSystem()
+    fs = FileSystem.current()
     if not fs.get_node(Path(path)):
         return f"File not found: `{path}`"
     TaskEvent.add(
@@ -96,15 +97,15 @@ def delete_file(path: str):
         target=path,
         message=f"Delete file {path}",
     )
-    FileSystem().delete_file(path)
-    Project.commit_all_changes(f"Deleted file {path}")
+    fs.delete_file(path)
+    Project.record_change([path], f"Deleted file {path}")
     return f"File deleted: `{path}`"
 
 
 @tool
 def copy_file(source: str, destination: str):
     """Copy a file from one location to another."""
-    fs = FileSystem()
+    fs = FileSystem.current()
     if not fs.get_node(Path(source)):
         return f"File not found: `{source}`"
     TaskEvent.add(
@@ -113,15 +114,15 @@ def copy_file(source: str, destination: str):
         target=source,
         message=f"Copy file {source} to {destination}",
     )
-    FileSystem().copy_file(source, destination)
-    Project.commit_all_changes(f"Copied file {source} to {destination}")
+    fs.copy_file(source, destination)
+    Project.record_change([destination], f"Copied file {source} to {destination}")
     return f"File copied from {source} to {destination}."
 
 
 @tool
 def move_file(source: str, destination: str):
     """Move a file from one location to another."""
-    fs = FileSystem()
+    fs = FileSystem.current()
     if not fs.get_node(Path(source)):
         return f"File not found: `{source}`"
     TaskEvent.add(
@@ -130,8 +131,10 @@ def move_file(source: str, destination: str):
         target=source,
         message=f"Move file {source} to {destination}",
     )
-    FileSystem().move_file(source, destination)
-    Project.commit_all_changes(f"Moved file {source} to {destination}")
+    fs.move_file(source, destination)
+    Project.record_change(
+        [source, destination], f"Moved file {source} to {destination}"
+    )
     return f"File moved from {source} to {destination}."
 
 
@@ -145,11 +148,11 @@ def write_file(
     :param commit_message: Short commit message for the change
     """
     path = path.lstrip("/")
-    file_system = FileSystem()
+    file_system = FileSystem.current()
     file_system.save(complete_entire_file_content, Path(path))
     if not commit_message:
         commit_message = f"Update {path}"
-    Project.commit_all_changes(commit_message)
+    Project.record_change([path], commit_message)
     TaskEvent.add(
         actor="assistant",
         action="write_file",
@@ -160,8 +163,11 @@ def write_file(
 
 
 @tool
-def list_directory(path: str):
-    """List the contents of a directory."""
+def list_directory(path: str, page: int = 1):
+    """List the contents of a directory.
+    :param path: Path of the directory
+    :param page: Page of the listing to return, for directories with many entries
+    """
     TaskEvent.add(
         actor="assistant",
         action="list_directory",
@@ -169,7 +175,7 @@ def list_directory(path: str):
         message=f"List directory `{path}`",
     )
     path = path.lstrip("/")
-    file_system = FileSystem()
+    file_system = FileSystem.current()
     node = file_system.get_node(Path(path))
     if not node:
         TaskEvent.add(
@@ -179,15 +185,23 @@ def list_directory(path: str):
             message=f"Directory not found `{path}`",
         )
         return f"Directory not found: `{path}`"
+    page_size = settings.MAX_LIST_DIRECTORY_ENTRIES
+    offset = (max(page, 1) - 1) * page_size
+    children, total = file_system.list_children(Path(path), offset, page_size)
     directory_content = f"Content of `{path}`:\n\n"
-    for child in sorted(node.nodes, key=lambda x: x.path):
+    for child in children:
         # Replace the root path with an empty string
-        clipped_path = str(child.path).replace(str(settings.REPO_DIR), "")
+        clipped_path = str(child.path).replace(current_workspace(), "")
         # Replace the directory path with an empty string, leaving file name untouched
         clipped_path = replace_string_in_directory_path(clipped_path, path, "").lstrip(
             "/"
         )
         directory_content += f"- {clipped_path}\n"
+    if offset + len(children) < total:
+        directory_content += (
+            f"\nShowing entries {offset + 1}-{offset + len(children)} of {total}. "
+            f"Use page={page + 1} to see more.\n"
+        )
 
     return directory_content
 
@@ -197,7 +211,7 @@ def read_files(file_paths: list[str]):
     """Read the content of the given files."""
     if len(file_paths) > settings.MAX_READ_FILES:
         return f"Too many files ({len(file_paths)}) to read. Please limit to {settings.MAX_READ_FILES} files."
-    file_system = FileSystem()
+    file_system = FileSystem.current()
     message = "Read files: \n" + ",".join(
         f"`{file_path}`\n" for file_path in file_paths
     )
@@ -271,7 +285,7 @@ def search_for_code_snippets(search_regex: str, glob: str) -> str:
     Note:
         - Do NOT use file names in the `search_regex` parameter. Use the `glob` parameter to limit the search to specific files.
     """
-    command = f"rg {shlex.quote(search_regex)} --glob {glob} {settings.REPO_DIR}"
+    command = f"rg {shlex.quote(search_regex)} --glob {glob} {shlex.quote(current_workspace())}"
     try:
         result = subprocess.run(
             command,
@@ -289,7 +303,7 @@ def search_for_code_snippets(search_regex: str, glob: str) -> str:
                 )
                 return f"No matches found for pattern `{search_regex}` in `{glob}`."
             result = result.stdout.strip()
-            root_path_replaced = result.replace(str(settings.REPO_DIR), "")
+            root_path_replaced = result.replace(current_workspace(), "")
             max_100_lines = root_path_replaced.split("\n")[:150]
             return "\n".join(max_100_lines) + "\n\n[...] (truncated too many results)"
         elif result.returncode == 1 and not result.stderr:
@@ -1,8 +1,106 @@
-from asgiref.sync import async_to_sync
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import Future, wait
+from typing import Optional
+
 from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """
+    Sends messages to channel layer groups from synchronous code.
+
+    `async_to_sync` sets up event loop machinery for every call, and the Redis channel
+    layer keeps its connection pools per event loop, so every broadcast from a worker
+    thread paid for both. The broadcaster runs one event loop in a thread of its own
+    for the whole process, so the channel layer reuses its connections.
+
+    Sending is fire-and-forget. At most `BROADCAST_MAX_PENDING` messages are in flight:
+    if Redis is slow, senders wait up to `BROADCAST_TIMEOUT_SECONDS` for one of them to
+    go out, and the message is dropped after that. Messages are sent one at a time, in
+    the order they were handed to the broadcaster.
+    """
+
+    def __init__(self, max_pending: int = None, timeout: float = None):
+        """
+        :param max_pending: Messages in flight, defaults to `BROADCAST_MAX_PENDING`
+        :param timeout: Seconds to wait for room, defaults to `BROADCAST_TIMEOUT_SECONDS`
+        """
+        self.max_pending = max_pending or settings.BROADCAST_MAX_PENDING
+        self.timeout = timeout or settings.BROADCAST_TIMEOUT_SECONDS
+        self.pending = threading.BoundedSemaphore(self.max_pending)
+        self.loop = asyncio.new_event_loop()
+        self.messages = asyncio.Queue()
+        self.last_message: Optional[Future] = None
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name="broadcaster", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.send_messages())
+
+    async def send_messages(self):
+        # One message at a time, so they reach the group in the order they were sent
+        while True:
+            channel_layer, group, data, future = await self.messages.get()
+            try:
+                await channel_layer.group_send(group, data)
+                future.set_result(None)
+            except Exception as e:
+                logger.error(f"Failed to broadcast a message to {group}", exc_info=e)
+                future.set_exception(e)
+            finally:
+                self.pending.release()
+
+    def send(self, group: str, data: dict) -> Optional[Future]:
+        """
+        Send a message to a group in the background.
+        :return: Future of the sent message, None if it was dropped
+        """
+        if not self.pending.acquire(timeout=self.timeout):
+            self.dropped += 1
+            logger.warning(
+                f"Dropped a message to {group}, {self.max_pending} messages are "
+                f"still waiting for the channel layer"
+            )
+            return None
+        future = Future()
+        # The same layer instance for the whole process, looked up in the caller's thread
+        message = (get_channel_layer(), group, data, future)
+        self.loop.call_soon_threadsafe(self.messages.put_nowait, message)
+        self.last_message = future
+        return future
+
+    def flush(self, timeout: float = None):
+        """Wait until the messages sent so far went out."""
+        if self.last_message is not None:
+            wait([self.last_message], timeout)
+
+
+_broadcaster: Optional[Broadcaster] = None
+_broadcaster_pid: Optional[int] = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster() -> Broadcaster:
+    """The broadcaster of this process."""
+    global _broadcaster, _broadcaster_pid
+    with _broadcaster_lock:
+        # Forked processes do not inherit the loop thread of their parent
+        if _broadcaster is None or _broadcaster_pid != os.getpid():
+            _broadcaster, _broadcaster_pid = Broadcaster(), os.getpid()
+            # Messages of a finished task still go out before the process exits
+            atexit.register(_broadcaster.flush, settings.BROADCAST_TIMEOUT_SECONDS)
+    return _broadcaster
 
 
 def broadcast(group: str, data: dict):
-    """Broadcast an event to a group."""
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(group, data)
+    """Broadcast an event to a group, without waiting for it to be sent."""
+    get_broadcaster().send(group, data)
@@ -0,0 +1,116 @@
+import re
+from typing import Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+HUNK_HEADER = re.compile(r"@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+class Hunk(BaseModel):
+    header: str = Field(description="Hunk header, e.g. `@@ -1,3 +1,4 @@ def main():`")
+    lines: List[str] = Field(
+        default_factory=list, description="Context, added and removed lines"
+    )
+
+
+class FileDiff(BaseModel):
+    path: str = Field(description="Path of the file after the change")
+    old_path: Optional[str] = Field(
+        default=None, description="Path of the file before it was renamed"
+    )
+    change_type: str = Field(
+        default="modified",
+        description="One of `added`, `deleted`, `modified` or `renamed`",
+    )
+    binary: bool = Field(default=False, description="Whether the file is binary")
+    additions: int = Field(default=0, description="Number of added lines")
+    deletions: int = Field(default=0, description="Number of removed lines")
+    hunks: List[Hunk] = Field(default_factory=list)
+
+    def stat(self) -> str:
+        """One line summary, like `git diff --stat`."""
+        path = f"{self.old_path} => {self.path}" if self.old_path else self.path
+        if self.binary:
+            return f"{path} ({self.change_type}, binary)"
+        return f"{path} ({self.change_type}, +{self.additions} -{self.deletions})"
+
+
+def parse_diff(lines: Iterable[str]) -> Iterator[FileDiff]:
+    """
+    Parse the output of `git diff` into one `FileDiff` per file.
+
+    Files are yielded as soon as their last hunk was read, so the whole diff is never
+    held in memory.
+    :param lines: Lines of a unified diff with git's extended headers
+    """
+    file_diff: Optional[FileDiff] = None
+    hunk: Optional[Hunk] = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("diff --git "):
+            if file_diff:
+                yield file_diff
+            # Only used if the diff has no `---`/`+++` lines, e.g. for pure renames
+            _, _, path = line.partition(" b/")
+            file_diff, hunk = FileDiff(path=path), None
+        elif file_diff is None:
+            continue
+        elif hunk is not None and line[:1] in (" ", "+", "-", "\\"):
+            hunk.lines.append(line)
+            if line.startswith("+"):
+                file_diff.additions += 1
+            elif line.startswith("-"):
+                file_diff.deletions += 1
+        elif HUNK_HEADER.match(line):
+            hunk = Hunk(header=line)
+            file_diff.hunks.append(hunk)
+        elif line.startswith("new file mode"):
+            file_diff.change_type = "added"
+        elif line.startswith("deleted file mode"):
+            file_diff.change_type = "deleted"
+        elif line.startswith("rename from "):
+            file_diff.change_type = "renamed"
+            file_diff.old_path = line.removeprefix("rename from ")
+        elif line.startswith("rename to "):
+            file_diff.path = line.removeprefix("rename to ")
+        elif line.startswith("--- ") and file_diff.change_type == "deleted":
+            file_diff.path = line[4:].removeprefix("a/")
+        elif line.startswith("+++ ") and line != "+++ /dev/null":
+            file_diff.path = line[4:].removeprefix("b/")
+        elif line.startswith("Binary files "):
+            file_diff.binary = True
+    if file_diff:
+        yield file_diff
+
+
+def summarize_diff(file_diffs: Iterable[FileDiff], max_chars: int) -> str:
+    """
+    Summarize a diff in at most `max_chars` characters.
+
+    Lists every changed file with its stats, then adds as many hunks as fit.
+    :param file_diffs: Parsed diff, e.g. from `parse_diff`
+    :param max_chars: Maximum length of the summary
+    """
+    stats, hunks, hunks_size = [], [], 0
+    for file_diff in file_diffs:
+        stats.append(file_diff.stat())
+        for hunk in file_diff.hunks:
+            text = "\n".join([f"{file_diff.path} {hunk.header}", *hunk.lines])
+            # Only keep hunks that could fit, so large diffs are never held at once
+            if hunks_size + len(text) <= max_chars:
+                hunks.append(text)
+                hunks_size += len(text)
+    summary = f"{len(stats)} files changed:\n" + "\n".join(
+        f"- {stat}" for stat in stats
+    )
+    if len(summary) > max_chars:
+        return summary[: max_chars - 4] + "\n..."
+    budget = max_chars - len(summary)
+    included = []
+    for text in hunks:
+        if len(text) + 2 <= budget:
+            included.append(text)
+            budget -= len(text) + 2
+    if included:
+        summary += "\n\n" + "\n\n".join(included)
+    return summary
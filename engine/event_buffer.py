@@ -0,0 +1,145 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# Buffer of the task running in the current context
+_event_buffer: ContextVar[Optional["TaskEventBuffer"]] = ContextVar(
+    "event_buffer", default=None
+)
+
+
+def current_event_buffer() -> Optional["TaskEventBuffer"]:
+    """Event buffer of the running task, None outside of `buffer_task_events`."""
+    return _event_buffer.get()
+
+
+class TaskEventBuffer:
+    """
+    Collects the events of a task in memory and writes them in batches.
+
+    The agent adds an event for every tool call, so writing and broadcasting each one
+    right away puts a database and a Redis round-trip on its critical path. Instead, a
+    background thread writes the buffered events with one `bulk_create` every
+    `TASK_EVENT_FLUSH_SECONDS`, or as soon as `TASK_EVENT_BUFFER_SIZE` events are
+    waiting, and then broadcasts them.
+
+    Guarantees:
+    - Events are written and broadcast in the order they were added, and an event is
+      only broadcast once it is written, so clients can always look it up.
+    - `close` writes all remaining events, also when the task failed. Events are only
+      lost if the process is killed, at most those of the last interval.
+    - If the database is unavailable, the events stay in the buffer and are written
+      with the next batch.
+    """
+
+    def __init__(self, task_id, interval: float = None, max_events: int = None):
+        """
+        :param task_id: ID of the task the events belong to
+        :param interval: Seconds between writes, defaults to `TASK_EVENT_FLUSH_SECONDS`
+        :param max_events: Number of events that trigger a write right away, defaults
+            to `TASK_EVENT_BUFFER_SIZE`
+        """
+        self.task_id = str(task_id)
+        self.interval = interval or settings.TASK_EVENT_FLUSH_SECONDS
+        self.max_events = max_events or settings.TASK_EVENT_BUFFER_SIZE
+        self.events = []
+        self.lock = threading.Lock()
+        # Only one batch is written at a time, to keep the events in order
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = threading.Event()
+        # Set each time the background thread finished writing a batch
+        self.flushed = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name=f"events-{self.task_id}", daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, event):
+        """Buffer an event, it is written and broadcast in the background."""
+        with self.lock:
+            self.events.append(event)
+            full = len(self.events) >= self.max_events
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        try:
+            while not self.closed.is_set():
+                self.wakeup.wait(self.interval)
+                self.wakeup.clear()
+                if not self.closed.is_set():
+                    # Reconnect if the database went away since the last batch
+                    close_old_connections()
+                    self.flush()
+                    self.flushed.set()
+        finally:
+            # The thread's own database connection
+            connection.close()
+
+    def flush(self) -> int:
+        """
+        Write and broadcast the buffered events.
+        :return: Number of events written
+        """
+        from engine.models.task_event import TaskEvent
+
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+            if not events:
+                return 0
+            try:
+                TaskEvent.objects.bulk_create(events)
+            except Exception:
+                logger.exception(
+                    f"Failed to write {len(events)} events of task {self.task_id}"
+                )
+                with self.lock:
+                    self.events = events + self.events
+                return 0
+            for event in events:
+                try:
+                    event.broadcast()
+                except Exception:
+                    logger.exception(f"Failed to broadcast event {event.id}")
+            return len(events)
+
+    def close(self):
+        """Stop the background thread and write the remaining events."""
+        self.closed.set()
+        self.wakeup.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.flush()
+        if self.events:
+            logger.error(
+                f"Lost {len(self.events)} events of task {self.task_id}, "
+                f"they could not be written"
+            )
+
+
+@contextmanager
+def buffer_task_events(task_id):
+    """
+    Buffer the events added in this context, see `TaskEventBuffer`. All events are
+    written when the context exits, however it exits.
+    :param task_id: ID of the task
+    """
+    buffer = TaskEventBuffer(task_id)
+    buffer.start()
+    token = _event_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _event_buffer.reset(token)
+        buffer.close()
@@ -2,7 +2,6 @@ from .file_system import FileSystem
 from .file import File
 from .directory import Directory
 
-
 __all__ = [
     "FileSystem",
     "File",
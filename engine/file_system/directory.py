@@ -7,13 +7,17 @@ logger = logging.getLogger(__name__)
 
 class Directory(FileSystemNode):
 
+    __slots__ = ("nodes",)
+
+    is_directory = True
+
+    def __init__(self, path=None, parent=None, name=None):
+        super().__init__(path, parent, name)
+        self.nodes = []
+
     def simple_dict(self, filter="") -> dict:
         """Return a simple dictionary representation of the node."""
-        files = [
-            str(child.path).replace(str(child.parent.path), "").lstrip("/")
-            for child in self.nodes
-            if child.is_file
-        ]
+        files = [child.name for child in self.nodes if child.is_file]
         if filter:
             files = [file for file in files if filter in file]
         dirs = [child.simple_dict(filter) for child in self.nodes if child.is_directory]
@@ -7,6 +7,10 @@ logger = logging.getLogger(__name__)
 
 class File(FileSystemNode):
 
+    __slots__ = ()
+
+    is_file = True
+
     @property
     def content(self) -> str:
         return self.path.read_text()
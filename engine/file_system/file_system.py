@@ -1,112 +1,412 @@
 import logging
 import os
-from fnmatch import fnmatch
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Set, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import yaml
 from django.conf import settings
+from yaml import SafeDumper
+from yaml.events import (
+    DocumentEndEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+    StreamStartEvent,
+)
+from yaml.nodes import ScalarNode
+
+from engine.workspace import current_workspace
 
 from .directory import Directory
 from .file import File
 from .file_system_node import FileSystemNode
+from .ignore import IgnoreMatcher, ScanStats
 
 logger = logging.getLogger(__name__)
 
+# Size of the chunks yielded by `FileSystem.iter_yaml`
+YAML_CHUNK_SIZE = 64 * 1024
+
+# Shared file systems, keyed by workspace root
+_instances: Dict[str, "FileSystem"] = {}
+_instances_lock = threading.Lock()
+
+
+SCANNERS = ("scandir", "pathlib")
+
+STR_TAG = "tag:yaml.org,2002:str"
+SEQ_TAG = "tag:yaml.org,2002:seq"
+MAP_TAG = "tag:yaml.org,2002:map"
+
+
+class ChunkStream:
+    """Text stream collecting what the YAML emitter writes, until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data: str):
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def drain(self) -> str:
+        text = "".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return text
+
 
 class FileSystem:
     """Utility class for file system operations."""
 
-    def __init__(self, root_directory=None):
+    def __init__(self, root_directory=None, scanner=None, scan_workers=None):
+        """
+        :param root_directory: Root of the tree, defaults to the current workspace
+        :param scanner: `scandir` or `pathlib`, defaults to `settings.FILE_SYSTEM_SCANNER`
+        :param scan_workers: Threads used by the `scandir` scanner to scan top-level
+            directories in parallel, defaults to `settings.FILE_SYSTEM_SCAN_WORKERS`
+        """
         if not root_directory:
-            root_directory = Path(settings.REPO_DIR)
-        self.root_directory = root_directory
+            root_directory = current_workspace()
+        self.root_directory = Path(root_directory)
         if not self.root_directory.exists():
             raise FileNotFoundError(
                 f"Root directory '{self.root_directory}' does not exist."
             )
-        self.root_directory = self.root_directory
-        self.tree = self._build_tree(self.root_directory)
+        self.scanner = scanner or settings.FILE_SYSTEM_SCANNER
+        if self.scanner not in SCANNERS:
+            raise ValueError(f"Invalid file system scanner: {self.scanner}")
+        self.scan_workers = scan_workers or settings.FILE_SYSTEM_SCAN_WORKERS
+        # Modification times of all scanned directories, used by `refresh`
+        self._mtimes: Dict[Path, int] = {}
+        # All nodes in the tree, keyed by their path relative to the root
+        self._index: Dict[str, FileSystemNode] = {}
+        self.ignore_matcher = IgnoreMatcher(self._read_ignore_file())
+        self.tree = self._scan()
+
+    @staticmethod
+    def current(root_directory=None) -> "FileSystem":
+        """
+        Return the shared file system of a workspace, scanning it only once.
+        :param root_directory: Workspace root, defaults to the current workspace
+        :return: FileSystem instance that is kept up to date by its mutation methods
+        """
+        key = str(root_directory or current_workspace())
+        with _instances_lock:
+            file_system = _instances.get(key)
+            if file_system is None or not file_system.root_directory.exists():
+                file_system = FileSystem(key)
+                _instances[key] = file_system
+        return file_system
+
+    @staticmethod
+    def refresh_current(root_directory=None):
+        """Refresh the shared file system of a workspace, if one was created."""
+        file_system = _instances.get(str(root_directory or current_workspace()))
+        if file_system:
+            file_system.refresh()
+
+    @staticmethod
+    def discard(root_directory=None):
+        """Forget the shared file system of a workspace, e.g. after re-cloning it."""
+        with _instances_lock:
+            _instances.pop(str(root_directory or current_workspace()), None)
 
     def yaml(self, filter="") -> str:
         """Walk through tree in-order and collect paths of all files and directories."""
-        return yaml.safe_dump(self.tree.simple_dict(filter))
-
-    @property
-    def ignore_list(self) -> Set[str]:
-        if not hasattr(self, "_ignore_list"):
-            # Create file if it doesn't exist
-            if not os.path.exists(settings.IGNORE_FILE_PATH):
-                default_ignore_content = Path(
-                    os.path.join(os.path.dirname(__file__), "default_ignore.txt")
-                ).read_text()
-                with open(settings.IGNORE_FILE_PATH, "w") as f:
-                    f.write(default_ignore_content)
-            with open(settings.IGNORE_FILE_PATH, "r") as f:
-                self._ignore_list = set(f.read().splitlines())
-        return self._ignore_list
+        return "".join(self.iter_yaml(filter))
+
+    def iter_yaml(self, filter="", node: FileSystemNode = None) -> Iterator[str]:
+        """
+        Stream the YAML representation of the tree in chunks.
+
+        The output is identical to `yaml.safe_dump(node.simple_dict(filter))`, but
+        the tree is walked lazily instead of being converted into nested dicts first.
+        :param filter: Only include files whose name contains this string
+        :param node: Directory to start from, defaults to the root
+        """
+        node = node or self.tree
+        stream = ChunkStream()
+        dumper = SafeDumper(stream)
+        dumper.emit(StreamStartEvent())
+        dumper.emit(DocumentStartEvent())
+        empty = True
+        for event in self._yaml_events(node, filter, dumper):
+            empty = False
+            dumper.emit(event)
+            if stream.size >= YAML_CHUNK_SIZE:
+                yield stream.drain()
+        if empty:
+            # Nothing matched, `simple_dict` returns None
+            yield yaml.safe_dump(None)
+            return
+        dumper.emit(DocumentEndEvent())
+        dumper.emit(StreamEndEvent())
+        yield stream.drain()
+
+    def _yaml_events(self, node: FileSystemNode, filter: str, dumper: SafeDumper):
+        """Serialization events of `node.simple_dict(filter)`, skipping empty directories."""
+
+        def scalar(value):
+            implicit = (
+                dumper.resolve(ScalarNode, value, (True, False)) == STR_TAG,
+                dumper.resolve(ScalarNode, value, (False, True)) == STR_TAG,
+            )
+            return ScalarEvent(None, STR_TAG, implicit, value)
+
+        def opening_events():
+            yield MappingStartEvent(None, MAP_TAG, True, flow_style=False)
+            yield scalar(str(node.path_relative_to_cwd))
+            yield SequenceStartEvent(None, SEQ_TAG, True, flow_style=False)
+
+        opened = False
+        for child in node.nodes:
+            if child.is_file and filter in child.name:
+                if not opened:
+                    yield from opening_events()
+                    opened = True
+                yield scalar(child.name)
+        for child in node.nodes:
+            if not child.is_directory:
+                continue
+            for event in self._yaml_events(child, filter, dumper):
+                if not opened:
+                    yield from opening_events()
+                    opened = True
+                yield event
+        if opened:
+            yield SequenceEndEvent()
+            yield MappingEndEvent()
+
+    @staticmethod
+    def _read_ignore_file() -> List[str]:
+        # Create file if it doesn't exist
+        if not os.path.exists(settings.IGNORE_FILE_PATH):
+            default_ignore_content = Path(
+                os.path.join(os.path.dirname(__file__), "default_ignore.txt")
+            ).read_text()
+            with open(settings.IGNORE_FILE_PATH, "w") as f:
+                f.write(default_ignore_content)
+        with open(settings.IGNORE_FILE_PATH, "r") as f:
+            return f.read().splitlines()
+
+    def _scan(self) -> FileSystemNode:
+        """Build the whole tree, recording statistics in `scan_stats`."""
+        start = time.perf_counter()
+        self.scan_stats = ScanStats()
+        self._index.clear()
+        tree = self._build_tree(self.root_directory)
+        self.scan_stats.seconds = time.perf_counter() - start
+        logger.info(
+            f"Scanned {self.root_directory} in {self.scan_stats.seconds:.2f}s "
+            f"({self.scan_stats.visited} paths visited, {self.scan_stats.pruned} pruned)"
+        )
+        return tree
+
+    def _load_gitignore(self, directory: Path):
+        """Add the patterns of the .gitignore file in the given directory, if any."""
+        gitignore = directory / ".gitignore"
+        if gitignore.is_file():
+            base = self._index_key(directory)
+            self.ignore_matcher.add_patterns(
+                gitignore.read_text(errors="replace").splitlines(),
+                base="" if base == "." else base,
+                source=self._index_key(gitignore),
+            )
 
     def _build_tree(self, path: Path, parent: FileSystemNode = None) -> FileSystemNode:
         """Recursively build a directory tree starting from the given path."""
+        if self.scanner == "scandir":
+            return self._build_tree_scandir(path, parent)
+        return self._build_tree_pathlib(path, parent)
+
+    def _build_tree_scandir(
+        self, path: Path, parent: FileSystemNode = None
+    ) -> FileSystemNode:
+        """
+        Build a directory tree with `os.scandir`, using the file types cached in each
+        `DirEntry` instead of a `stat` call per path. The subtrees below `path` are
+        scanned in parallel, as scanning is dominated by file system latency.
+        """
+        key = self._index_key(path)
+        if not path.is_dir():
+            node = File(path=path, parent=parent)
+            self._index[key] = node
+            return node
+        node = Directory(path=path, parent=parent)
+        self._index[key] = node
+        self._remember_mtime(path)
+        prefix = "" if key == "." else key + "/"
+        subdirectories = self._scan_directory(str(path), node, prefix, self.scan_stats)
+        if self.scan_workers > 1 and len(subdirectories) > 1:
+            with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+                for stats in executor.map(self._scan_subtree, subdirectories):
+                    self.scan_stats.visited += stats.visited
+                    self.scan_stats.pruned += stats.pruned
+        else:
+            for subdirectory in subdirectories:
+                self._scan_subtree(subdirectory, self.scan_stats)
+        return node
+
+    def _scan_subtree(
+        self, subdirectory: Tuple[str, Directory, str], stats: ScanStats = None
+    ) -> ScanStats:
+        """Scan a directory and everything below it into its (empty) node."""
+        stats = stats or ScanStats()
+        pending = [subdirectory]
+        while pending:
+            pending.extend(self._scan_directory(*pending.pop(), stats))
+        return stats
+
+    def _scan_directory(
+        self, directory: str, node: Directory, prefix: str, stats: ScanStats
+    ) -> List[Tuple[str, Directory, str]]:
+        """
+        Add the entries of a single directory to its node.
+        :return: Subdirectories that still need to be scanned
+        """
+        with os.scandir(directory) as iterator:
+            entries = list(iterator)
+        if any(entry.name == ".gitignore" and entry.is_file() for entry in entries):
+            self._load_gitignore(Path(directory))
+        subdirectories = []
+        matches = self.ignore_matcher.matches
+        pruned = 0
+        for entry in entries:
+            is_directory = entry.is_dir()
+            key = prefix + entry.name
+            if matches(key, is_directory):
+                # Ignored directories are pruned without descending into them
+                pruned += 1
+                continue
+            if is_directory:
+                child = Directory(name=entry.name, parent=node)
+                self._mtimes[Path(entry.path)] = entry.stat().st_mtime_ns
+                subdirectories.append((entry.path, child, key + "/"))
+            else:
+                child = File(name=entry.name, parent=node)
+            self._index[key] = child
+            node.nodes.append(child)
+        stats.visited += len(entries)
+        stats.pruned += pruned
+        return subdirectories
+
+    def _build_tree_pathlib(
+        self, path: Path, parent: FileSystemNode = None
+    ) -> FileSystemNode:
+        """Build a directory tree with `Path.iterdir`, one directory at a time."""
         if path.is_dir():
             node = Directory(path=path, parent=parent)
+            self._remember_mtime(path)
+            self._load_gitignore(path)
         else:
             node = File(path=path, parent=parent)
+        self._index[self._index_key(path)] = node
         for item in path.iterdir():
-            if self.should_be_ignored(item):
+            self.scan_stats.visited += 1
+            is_directory = item.is_dir()
+            if self.ignore_matcher.matches(self._index_key(item), is_directory):
+                # Ignored directories are pruned without descending into them
+                self.scan_stats.pruned += 1
                 continue
-            if item.is_dir():
-                node.nodes.append(self._build_tree(item, node))
+            if is_directory:
+                node.nodes.append(self._build_tree_pathlib(item, node))
             else:
-                node.nodes.append(File(path=item, parent=node))
+                child = File(name=item.name, parent=node)
+                self._index[self._index_key(item)] = child
+                node.nodes.append(child)
         return node
 
+    def _index_key(self, path: Path) -> str:
+        """Key of a path in the node index, e.g. `src/main.py` or `.` for the root."""
+        if path.is_absolute():
+            path = path.relative_to(self.root_directory)
+        return path.as_posix()
+
     def should_be_ignored(self, path) -> bool:
         """Check if the given path should be ignored, respecting .gitignore-style patterns."""
         if isinstance(path, str):
             path = Path(path)
-        if path.is_absolute():
-            relative_path = str(path.relative_to(settings.REPO_DIR)).rstrip("/")
-        else:
-            relative_path = str(path).rstrip("/")
-
-        # Iterate over each pattern in the ignore list
-        for pattern in self.ignore_list:
-            # Check if the pattern matches the entire directory (including subdirectories and files)
-            if (
-                relative_path.startswith(pattern.rstrip("/") + "/")
-                or relative_path == pattern
-            ):
-                return True
+        absolute_path = path if path.is_absolute() else self.root_directory / path
+        return self.ignore_matcher.is_ignored(
+            self._index_key(path), absolute_path.is_dir()
+        )
 
-            # Check both the file/directory name and the relative path against the ignore patterns
-            if fnmatch(path.name, pattern) or fnmatch(relative_path, pattern):
-                return True
-
-        return False
+    def list_children(
+        self, path: Path, offset: int = 0, limit: int = None
+    ) -> Tuple[List[FileSystemNode], int]:
+        """
+        Return one page of the children of a directory, sorted by name.
+        :param path: Path of the directory
+        :param offset: Number of children to skip
+        :param limit: Maximum number of children to return, defaults to all
+        :return: Children on the page and the total number of children
+        """
+        node = self.get_node(path)
+        if node is None:
+            raise FileNotFoundError(f"Directory '{path}' does not exist.")
+        children = sorted(node.nodes, key=lambda child: child.name)
+        end = None if limit is None else offset + limit
+        return children[offset:end], len(children)
 
-    def get_directory_tree(self) -> List[dict]:
-        """Build a directory tree from the root using the pre-built tree."""
-        return self._build_tree_dict(self.tree)
+    def get_directory_tree(
+        self, path: str = ".", depth: int = None, offset: int = 0, limit: int = None
+    ) -> List[dict]:
+        """
+        Build a directory tree in jstree format from the pre-built tree.
+        :param path: Directory to start from, defaults to the root
+        :param depth: Number of levels to include. Directories below that are
+            returned with `"children": True`, so they can be expanded on demand.
+            Defaults to all levels.
+        :param offset: Number of children of `path` to skip, sorted by name
+        :param limit: Maximum number of children of `path` to include
+        """
+        node = self.get_node(Path(path))
+        if node is None:
+            raise FileNotFoundError(f"Directory '{path}' does not exist.")
+        children = None
+        if offset or limit is not None:
+            # Pages are cut from the sorted children, so they stay stable across scans
+            children, _ = self.list_children(Path(path), offset, limit)
+        parent_path = "" if node is self.tree else node.relative_path
+        return self._build_tree_dict(node, parent_path, depth, children)
 
-    def _build_tree_dict(self, node: FileSystemNode, parent_path="") -> List[dict]:
+    def _build_tree_dict(
+        self, node: FileSystemNode, parent_path="", depth=None, children=None
+    ) -> List[dict]:
         tree = []
-        for child in node.nodes:
-            relative_path = os.path.join(parent_path, child.path.name)
+        for child in node.nodes if children is None else children:
+            relative_path = os.path.join(parent_path, child.name)
             if child.is_directory:
+                if depth is not None and depth <= 1:
+                    grandchildren = bool(child.nodes)
+                else:
+                    grandchildren = self._build_tree_dict(
+                        child,
+                        relative_path,
+                        None if depth is None else depth - 1,
+                    )
                 tree.append(
                     {
                         "id": relative_path,
-                        "text": child.path.name,
+                        "text": child.name,
                         "type": "default",
-                        "children": self._build_tree_dict(child, relative_path),
+                        "children": grandchildren,
                     }
                 )
             else:
                 tree.append(
                     {
                         "id": relative_path,
-                        "text": child.path.name,
+                        "text": child.name,
                         "type": "file",
                     }
                 )
@@ -114,37 +414,110 @@ class FileSystem:
 
     def list_files(self) -> List[Path]:
         """List all files in the tree, excluding ignored files."""
-        return self._list_files_recursive(self.tree)
+        return self._list_files_recursive(self.tree, self.root_directory)
 
-    def _list_files_recursive(self, node: FileSystemNode) -> List[Path]:
+    def _list_files_recursive(self, node: FileSystemNode, path: Path) -> List[Path]:
         files_list = []
         for child in node.nodes:
             if child.is_directory:
-                files_list.extend(self._list_files_recursive(child))
+                files_list.extend(self._list_files_recursive(child, path / child.name))
             else:
-                files_list.append(child.path)
+                files_list.append(path / child.name)
         return files_list
 
     def get_node(self, path: Path) -> Optional[FileSystemNode]:
         """Get the node at the given path."""
-        if not path.is_absolute():
-            path = self.root_directory / path
-        return self._get_node_recursive(self.tree, path)
-
-    def _get_node_recursive(
-        self, tree: FileSystemNode, path: Path
-    ) -> Optional[FileSystemNode]:
-        """Recursively get the node at the given path."""
-        if tree.path == path:
-            return tree
-        for node in tree.nodes:
-            if node.path == path:
-                return node
-            if node.is_directory:
-                result = self._get_node_recursive(node, path)
-                if result:
-                    return result
-        return None
+        try:
+            return self._index.get(self._index_key(path))
+        except ValueError:
+            # Path is outside of the root directory
+            return None
+
+    def refresh(self):
+        """
+        Pick up changes made outside of this file system (e.g. by `git checkout`).
+
+        Only directories whose modification time changed since they were scanned
+        are scanned again.
+        """
+        if not self.root_directory.exists():
+            raise FileNotFoundError(
+                f"Root directory '{self.root_directory}' does not exist."
+            )
+        rescanned = []
+        for directory in sorted(self._mtimes, key=lambda p: len(p.parts)):
+            if any(directory.is_relative_to(parent) for parent in rescanned):
+                continue
+            try:
+                changed = directory.stat().st_mtime_ns != self._mtimes[directory]
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                rescanned.append(directory)
+        for directory in rescanned:
+            self._forget_mtimes(directory)
+            if directory == self.root_directory:
+                self.tree = self._scan()
+                continue
+            self._remove_node(directory)
+            if directory.is_dir():
+                self._insert_node(directory)
+        if rescanned:
+            logger.info(f"Refreshed {len(rescanned)} directories")
+
+    def _remember_mtime(self, directory: Path):
+        self._mtimes[directory] = directory.stat().st_mtime_ns
+
+    def _forget_mtimes(self, directory: Path):
+        for path in [p for p in self._mtimes if p.is_relative_to(directory)]:
+            del self._mtimes[path]
+
+    def _remember_parent_mtimes(self, path: Path):
+        """Record the current modification time of all directories above `path`."""
+        for directory in path.parents:
+            if directory in self._mtimes:
+                self._remember_mtime(directory)
+            if directory == self.root_directory:
+                break
+
+    def _insert_node(self, absolute_path: Path) -> Optional[FileSystemNode]:
+        """Insert the node at the given path into the tree, creating parent directories."""
+        relative_path = absolute_path.relative_to(self.root_directory)
+        node = self.tree
+        current_path = self.root_directory
+        for part in relative_path.parts:
+            current_path = current_path / part
+            if self.should_be_ignored(current_path):
+                return None
+            child = self._index.get(self._index_key(current_path))
+            if child is None:
+                if current_path != absolute_path:
+                    child = Directory(path=current_path, parent=node)
+                    self._remember_mtime(current_path)
+                elif current_path.is_dir():
+                    child = self._build_tree(current_path, node)
+                else:
+                    child = File(path=current_path, parent=node)
+                self._index[self._index_key(current_path)] = child
+                node.nodes.append(child)
+            node = child
+        self._remember_parent_mtimes(absolute_path)
+        return node
+
+    def _remove_node(self, absolute_path: Path):
+        """Remove the node at the given path from the tree."""
+        node = self.get_node(absolute_path)
+        if node and node.parent:
+            node.parent.nodes.remove(node)
+            self._forget_mtimes(absolute_path)
+            self._unindex(node)
+        self._remember_parent_mtimes(absolute_path)
+
+    def _unindex(self, node: FileSystemNode):
+        """Remove a node and all of its descendants from the index."""
+        self._index.pop(node.relative_path, None)
+        for child in node.nodes:
+            self._unindex(child)
 
     def save(self, content: str, path: Path) -> FileSystemNode:
         """
@@ -160,19 +533,26 @@ class FileSystem:
             raise ValueError(f"Cannot save content to directory `{absolute_path}`.")
         absolute_path.parent.mkdir(parents=True, exist_ok=True)
         absolute_path.write_text(content)
-        self.tree = self._build_tree(self.root_directory)
-        return self.get_node(path)
+        node = self.get_node(absolute_path)
+        if node is None:
+            node = self._insert_node(absolute_path)
+        return node
 
     def create_directory(self, path):
         absolute_path = self.root_directory / path
         absolute_path.mkdir(parents=True, exist_ok=True)
+        if self.get_node(absolute_path) is None:
+            self._insert_node(absolute_path)
         logger.info(f"Directory created: {absolute_path}")
 
     def move_file(self, source, destination):
         source = self.root_directory / source
         destination = self.root_directory / destination
         destination.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_node(destination)
         source.replace(destination)
+        self._remove_node(source)
+        self._insert_node(destination)
         logger.info(f"File moved from {source} to {destination}")
 
     def copy_file(self, source, destination):
@@ -180,11 +560,14 @@ class FileSystem:
         destination = self.root_directory / destination
         destination.parent.mkdir(parents=True, exist_ok=True)
         destination.write_text(source.read_text())
+        if self.get_node(destination) is None:
+            self._insert_node(destination)
         logger.info(f"File copied from {source} to {destination}")
 
     def delete_file(self, path):
         path = self.root_directory / path
         path.unlink()
+        self._remove_node(path)
         logger.info(f"File deleted: {path}")
 
 
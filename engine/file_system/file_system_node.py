@@ -1,36 +1,66 @@
 import logging
+import sys
 from pathlib import Path
 from typing import List, Optional
 
-from django.conf import settings
-from pydantic import Field, BaseModel
-
 logger = logging.getLogger(__name__)
 
 
-class FileSystemNode(BaseModel):
-    """Represents a file in the file system."""
+class FileSystemNode:
+    """
+    Represents a file in the file system.
+
+    Nodes only store their (interned) name and parent, paths are derived from the
+    chain of parents. Whether a node is a file or a directory is decided when it is
+    created, so none of the properties touch the disk.
+    """
+
+    __slots__ = ("name", "parent", "_root_path")
+
+    is_directory = False
+    is_file = False
+    nodes = ()
 
-    path: Path = Field(description="Path of the node in the file system")
-    nodes: List["FileSystemNode"] = Field(
-        description="List of files and directories in the directory", default=[]
-    )
-    parent: Optional["FileSystemNode"] = Field(
-        description="Parent directory", default=None
-    )
+    def __init__(
+        self,
+        path: Path = None,
+        parent: Optional["FileSystemNode"] = None,
+        name: str = None,
+    ):
+        self.name = sys.intern(name if name is not None else Path(path).name)
+        self.parent = parent
+        # Only nodes without a parent need to know where they are
+        self._root_path = Path(path) if parent is None else None
+
+    def _names(self) -> List[str]:
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        names.reverse()
+        return names
 
     @property
-    def path_relative_to_cwd(self):
-        return self.path.relative_to(settings.REPO_DIR)
+    def path(self) -> Path:
+        """Path of the node in the file system."""
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return Path(node._root_path, *self._names())
 
     @property
-    def is_directory(self):
-        return self.path.is_dir()
+    def relative_path(self) -> str:
+        """Path of the node relative to the root of its tree, e.g. `src/main.py`."""
+        return "/".join(self._names()) or "."
 
     @property
-    def is_file(self):
-        return self.path.is_file()
+    def path_relative_to_cwd(self):
+        return Path(self.relative_path)
 
     def simple_dict(self, filter="") -> dict:
         """Return a simple dictionary representation of the node."""
         raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.relative_path!r})"
@@ -0,0 +1,179 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+
+class IgnorePattern(BaseModel):
+    """A single line of a .gitignore-style file, translated into a regular expression."""
+
+    regex: str = Field(description="Regular expression matching relative paths")
+    negated: bool = Field(description="Pattern re-includes paths (`!pattern`)")
+    directory_only: bool = Field(description="Pattern only matches directories")
+
+    @staticmethod
+    def parse(line: str, base: str = "") -> Optional["IgnorePattern"]:
+        """
+        Parse a line of a .gitignore-style file.
+        :param line: Line of the ignore file
+        :param base: Directory containing the ignore file, relative to the root
+        :return: IgnorePattern, or None for blank lines and comments
+        """
+        if line.endswith("\\ "):
+            line = line.rstrip() + " "
+        else:
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # Patterns containing a slash are relative to the ignore file's directory,
+        # all others match at any depth below it
+        anchored = "/" in line
+        regex = translate(line.lstrip("/"))
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        if base:
+            regex = re.escape(base.strip("/") + "/") + regex
+        return IgnorePattern(
+            regex=regex, negated=negated, directory_only=directory_only
+        )
+
+
+def translate(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression, without anchors."""
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            # Zero or more directories
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            start, end = i + 1, pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[start:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+class IgnoreMatcher:
+    """
+    Matches relative paths against .gitignore-style patterns.
+
+    All patterns are compiled into a single regular expression. Alternatives are
+    ordered from the last pattern to the first, so the first alternative that
+    matches is the one that decides, just like in git.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()):
+        # Patterns by the ignore file they come from, in the order they were added
+        self._sources: Dict[str, List[IgnorePattern]] = {}
+        self.patterns: List[IgnorePattern] = []
+        self._lock = threading.Lock()
+        # File regex, directory regex and their patterns, compiled on first use.
+        # Replaced as a whole, so matching reads it without taking the lock.
+        self._compiled: Optional[Tuple[Pattern, Pattern, List[IgnorePattern]]] = None
+        self.add_patterns(lines, source="default")
+
+    def add_patterns(self, lines: Iterable[str], base: str = "", source: str = None):
+        """
+        Add the lines of an ignore file, replacing the ones previously added from it.
+        :param lines: Lines of the ignore file
+        :param base: Directory containing the ignore file, relative to the root
+        :param source: Name of the ignore file, defaults to `base`
+        """
+        patterns = [IgnorePattern.parse(line, base) for line in lines]
+        patterns = [pattern for pattern in patterns if pattern]
+        source = base if source is None else source
+        with self._lock:
+            if not patterns and source not in self._sources:
+                return
+            self._sources[source] = patterns
+            self.patterns = [p for ps in self._sources.values() for p in ps]
+            self._compiled = None
+
+    def _compile(self, patterns: List[IgnorePattern], directory: bool) -> Pattern:
+        alternatives = [
+            f"(?P<p{i}>{pattern.regex})"
+            for i, pattern in reversed(list(enumerate(patterns)))
+            if directory or not pattern.directory_only
+        ]
+        if not alternatives:
+            # Never matches
+            return re.compile(r"(?!)")
+        return re.compile("^(?:" + "|".join(alternatives) + ")$", re.DOTALL)
+
+    def _compile_all(self) -> Tuple[Pattern, Pattern, List[IgnorePattern]]:
+        with self._lock:
+            if self._compiled is None:
+                patterns = self.patterns
+                self._compiled = (
+                    self._compile(patterns, directory=False),
+                    self._compile(patterns, directory=True),
+                    patterns,
+                )
+            return self._compiled
+
+    def matches(self, relative_path: str, is_directory: bool) -> bool:
+        """Check if the path itself is ignored, without looking at its parents."""
+        compiled = self._compiled or self._compile_all()
+        file_regex, directory_regex, patterns = compiled
+        match = (directory_regex if is_directory else file_regex).match(relative_path)
+        if not match:
+            return False
+        return not patterns[int(match.lastgroup[1:])].negated
+
+    def is_ignored(self, relative_path: str, is_directory: bool) -> bool:
+        """Check if the path or any of its parent directories is ignored."""
+        relative_path = relative_path.strip("/")
+        parts = relative_path.split("/")
+        for i in range(1, len(parts)):
+            if self.matches("/".join(parts[:i]), is_directory=True):
+                return True
+        return self.matches(relative_path, is_directory)
+
+
+@dataclass(slots=True)
+class ScanStats:
+    """Statistics of building a file system tree."""
+
+    # Number of paths visited
+    visited: int = 0
+    # Number of ignored paths skipped
+    pruned: int = 0
+    # Time spent scanning
+    seconds: float = 0.0
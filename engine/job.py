@@ -1,13 +1,15 @@
 import logging
 import os
+import subprocess
+import sys
 from pathlib import Path
 
 import yaml
+from django.conf import settings
 from jinja2 import FileSystemLoader, Environment, select_autoescape
 from kubernetes import config
 from kubernetes.client import BatchV1Api
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -55,3 +57,22 @@ class KubernetesJob:
         # Create the job
         batch_v1 = BatchV1Api()
         return batch_v1.create_namespaced_job(body=job_object, namespace="default")
+
+
+class ProcessJob:
+    """Runs a task in a new local process, the stand-in for `KubernetesJob`."""
+
+    def __init__(self, task):
+        self.task = task
+
+    def spawn(self):
+        task_id = str(self.task.id)
+        process = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), "run_task", task_id],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "TASK_ID": task_id},
+            # Keep running when the web process restarts
+            start_new_session=True,
+        )
+        logger.info(f"Process created for task {task_id}: {process.pid}")
+        return process
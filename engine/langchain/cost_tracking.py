@@ -1,7 +1,9 @@
 import logging
 import threading
 from contextlib import contextmanager
-from typing import Any, Generator
+from functools import lru_cache
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from uuid import UUID
 
 import tiktoken
 from langchain_community.callbacks.manager import openai_callback_var
@@ -19,13 +21,53 @@ from engine.models.task import Task
 logger = logging.getLogger(__name__)
 
 
+# Encoding of models tiktoken does not know
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache()
+def encoding_for_model(model_name: str) -> tiktoken.Encoding:
+    """Tokenizer of a model, loaded once per process, e.g. `o200k_base` for gpt-4o."""
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model_name)
+    except KeyError:
+        logger.warning(f"No tokenizer known for {model_name}, using {DEFAULT_ENCODING}")
+        encoding_name = DEFAULT_ENCODING
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(model_name: str, text: str) -> int:
+    return len(encoding_for_model(model_name).encode(text))
+
+
+def reported_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+    """Prompt and completion tokens the API reported for a call, if it did."""
+    message = getattr(response.generations[0][0], "message", None)
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage["input_tokens"], usage["output_tokens"]
+    usage = (response.llm_output or {}).get("token_usage")
+    if usage and "prompt_tokens" in usage:
+        return usage["prompt_tokens"], usage.get("completion_tokens", 0)
+    return None
+
+
 class CostTrackerCallback(OpenAICallbackHandler):
+    """
+    Records a `CostItem` for every LLM call of the running task.
+
+    Token counts come from the usage the API reports. Only when it does not, e.g.
+    for streamed responses, are the prompt and the completion counted with the
+    model's tokenizer.
+    """
 
     def __init__(self, model_name: str, cost_item: str) -> None:
         super().__init__()
         self.model_name = model_name
         self.cost_item = cost_item
         self._lock = threading.Lock()
+        # Prompts of the running calls, only counted if the API reports no usage
+        self._prompts: Dict[Optional[UUID], List[str]] = {}
 
     def on_llm_start(
         self,
@@ -33,53 +75,60 @@ class CostTrackerCallback(OpenAICallbackHandler):
         prompts: list[str],
         **kwargs: Any,
     ) -> None:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        prompts_string = "".join(prompts)
-        self.prompt_tokens = len(encoding.encode(prompts_string))
+        with self._lock:
+            self._prompts[kwargs.get("run_id")] = prompts
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        # Failed calls never end, forget their prompts
+        with self._lock:
+            self._prompts.pop(kwargs.get("run_id"), None)
 
     def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
         """Run when chain ends running."""
+        with self._lock:
+            prompts = self._prompts.pop(kwargs.get("run_id"), [])
         message = response.generations[0][0].message
         text_response = response.generations[0][0].text
         cost_item = self.cost_item
         if "function_call" in message.additional_kwargs:
             text_response = message.additional_kwargs["function_call"]["arguments"]
             cost_item = message.additional_kwargs["function_call"]["name"]
-        encoding = tiktoken.get_encoding("cl100k_base")
-        self.completion_tokens = len(encoding.encode(text_response))
+        usage = reported_usage(response)
+        if usage:
+            prompt_tokens, completion_tokens = usage
+        else:
+            prompt_tokens = count_tokens(self.model_name, "".join(prompts))
+            completion_tokens = count_tokens(self.model_name, text_response)
         model_name = standardize_model_name(self.model_name)
         if model_name in MODEL_COST_PER_1K_TOKENS:
             completion_cost = get_openai_token_cost_for_model(
-                model_name, self.completion_tokens, is_completion=True
-            )
-            prompt_cost = get_openai_token_cost_for_model(
-                model_name, self.prompt_tokens
+                model_name, completion_tokens, is_completion=True
             )
+            prompt_cost = get_openai_token_cost_for_model(model_name, prompt_tokens)
         else:
             raise ValueError(f"Model {model_name} not found in cost per 1k tokens")
 
         # update shared state behind lock
         with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.total_tokens += prompt_tokens + completion_tokens
             self.total_cost += prompt_cost + completion_cost
-            self.total_tokens = self.prompt_tokens + self.completion_tokens
             self.successful_requests += 1
-            CostItem.objects.create(
-                title=cost_item,
-                total_cost_usd=self.total_cost,
-                requests=self.successful_requests,
-                completion_token_count=self.completion_tokens,
-                model_name=self.model_name,
-                prompt_token_count=self.prompt_tokens,
-                task=Task.current(),
-            )
-            logger.info(
-                f"Recording cost item for {cost_item} [model={model_name}, prompt_tokens={self.prompt_tokens}, "
-                f"completion_tokens={self.completion_tokens}, cost=${self.total_cost}]"
-            )
-            self.prompt_tokens = 0
-            self.total_cost = 0
-            self.total_tokens = 0
-            self.successful_requests = 0
+        CostItem.objects.create(
+            title=cost_item,
+            total_cost_usd=prompt_cost + completion_cost,
+            requests=1,
+            completion_token_count=completion_tokens,
+            model_name=self.model_name,
+            prompt_token_count=prompt_tokens,
+            task=Task.current(),
+        )
+        logger.info(
+            f"Recording cost item for {cost_item} [model={model_name}, prompt_tokens={prompt_tokens}, "
+            f"completion_tokens={completion_tokens}, cost=${prompt_cost + completion_cost}, "
+            f"{'reported' if usage else 'counted'}]"
+        )
 
 
 @contextmanager
@@ -25,13 +25,16 @@ openai_functions = [convert_to_openai_function(LabelsAndTitle)]
 
 
 system_message = """
-You generate labels and title for a pull request based on its description.
+You generate labels and title for a pull request based on its description and changes.
 Make sure the title has an emoji and the labels are appropriate.
 
-Description: {description}"""
+Description: {description}
+
+Changes:
+{changes}"""
 prompt = PromptTemplate(
     template=system_message,
-    input_variables=["description"],
+    input_variables=["description", "changes"],
 )
 parser = JsonOutputFunctionsParser()
 model = ChatOpenAI(
@@ -42,9 +45,15 @@ model = ChatOpenAI(
 chain = prompt | model.bind(functions=openai_functions) | parser
 
 
-def generate_pr_info(pr_description: str) -> Optional[LabelsAndTitle]:
-    """Generate a PullRequestInfo object"""
-    response = chain.invoke({"description": pr_description})
+def generate_pr_info(
+    pr_description: str, changes: str = ""
+) -> Optional[LabelsAndTitle]:
+    """
+    Generate a PullRequestInfo object
+    :param pr_description: Description of the pull request
+    :param changes: Summary of the diff, see `Project.summarize_diff_to_main`
+    """
+    response = chain.invoke({"description": pr_description, "changes": changes})
     try:
         return LabelsAndTitle(**response)
     except Exception as e:
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from engine.warm_pool import ForkedWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Run a pool of task workers forked from this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, help="Number of worker processes to fork"
+        )
+
+    def handle(self, *args, **options):
+        pool = ForkedWorkerPool(processes=options["processes"])
+        pool.run()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from engine.repo_warmer import RepoWarmer
+
+
+class Command(BaseCommand):
+    help = "Keep the repo cache of a task worker fresh."
+
+    def handle(self, *args, **options):
+        warmer = RepoWarmer()
+        warmer.run()
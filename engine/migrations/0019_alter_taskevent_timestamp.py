@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 04:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("engine", "0018_alter_task_gpt_model"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="taskevent",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
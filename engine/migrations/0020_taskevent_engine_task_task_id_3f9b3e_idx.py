@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("engine", "0019_alter_taskevent_timestamp"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="taskevent",
+            index=models.Index(
+                fields=["task", "timestamp"], name="engine_task_task_id_3f9b3e_idx"
+            ),
+        ),
+    ]
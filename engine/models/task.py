@@ -1,18 +1,16 @@
 import logging
 import uuid
-from datetime import timedelta
 from enum import Enum
 from functools import lru_cache
 
-from django.conf import settings
 from django.db import models
-from django.utils import timezone
 from github import Github, GithubException
 
 from engine.task_context.github_issue import GithubIssueContext
 from engine.task_context.pr_review_comment import PRReviewCommentContext
 from engine.task_context.task_context import TaskContext
 from engine.task_scheduler import TaskScheduler
+from engine.workspace import current_task_id
 from webhooks.jwt_tools import get_installation_access_token
 
 logger = logging.getLogger(__name__)
@@ -59,15 +57,6 @@ class Task(models.Model):
     def __str__(self):
         return self.title
 
-    def would_reach_rate_limit(self):
-        """Determine if scheduling the task would hit the rate limit for the project."""
-        tasks_created_in_last_10_minutes = Task.objects.filter(
-            github_project=self.github_project,
-            created__gte=timezone.now()
-            - timedelta(minutes=settings.TASK_RATE_LIMIT_WINDOW),
-        )
-        return tasks_created_in_last_10_minutes.count() >= settings.TASK_RATE_LIMIT
-
     @property
     @lru_cache()
     def context(self) -> TaskContext:
@@ -82,14 +71,15 @@ class Task(models.Model):
 
     @staticmethod
     def current() -> "Task":
-        if not settings.TASK_ID:
+        task_id = current_task_id()
+        if not task_id:
             raise ValueError("TASK_ID is not set")
-        return Task.get(settings.TASK_ID)
+        return Task.get(task_id)
 
     @staticmethod
     @lru_cache()
     def get(task_id: str) -> "Task":
-        if not settings.TASK_ID:
+        if not task_id:
             raise ValueError("TASK_ID is not set")
         return Task.objects.get(id=task_id)
 
@@ -1,11 +1,13 @@
 import logging
 import uuid
 
-from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from github import GithubException
 
 from engine.channels import broadcast
+from engine.event_buffer import current_event_buffer
+from engine.workspace import current_task_id
 
 logger = logging.getLogger(__name__)
 
@@ -13,13 +15,18 @@ logger = logging.getLogger(__name__)
 class TaskEvent(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     task = models.ForeignKey("Task", on_delete=models.CASCADE, related_name="events")
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event is added, not when a buffered event is written
+    timestamp = models.DateTimeField(default=timezone.now)
     reversed = models.BooleanField(default=False)
     actor = models.CharField(max_length=200)
     action = models.CharField(max_length=200)
     target = models.CharField(max_length=200, blank=True, null=True)
     message = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # Event streams replay the events of a task since a cursor
+        indexes = [models.Index(fields=["task", "timestamp"])]
+
     def undo(self):
         if self.action == "create_github_issue":
             logger.info(f"Closing issue {self.target}")
@@ -97,7 +104,7 @@ class TaskEvent(models.Model):
         changes=[],
     ):
         if not task_id:
-            task_id = settings.TASK_ID
+            task_id = current_task_id()
         if not task_id:
             raise ValueError(
                 "No task ID was provided. Please set TASK_ID in the environment or pass it as an argument."
@@ -105,22 +112,28 @@ class TaskEvent(models.Model):
         new_entry = TaskEvent(
             actor=actor, action=action, target=target, message=message, task_id=task_id
         )
-        new_entry.save()
-        new_entry.broadcast()
+        buffer = current_event_buffer()
+        if buffer is not None and buffer.task_id == str(task_id):
+            # Written and broadcast in the background, in order
+            buffer.add(new_entry)
+        else:
+            new_entry.save()
+            new_entry.broadcast()
         return new_entry
 
-    def broadcast(self):
-        broadcast(
-            str(self.task_id),
-            {
-                "type": "event",
-                "data": {
-                    "id": str(self.id),
-                    "actor": self.actor,
-                    "action": self.action,
-                    "target": self.target,
-                    "message": self.message,
-                    "timestamp": self.timestamp.isoformat(),
-                },
+    def as_message(self) -> dict:
+        """The event as it is sent to the clients of the task's event stream."""
+        return {
+            "type": "event",
+            "data": {
+                "id": str(self.id),
+                "actor": self.actor,
+                "action": self.action,
+                "target": self.target,
+                "message": self.message,
+                "timestamp": self.timestamp.isoformat(),
             },
-        )
+        }
+
+    def broadcast(self):
+        broadcast(str(self.task_id), self.as_message())
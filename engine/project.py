@@ -1,6 +1,8 @@
 import logging
+import os
+import time
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 import git
 import yaml
@@ -11,12 +13,17 @@ from pydantic import Field, BaseModel, ValidationError
 from yaml.scanner import ScannerError
 
 from engine.agents.skills import AgentSkill
+from engine.diff import FileDiff, parse_diff, summarize_diff
 from engine.file_system import FileSystem
 from engine.models.task_event import TaskEvent
 from engine.models.task import Task
+from engine.repo_session import RepoSession
 
 logger = logging.getLogger(__name__)
 
+# Number of times a shallow clone is deepened before fetching its full history
+MAX_DEEPEN_STEPS = 5
+
 
 class Project(BaseModel):
     name: str = Field(description="Name of the project")
@@ -24,11 +31,8 @@ class Project(BaseModel):
 
     def caching_enabled(self):
         """Determine if caching is enabled for the repository."""
-        task = Task.current()
-        gh = task.github
-        repo: Repository = gh.get_repo(self.name)
-        # Caching is enabled if the repository is public
-        return not repo.private
+        # Private repositories are cached per installation, see RepoCache
+        return settings.REPO_CACHE_ENABLED
 
     def is_active_open_source_project(self):
         task = Task.current()
@@ -54,8 +58,10 @@ class Project(BaseModel):
 
     @staticmethod
     def commit_all_changes(message, push=False):
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.add(A=True)
+        session = RepoSession.current()
+        repo = session.repo
+        # Stage files outside of a sparse checkout too
+        repo.git.add(A=True, sparse=True)
         commit = repo.index.commit(message)
         TaskEvent.add(
             actor="assistant",
@@ -65,12 +71,57 @@ class Project(BaseModel):
         )
         if push:
             origin = repo.remote(name="origin")
-            origin.push(repo.active_branch.name, set_upstream=True)
+            origin.push(session.active_branch, set_upstream=True)
+            session.invalidate()
+
+    @staticmethod
+    def record_change(paths: List[str], message: str):
+        """
+        Commit the change of some paths, or batch it with the changes that follow.
+
+        With `COMMIT_BATCHING`, changes are committed together at the end of the
+        agent's turn, or once the oldest one is `COMMIT_BATCH_INTERVAL_SECONDS` old.
+        :param paths: Changed files or directories, relative to the repository root
+        :param message: Commit message describing the change
+        """
+        session = RepoSession.current()
+        if not session.pending_messages:
+            session.pending_since = time.monotonic()
+        session.pending_paths.update(dict.fromkeys(path.strip("/") for path in paths))
+        session.pending_messages.append(message)
+        interval = settings.COMMIT_BATCH_INTERVAL_SECONDS
+        if not settings.COMMIT_BATCHING or (
+            interval and time.monotonic() - session.pending_since >= interval
+        ):
+            Project.commit_pending_changes()
+
+    @staticmethod
+    def commit_pending_changes():
+        """Commit the changes recorded with `record_change`, staging only their paths."""
+        session = RepoSession.existing()
+        if not session or not session.pending_messages:
+            return
+        paths, messages = list(session.pending_paths), session.pending_messages
+        session.pending_paths, session.pending_messages = {}, []
+        session.stage(paths)
+        if len(messages) == 1:
+            message = messages[0]
+        else:
+            message = f"Apply {len(messages)} changes\n\n" + "\n".join(
+                f"- {message}" for message in messages
+            )
+        commit = session.repo.index.commit(message)
+        TaskEvent.add(
+            actor="assistant",
+            action="commit_changes",
+            message=message,
+            target=commit.hexsha,
+        )
 
     @staticmethod
     def commit_changes_of_file(file_path, message):
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.add(file_path)
+        repo = RepoSession.current().repo
+        repo.git.add(file_path, sparse=True)
         repo.index.commit(message)
 
     @staticmethod
@@ -82,13 +133,13 @@ class Project(BaseModel):
 
     def load_pilot_hints(self):
         """Load pilot hints from the repository"""
-        file_system = FileSystem()
+        file_system = FileSystem.current()
         node = file_system.get_node(Path(".pilot-hints.md"))
         return node.content if node else ""
 
     def load_pilot_skills(self, task, project_info) -> List[StructuredTool]:
         """Load agent skills from the repository"""
-        file_system = FileSystem()
+        file_system = FileSystem.current()
         node = file_system.get_node(Path(".pilot-skills.yaml"))
         if node:
             try:
@@ -112,54 +163,112 @@ class Project(BaseModel):
 
     def discard_all_changes(self):
         logger.info("Discarding all changes")
-        repo = git.Repo(settings.REPO_DIR)
+        repo = RepoSession.current().repo
         repo.git.reset(hard=True)
+        FileSystem.refresh_current()
 
     def fetch_remote(self):
-        repo = git.Repo(settings.REPO_DIR)
-        origin = repo.remote(name="origin")
+        session = RepoSession.current()
+        origin = session.repo.remote(name="origin")
         origin.fetch()
+        session.invalidate()
 
     def checkout_latest_default_branch(self):
         logger.info(f"Checking out latest {self.main_branch} branch")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.checkout(self.main_branch)
+        session = RepoSession.current()
+        session.git.checkout(self.main_branch)
+        session.invalidate()
+        FileSystem.refresh_current()
 
     def checkout_branch(self, branch):
         logger.info(f"Checking out branch {branch}")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.checkout(branch)
+        session = RepoSession.current()
+        session.git.checkout(branch)
+        session.invalidate()
+        FileSystem.refresh_current()
 
     def has_uncommitted_changes(self):
-        repo = git.Repo(settings.REPO_DIR)
-        return repo.is_dirty(untracked_files=True)
+        return RepoSession.current().repo.is_dirty(untracked_files=True)
 
     def create_new_branch(self, branch_name):
         logger.info(f"Creating new branch {branch_name}")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.checkout("-b", branch_name)
+        session = RepoSession.current()
+        session.git.checkout("-b", branch_name)
+        session.invalidate()
 
     def push_branch(self, branch):
         logger.info(f"Pushing branch {branch} to origin")
-        repo = git.Repo(settings.REPO_DIR)
-        origin = repo.remote(name="origin")
+        session = RepoSession.current()
+        origin = session.repo.remote(name="origin")
         origin.push(
             refspec="{}:refs/heads/{}".format(branch, branch), set_upstream=True
         )
+        session.invalidate()
 
     def delete_branch(self, branch):
         logger.info(f"Deleting branch {branch}")
-        repo = git.Repo(settings.REPO_DIR)
-        repo.git.branch("-d", branch)
+        session = RepoSession.current()
+        session.git.branch("-d", branch)
+        session.invalidate()
+
+    def deepen_to_merge_base(self, repo: git.Repo, branch: str):
+        """Fetch more history of a shallow clone until `branch` meets the main branch."""
+        if not os.path.exists(os.path.join(repo.common_dir, "shallow")):
+            return
+        for _ in range(MAX_DEEPEN_STEPS):
+            try:
+                repo.git.merge_base(self.main_branch, branch)
+                return
+            except git.GitCommandError:
+                logger.info(f"Deepening shallow clone to find merge base of {branch}")
+                repo.git.fetch("origin", deepen=settings.REPO_CLONE_DEPTH)
+        repo.git.fetch("origin", unshallow=True)
 
     def get_diff_to_main(self):
-        repo = git.Repo(settings.REPO_DIR)
-        diff = repo.git.diff(f"{self.main_branch}...{repo.active_branch.name}")
+        session = RepoSession.current()
+        self.deepen_to_merge_base(session.repo, session.active_branch)
+        diff = session.git.diff(f"{self.main_branch}...{session.active_branch}")
         return diff.strip()
 
+    def has_changes_to_main(self) -> bool:
+        """Whether the active branch changes any file, compared to the main branch."""
+        session = RepoSession.current()
+        branch = session.active_branch
+        self.deepen_to_merge_base(session.repo, branch)
+        merge_base = session.git.merge_base(self.main_branch, branch)
+        # Trees are read through the session's persistent `cat-file` process
+        return session.repo.tree(merge_base) != session.repo.tree(branch)
+
+    def iter_diff_to_main(self, branch: str = None) -> Iterator[FileDiff]:
+        """
+        Stream the changes of a branch, compared to the main branch.
+        :param branch: Branch to compare, defaults to the active one
+        """
+        session = RepoSession.current()
+        branch = branch or session.active_branch
+        self.deepen_to_merge_base(session.repo, branch)
+        process = session.git.diff(
+            f"{self.main_branch}...{branch}",
+            "--no-color",
+            "--no-ext-diff",
+            find_renames=True,
+            as_process=True,
+        )
+        lines = (line.decode("utf-8", "replace") for line in process.stdout)
+        yield from parse_diff(lines)
+        process.wait()
+
+    def summarize_diff_to_main(self, max_chars: int, branch: str = None) -> str:
+        """
+        Summarize the changes of a branch in at most `max_chars` characters.
+        :param max_chars: Maximum length of the summary
+        :param branch: Branch to summarize, defaults to the active one
+        """
+        return summarize_diff(self.iter_diff_to_main(branch), max_chars)
+
     @property
     def active_branch(self):
-        return git.Repo(settings.REPO_DIR).active_branch.name
+        return RepoSession.current().active_branch
 
     def create_pull_request(self, title, body, head, labels=[]):
         if not head:
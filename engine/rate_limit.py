@@ -0,0 +1,123 @@
+import logging
+import math
+import time
+from typing import List
+
+import redis
+from django.conf import settings
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Sliding window log: every key is a sorted set of the hits in the window, scored by
+# their time. The hit is only recorded if none of the keys is at the limit, so a
+# rejected request does not use up quota.
+# KEYS: one sorted set per limited subject, e.g. the project and the user
+# ARGV: now, window in seconds, limit, hit ID
+# Returns whether the hit was allowed, the remaining quota and the retry-after time
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local remaining = limit
+local retry_after = 0
+for i = 1, #KEYS do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    local count = redis.call('ZCARD', KEYS[i])
+    if limit - count < remaining then
+        remaining = limit - count
+    end
+    if count >= limit then
+        -- Free again once enough of the oldest hits left the window
+        local oldest = redis.call('ZRANGE', KEYS[i], count - limit, count - limit, 'WITHSCORES')
+        local wait = tonumber(oldest[2]) + window - now
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+end
+if remaining <= 0 then
+    return {0, 0, tostring(retry_after)}
+end
+for i = 1, #KEYS do
+    redis.call('ZADD', KEYS[i], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[i], math.ceil(window * 1000))
+end
+return {1, remaining - 1, '0'}
+"""
+
+
+class RateLimit(BaseModel):
+    """Outcome of a rate limited request."""
+
+    allowed: bool = Field(description="Whether the request may go ahead")
+    limit: int = Field(description="Number of requests allowed per window")
+    remaining: int = Field(description="Requests left in the current window")
+    retry_after: float = Field(
+        default=0.0, description="Seconds until the next request would be allowed"
+    )
+
+    def headers(self) -> dict:
+        """HTTP headers telling the client about its quota."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimiter:
+    """
+    Sliding window rate limiter on Redis, shared by all web and webhook processes.
+
+    Allows `TASK_RATE_LIMIT` tasks per `TASK_RATE_LIMIT_WINDOW` minutes, both per
+    project and per user. Checking and recording a task is one atomic script, so
+    concurrent webhooks cannot slip past the limit.
+    """
+
+    def __init__(self, connection: redis.Redis = None, name: str = "rate_limit"):
+        """
+        :param connection: Redis connection, defaults to `REDIS_HOST`
+        :param name: Prefix of the rate limit keys
+        """
+        self.redis = connection or redis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
+        )
+        self.name = name
+        self._hit = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def keys(self, project: str, user: str) -> List[str]:
+        return [f"{self.name}:project:{project}", f"{self.name}:user:{user}"]
+
+    def hit(self, hit_id, project: str, user: str) -> RateLimit:
+        """
+        Record a task, unless the project or the user reached the limit.
+
+        If Redis is unavailable, the task is allowed: the limiter protects the
+        service, it should not take it down.
+        :param hit_id: Unique ID of the request, e.g. the task ID
+        :param project: GitHub project the task runs on
+        :param user: GitHub user the task runs for
+        """
+        limit = settings.TASK_RATE_LIMIT
+        try:
+            allowed, remaining, retry_after = self._hit(
+                keys=self.keys(project, user),
+                args=[
+                    time.time(),
+                    settings.TASK_RATE_LIMIT_WINDOW * 60,
+                    limit,
+                    str(hit_id),
+                ],
+            )
+        except redis.RedisError:
+            logger.exception("Failed to check the rate limit, allowing the task")
+            return RateLimit(allowed=True, limit=limit, remaining=limit)
+        return RateLimit(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            retry_after=float(retry_after),
+        )
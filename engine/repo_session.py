@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+import git
+
+from engine.workspace import current_workspace
+
+logger = logging.getLogger(__name__)
+
+_sessions: Dict[str, "RepoSession"] = {}
+_sessions_lock = threading.Lock()
+
+
+class CountingGit(git.Git):
+    """Git command wrapper that counts the git processes it spawns."""
+
+    def __init__(self, working_dir=None):
+        super().__init__(working_dir)
+        self.spawn_count = 0
+
+    def execute(self, command, *args, **kwargs):
+        # Every git command, including the persistent `cat-file` processes,
+        # is started through here
+        self.spawn_count += 1
+        return super().execute(command, *args, **kwargs)
+
+
+class SessionRepo(git.Repo):
+    GitCommandWrapperType = CountingGit
+
+
+class RepoSession:
+    """
+    The git repository of a workspace, opened once per task.
+
+    All git operations of a task go through the same `git.Repo`, so its config is read
+    once and its persistent `git cat-file` processes are reused. The active branch and
+    the branch names are cached; whoever changes them must call `invalidate()`.
+    """
+
+    def __init__(self, root_directory=None):
+        self.root_directory = str(root_directory or current_workspace())
+        self.repo = SessionRepo(self.root_directory)
+        self._active_branch: Optional[str] = None
+        self._branch_names: Optional[Set[str]] = None
+        # Changes that were not committed yet, see `Project.record_change`
+        self.pending_paths: Dict[str, None] = {}
+        self.pending_messages: List[str] = []
+        self.pending_since: Optional[float] = None
+
+    @staticmethod
+    def current(root_directory=None) -> "RepoSession":
+        """
+        Return the session of a workspace, opening the repository only once.
+        :param root_directory: Workspace root, defaults to the current workspace
+        """
+        key = str(root_directory or current_workspace())
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None or not os.path.exists(key):
+                session = RepoSession(key)
+                _sessions[key] = session
+        return session
+
+    @staticmethod
+    def existing(root_directory=None) -> Optional["RepoSession"]:
+        """Return the session of a workspace, if one was opened."""
+        return _sessions.get(str(root_directory or current_workspace()))
+
+    @staticmethod
+    def discard(root_directory=None):
+        """Close the session of a workspace, e.g. before re-cloning it."""
+        with _sessions_lock:
+            session = _sessions.pop(str(root_directory or current_workspace()), None)
+        if session:
+            logger.info(
+                f"Closing git session of {session.root_directory} "
+                f"({session.spawn_count} git processes spawned)"
+            )
+            session.repo.close()
+
+    @property
+    def git(self) -> CountingGit:
+        return self.repo.git
+
+    @property
+    def spawn_count(self) -> int:
+        """Number of git processes spawned in this session."""
+        return self.repo.git.spawn_count
+
+    @property
+    def active_branch(self) -> str:
+        if self._active_branch is None:
+            self._active_branch = self.repo.active_branch.name
+        return self._active_branch
+
+    def branch_names(self) -> Set[str]:
+        """Names of all local and remote branches, without the remote prefix."""
+        if self._branch_names is None:
+            output = self.git.for_each_ref(
+                "refs/heads", "refs/remotes", format="%(refname)"
+            )
+            names = set()
+            for ref in output.splitlines():
+                if ref.startswith("refs/heads/"):
+                    names.add(ref.removeprefix("refs/heads/"))
+                elif not ref.endswith("/HEAD"):
+                    # refs/remotes/<remote>/<branch>
+                    names.add(ref.split("/", 3)[3])
+            self._branch_names = names
+        return self._branch_names
+
+    def invalidate(self):
+        """Forget the cached active branch and branches, after checkouts, fetches or pushes."""
+        self._active_branch = None
+        self._branch_names = None
+
+    def stage(self, paths: Iterable[str]):
+        """
+        Stage the changes of some paths, including deletions, like `git add -A` but
+        without scanning the rest of the working tree.
+        :param paths: Files or directories, relative to the repository root
+        """
+        paths = list(paths)
+        missing = [
+            path
+            for path in paths
+            if not os.path.lexists(os.path.join(self.root_directory, path))
+        ]
+        if missing:
+            # Paths that neither exist nor are tracked have nothing to stage, and
+            # would make `git add` fail
+            tracked = self.git.ls_files("-z", "--", *missing).split("\0")
+            paths = [
+                path
+                for path in paths
+                if path not in missing
+                or any(t == path or t.startswith(f"{path}/") for t in tracked)
+            ]
+        if not paths:
+            return
+        try:
+            # Stage files outside of a sparse checkout too
+            self.git.add("--", *paths, A=True, sparse=True)
+        except git.GitCommandError as e:
+            # Ignored paths are skipped, the others are still staged
+            if e.status != 1 or "ignored" not in str(e.stderr):
+                raise
+            logger.info(f"Not staging ignored paths: {e.stderr.strip()}")
@@ -0,0 +1,136 @@
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import List
+
+import redis
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from github import Github
+
+from engine.models.task import Task
+from engine.repo_cache import RepoCache
+from webhooks.jwt_tools import get_installation_access_token
+
+logger = logging.getLogger(__name__)
+
+# Webhooks must not wait long for a Redis that is down
+WARM_REQUEST_TIMEOUT_SECONDS = 1
+
+
+def request_warm(github_project: str, installation_id: int, private: bool):
+    """
+    Ask the cache warmers of all workers to fetch a repository, e.g. after a push.
+    :param github_project: Full name of the repository
+    :param installation_id: Installation of the GitHub App that can access it
+    :param private: Whether the repository is private
+    """
+    message = {
+        "github_project": github_project,
+        "installation_id": installation_id,
+        "private": private,
+    }
+    connection = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=0,
+        socket_timeout=WARM_REQUEST_TIMEOUT_SECONDS,
+        socket_connect_timeout=WARM_REQUEST_TIMEOUT_SECONDS,
+    )
+    try:
+        connection.publish(settings.REDIS_WARM_CHANNEL, json.dumps(message))
+    except redis.RedisError:
+        # Warming is an optimization, the push is handled all the same
+        logger.exception(f"Failed to request a cache warm-up for {github_project}")
+
+
+def busiest_projects(limit: int, days: int) -> List[dict]:
+    """
+    Find the repositories with the most tasks.
+    :param limit: Maximum number of repositories
+    :param days: Number of days to count tasks for
+    :return: `github_project`, `installation_id` and `task_count` of each repository
+    """
+    return list(
+        Task.objects.filter(created__gte=timezone.now() - timedelta(days=days))
+        .values("github_project", "installation_id")
+        .annotate(task_count=Count("id"))
+        .order_by("-task_count")[:limit]
+    )
+
+
+class RepoWarmer:
+    """
+    Keeps the repo cache of a worker fresh, so tasks start with a near no-op fetch.
+
+    Runs next to the task worker, on the same cache volume. Repositories that are
+    already cached are fetched when GitHub reports a push to them. The busiest
+    repositories are cloned or fetched periodically.
+    """
+
+    def __init__(self):
+        self.redis = redis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
+        )
+        self.next_scheduled_run = 0.0
+
+    def run(self):
+        logger.info("Running repo cache warmer")
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(settings.REDIS_WARM_CHANNEL)
+        while True:
+            if time.monotonic() >= self.next_scheduled_run:
+                self.warm_busiest_projects()
+                self.next_scheduled_run = (
+                    time.monotonic() + settings.REPO_WARM_INTERVAL_MINUTES * 60
+                )
+            message = pubsub.get_message(
+                timeout=max(self.next_scheduled_run - time.monotonic(), 0)
+            )
+            if message:
+                request = json.loads(message["data"])
+                # Pushes are announced for every repository, only refresh ours
+                self.warm(**request, clone=False)
+
+    def warm_busiest_projects(self):
+        projects = busiest_projects(
+            settings.REPO_WARM_TOP_REPOS, settings.REPO_WARM_LOOKBACK_DAYS
+        )
+        logger.info(f"Warming the repo cache for {len(projects)} busiest projects")
+        for project in projects:
+            self.warm(project["github_project"], project["installation_id"])
+
+    def warm(
+        self,
+        github_project: str,
+        installation_id: int,
+        private: bool = None,
+        clone: bool = True,
+    ):
+        """
+        Clone or fetch a repository in the cache.
+        :param github_project: Full name of the repository
+        :param installation_id: Installation of the GitHub App that can access it
+        :param private: Whether the repository is private, looked up if not known
+        :param clone: Clone the repository if it is not cached yet
+        """
+        try:
+            token = get_installation_access_token(installation_id)
+            if private is None:
+                private = Github(token).get_repo(github_project).private
+            cache = RepoCache(
+                github_project,
+                token,
+                installation_id=installation_id if private else None,
+            )
+            start = time.perf_counter()
+            if cache.warm(clone=clone):
+                logger.info(
+                    f"Warmed repo cache for {github_project} "
+                    f"in {time.perf_counter() - start:.2f}s"
+                )
+        except Exception:
+            # Never let one repository stop the warmer
+            logger.exception(f"Failed to warm repo cache for {github_project}")
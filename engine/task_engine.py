@@ -1,14 +1,14 @@
 import base64
+import contextvars
 import logging
 import os
-import shutil
+import re
 import threading
 from decimal import Decimal
 from typing import List
 
 from django.conf import settings
 from django.utils import timezone
-from git import Repo
 from github import Github
 from github.PullRequest import PullRequest
 
@@ -16,6 +16,8 @@ from accounts.models import UserBudget, PilotUser
 from engine.agents.integration_tools import integration_tools_for_user
 from engine.agents.pr_pilot_agent import create_pr_pilot_agent
 from engine.channels import broadcast
+from engine.event_buffer import buffer_task_events, current_event_buffer
+from engine.file_system import FileSystem
 from engine.langchain.generate_pr_info import generate_pr_info, LabelsAndTitle
 from engine.langchain.generate_task_title import generate_task_title
 from engine.models.cost_item import CostItem
@@ -23,10 +25,18 @@ from engine.models.task import Task, TaskType
 from engine.models.task_bill import TaskBill
 from engine.models.task_event import TaskEvent
 from engine.project import Project
-from engine.repo_cache import RepoCache
+from engine.repo_cache import RepoCache, git_credentials_env, paths_mentioned_in
+from engine.repo_session import RepoSession
 from engine.util import slugify
+from engine.workspace import (
+    current_workspace,
+    is_shared_workspace,
+    task_slot,
+    use_task,
+)
 from hub.models import PilotSkill
 from webhooks.jwt_tools import get_installation_access_token
+from webhooks.models import GithubRepository
 
 logger = logging.getLogger(__name__)
 
@@ -55,18 +65,19 @@ class TaskEngine:
             while len(slugified_basis) > MAX_BRANCH_NAME_LENGTH:
                 slugified_basis = slugified_basis[: slugified_basis.rindex("-")]
 
-        unique_branch_name = slugified_basis[:24]
-        repo = Repo(settings.REPO_DIR)
-
-        counter = 1
-        original_branch_name = unique_branch_name
-
-        while unique_branch_name in [
-            str(ref).replace("origin/", "") for ref in repo.refs
-        ]:
-            unique_branch_name = f"{original_branch_name}-{counter}"
-            counter += 1
-        return unique_branch_name
+        branch_name = slugified_basis[:24]
+        # Local refs are fresh, the workspace was fetched when it was set up
+        existing = RepoSession.current().branch_names()
+        if branch_name not in existing:
+            return branch_name
+        # Continue after the highest suffix in use
+        suffix = re.compile(rf"{re.escape(branch_name)}-(\d+)")
+        counters = [
+            int(match.group(1))
+            for match in map(suffix.fullmatch, existing)
+            if match is not None
+        ]
+        return f"{branch_name}-{max(counters, default=0) + 1}"
 
     def setup_working_branch(self, branch_name_basis: str):
         """
@@ -93,7 +104,7 @@ class TaskEngine:
                 f"Found uncommitted changes on {branch_name!r} branch! Committing..."
             )
             self.project.commit_all_changes(message="Uncommitted changes")
-        if self.project.get_diff_to_main():
+        if self.project.has_changes_to_main():
             logger.info(f"Found changes on {branch_name!r} branch. Pushing changes ...")
             self.project.push_branch(branch_name)
             TaskEvent.add(
@@ -130,6 +141,23 @@ class TaskEngine:
 
     def run(
         self, additional_knowledge=None, overwrite_pilot_skills: List[PilotSkill] = ()
+    ) -> str:
+        """
+        Run the task in its workspace, once one of the process' task slots is free.
+        :param additional_knowledge: Additional knowledge to include in the task
+        :param overwrite_pilot_skills: If non-empty, these skills will be used instead of the user-defined skills from the repo
+        :return:
+        """
+        with task_slot(), use_task(self.task.id), buffer_task_events(self.task.id):
+            try:
+                return self.run_in_workspace(
+                    additional_knowledge, overwrite_pilot_skills
+                )
+            finally:
+                self.remove_task_workspace()
+
+    def run_in_workspace(
+        self, additional_knowledge=None, overwrite_pilot_skills: List[PilotSkill] = ()
     ) -> str:
         """
         Run the task.
@@ -155,7 +183,11 @@ class TaskEngine:
             self.broadcast_status_update("failed", self.task.result)
             return self.task.result
         # Generate task title in the background
-        task_title_thread = threading.Thread(target=self.generate_task_title)
+        task_title_thread = threading.Thread(
+            # Run in this task's context, other tasks may run in the same process
+            target=contextvars.copy_context().run,
+            args=(self.generate_task_title,),
+        )
         task_title_thread.start()
         self.clone_github_repo()
 
@@ -240,12 +272,14 @@ class TaskEngine:
                     "custom_skills": custom_skills,
                 }
             )
+            # Commit the file changes of the agent's turn
+            self.project.commit_pending_changes()
             self.task.result = executor_result["output"]
             self.task.status = "completed"
             final_response = executor_result["output"]
             if working_branch and self.task.pr_number:
                 # We are working on an existing PR
-                if self.project.get_diff_to_main():
+                if self.project.has_changes_to_main():
                     logger.info(
                         f"Found changes on {working_branch!r} branch. Pushing ..."
                     )
@@ -254,7 +288,15 @@ class TaskEngine:
                 # Do not create a PR if user asked us to work on their branch
                 if not self.task.branch:
                     logger.info(f"Creating pull request for branch {working_branch}")
-                    pr_info = generate_pr_info(final_response)
+                    # Keep the prompt small, however large the response or the diff.
+                    # The default branch is checked out again, name the working branch.
+                    max_chars = settings.PR_INFO_MAX_CHARS
+                    pr_info = generate_pr_info(
+                        final_response[:max_chars],
+                        self.project.summarize_diff_to_main(
+                            max_chars, branch=working_branch
+                        ),
+                    )
                     if not pr_info:
                         pr_info = LabelsAndTitle(
                             title=self.task.title, labels=["pr-pilot"]
@@ -283,6 +325,9 @@ class TaskEngine:
             final_response = f"I'm sorry, something went wrong, please check {dashboard_link} for details."
         finally:
             self.task.save()
+            session = RepoSession.existing()
+            if session:
+                logger.info(f"Task spawned {session.spawn_count} git processes")
         self.task.context.respond_to_user(final_response.strip().replace("/pilot", ""))
         self.create_bill()
         return final_response
@@ -312,12 +357,38 @@ class TaskEngine:
         )
         budget.save()
 
-    def clone_github_repo(self):
+    def repo_cache(self) -> RepoCache:
+        """Cache of the task's repository, creating workspaces in the current one."""
+        return RepoCache(
+            self.task.github_project,
+            self.github_token,
+            installation_id=(
+                self.task.installation_id if self.github_repo.private else None
+            ),
+        )
 
-        if os.path.exists(settings.REPO_DIR):
-            logger.info("Deleting existing directory contents.")
-            shutil.rmtree(settings.REPO_DIR)
-        cache = RepoCache(self.task.github_project, self.github_token)
+    def remove_task_workspace(self):
+        """Delete the task's own workspace once it is done, REPO_DIR is reused instead."""
+        workspace = current_workspace()
+        if is_shared_workspace(workspace):
+            return
+        logger.info(f"Removing task workspace {workspace}")
+        FileSystem.discard()
+        RepoSession.discard()
+        try:
+            cache = self.repo_cache()
+            with cache.lock():
+                cache.remove_workspace()
+        except Exception as e:
+            logger.error(f"Failed to remove task workspace {workspace}", exc_info=e)
+
+    def clone_github_repo(self):
+        cache = self.repo_cache()
+        logger.info("Deleting existing directory contents.")
+        with cache.lock():
+            cache.remove_workspace()
+        FileSystem.discard()
+        RepoSession.discard()
         github_repo_url = f"https://github.com/{self.task.github_project}"
         if self.project.caching_enabled():
             logger.info("Caching is enabled! Setting up workspace...")
@@ -337,10 +408,37 @@ class TaskEngine:
                 target=self.task.github_project,
                 message=f"Clone repository [{self.task.github_project}]({github_repo_url})",
             )
-            cache.clone(settings.REPO_DIR)
+            stored_repo = GithubRepository.objects.filter(
+                full_name=self.task.github_project
+            ).first()
+            strategy = (
+                stored_repo and stored_repo.clone_strategy
+            ) or settings.REPO_CLONE_STRATEGY
+            stats = cache.clone(
+                cache.workspace,
+                strategy,
+                sparse_paths=paths_mentioned_in(self.task.user_request or ""),
+            )
+            TaskEvent.add(
+                actor="assistant",
+                action="clone_repo",
+                target=self.task.github_project,
+                message=f"Cloned repository ({stats.strategy}) in {stats.seconds:.1f}s, "
+                f"{stats.bytes / 1024 / 1024:.1f} MiB received",
+            )
+        # Authenticate git without writing the token to the repository's config.
+        # Only this workspace's session gets it, tasks of other installations may
+        # run in the same process.
+        RepoSession.current().git.update_environment(
+            **git_credentials_env(self.github_token)
+        )
 
     def broadcast_status_update(self, new_status: str, message: str = None):
         """Broadcast a status update to the task's websocket channel."""
+        buffer = current_event_buffer()
+        if buffer is not None and buffer.task_id == str(self.task.id):
+            # Clients must get the task's events before it is e.g. completed
+            buffer.flush()
         broadcast(
             str(self.task.id),
             {
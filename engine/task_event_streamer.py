@@ -1,31 +1,91 @@
 import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Set
+from urllib.parse import parse_qs
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
 
+from engine.models.task_event import TaskEvent
 
-class TaskEventStreamConsumer(WebsocketConsumer):
-    """Handles the websocket connection for communication between task and client."""
+logger = logging.getLogger(__name__)
 
-    def connect(self):
+
+def replay_events(task_id, since: str) -> List[dict]:
+    """
+    Messages of the events of a task added at or after a cursor, oldest first.
+    :param task_id: ID of the task
+    :param since: ID of the last event the client received, or an ISO timestamp
+    """
+    events = TaskEvent.objects.filter(task_id=task_id)
+    timestamp: Optional[datetime] = parse_datetime(since)
+    if timestamp is None:
+        try:
+            cursor = events.filter(id=since).values_list("timestamp", flat=True)
+            timestamp = cursor.first()
+        except ValidationError:
+            timestamp = None
+        if timestamp is None:
+            # Unknown cursor, the client gets all events
+            return [event.as_message() for event in events.order_by("timestamp")]
+        events = events.exclude(id=since)
+    # Events with the cursor's timestamp may be sent twice, clients skip known IDs
+    events = events.filter(timestamp__gte=timestamp).order_by("timestamp")
+    return [event.as_message() for event in events]
+
+
+class TaskEventStreamConsumer(AsyncWebsocketConsumer):
+    """
+    Handles the websocket connection for communication between task and client.
+
+    Clients that connect late or reconnect pass the ID of the last event they received
+    as `?since=<event ID>`, or a URL-encoded ISO timestamp. The events they missed are
+    replayed from the database before the live events, and a `replayed` message marks
+    the switch. Live events that were already replayed are skipped, so every event is
+    sent once, in order.
+    """
+
+    async def connect(self):
         self.task_id = self.scope["url_route"]["kwargs"]["pk"]
-        async_to_sync(self.channel_layer.group_add)(self.task_id, self.channel_name)
-        self.accept()
+        self.replayed_ids: Set[str] = set()
+        # Join the group first, live events sent during the replay wait in the layer
+        await self.channel_layer.group_add(self.task_id, self.channel_name)
+        await self.accept()
+        query = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        since = query.get("since", [None])[0]
+        if since:
+            await self.replay(since)
+
+    async def replay(self, since: str):
+        messages = await database_sync_to_async(replay_events)(self.task_id, since)
+        for message in messages:
+            self.replayed_ids.add(message["data"]["id"])
+            await self.send(text_data=json.dumps(message))
+        await self.send(
+            text_data=json.dumps({"type": "replayed", "data": {"count": len(messages)}})
+        )
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(self.task_id, self.channel_name)
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.task_id, self.channel_name)
 
-    def receive(self, text_data, **kwargs):
+    async def receive(self, text_data=None, bytes_data=None):
         pass
 
-    def event(self, event):
-        self.send(text_data=json.dumps(event))
+    async def event(self, event):
+        event_id = event["data"]["id"]
+        if event_id in self.replayed_ids:
+            self.replayed_ids.discard(event_id)
+            return
+        await self.send(text_data=json.dumps(event))
 
-    def status_update(self, status):
-        self.send(text_data=json.dumps(status))
+    async def status_update(self, status):
+        await self.send(text_data=json.dumps(status))
 
-    def user_message(self, msg):
-        self.send(text_data=json.dumps(msg))
+    async def user_message(self, msg):
+        await self.send(text_data=json.dumps(msg))
 
-    def title_update(self, title):
-        self.send(text_data=json.dumps(title))
+    async def title_update(self, title):
+        await self.send(text_data=json.dumps(title))
@@ -0,0 +1,381 @@
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Queue a task in its priority class, ordered by weighted fair queuing: a task's
+# virtual finish time is the later of the class' virtual time and the finish times
+# of the previous tasks of its user and its project, plus its cost. Members are
+# prefixed with a sequence number, so tasks with the same finish time stay in order.
+# KEYS: pending tasks of the class, virtual times, flow finish times, classes,
+#       scores, enqueue times, wake-up list, sequence, members
+# ARGV: task ID, class, user flow, project flow, cost, enqueue time
+ENQUEUE_SCRIPT = """
+local start = tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or '0')
+for i = 3, 4 do
+    local finish = tonumber(redis.call('HGET', KEYS[3], ARGV[2] .. ':' .. ARGV[i]) or '0')
+    if finish > start then
+        start = finish
+    end
+end
+local finish = start + tonumber(ARGV[5])
+for i = 3, 4 do
+    redis.call('HSET', KEYS[3], ARGV[2] .. ':' .. ARGV[i], tostring(finish))
+end
+local member = string.format('%015d', redis.call('INCR', KEYS[8])) .. ':' .. ARGV[1]
+redis.call('ZADD', KEYS[1], finish, member)
+redis.call('HSET', KEYS[9], ARGV[1], member)
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[5], ARGV[1], tostring(finish))
+redis.call('HSET', KEYS[6], ARGV[1], ARGV[6])
+redis.call('LPUSH', KEYS[7], '1')
+redis.call('LTRIM', KEYS[7], 0, 99)
+return tostring(finish)
+"""
+
+# Move the next task into the processing list of a consumer: tasks queued before
+# priority classes existed first, then the task with the lowest virtual finish time
+# of the highest non-empty class.
+# KEYS: processing list, deadlines, owners, attempts, virtual times, legacy list,
+#       pending tasks of every class, highest priority first
+# ARGV: consumer, visibility deadline, class names in the order of KEYS[7:]
+DISPATCH_SCRIPT = """
+local task_id = redis.call('LPOP', KEYS[6])
+if not task_id then
+    for i = 7, #KEYS do
+        local popped = redis.call('ZPOPMIN', KEYS[i])
+        if popped[1] then
+            task_id = string.sub(popped[1], 17)
+            local class = ARGV[i - 4]
+            local now = tonumber(redis.call('HGET', KEYS[5], class) or '0')
+            if tonumber(popped[2]) > now then
+                redis.call('HSET', KEYS[5], class, popped[2])
+            end
+            break
+        end
+    end
+end
+if not task_id then
+    return false
+end
+redis.call('RPUSH', KEYS[1], task_id)
+redis.call('ZADD', KEYS[2], ARGV[2], task_id)
+redis.call('HSET', KEYS[3], task_id, ARGV[1])
+redis.call('HINCRBY', KEYS[4], task_id, 1)
+return task_id
+"""
+
+# Take a task out of a processing list and queue it again at its old place, or give
+# up on it once it was delivered TASK_MAX_ATTEMPTS times.
+# KEYS: processing list, pending tasks of its class (or the legacy list), deadlines,
+#       owners, attempts, dead letters, classes, scores, enqueue times, members
+# ARGV: task ID, maximum number of attempts, score (empty for the legacy list)
+# Returns 1 if the task was queued again, 0 if it is dead, -1 if it was not found
+RELEASE_SCRIPT = """
+if redis.call('LREM', KEYS[1], 0, ARGV[1]) == 0 then
+    return -1
+end
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+local attempts = tonumber(redis.call('HGET', KEYS[5], ARGV[1]) or '0')
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('HDEL', KEYS[5], ARGV[1])
+    redis.call('HDEL', KEYS[7], ARGV[1])
+    redis.call('HDEL', KEYS[8], ARGV[1])
+    redis.call('HDEL', KEYS[9], ARGV[1])
+    redis.call('HDEL', KEYS[10], ARGV[1])
+    redis.call('RPUSH', KEYS[6], ARGV[1])
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[2], ARGV[3], redis.call('HGET', KEYS[10], ARGV[1]))
+end
+return 1
+"""
+
+
+class QueueStatus(BaseModel):
+    """Where a task is in the queue."""
+
+    priority: str = Field(description="Priority class of the task")
+    position: int = Field(description="Number of tasks dispatched before it, plus one")
+    wait_seconds: float = Field(description="Time since the task was queued")
+    depth: int = Field(description="Number of tasks waiting in all classes")
+
+
+class TaskQueue:
+    """
+    Reliable task queue on Redis, with priority classes and fair sharing.
+
+    Tasks wait in one sorted set per priority class, `TASK_PRIORITY_CLASSES` from
+    highest to lowest priority. A lower class is only served when all higher ones are
+    empty. Within a class, tasks are ordered by weighted fair queuing over their user
+    and their project, so one user or project queuing many tasks does not delay the
+    others. Their weights are set in `TASK_FAIR_SHARE_WEIGHTS`.
+
+    Workers move tasks into a processing list of their own, so a task is never only in
+    the memory of a worker. Until it is acknowledged, a task has a visibility deadline.
+    When a worker crashes or stops extending the deadline, the task is delivered again,
+    up to `TASK_MAX_ATTEMPTS` times, and then moved to the dead letter list.
+
+    Keys, all prefixed with the queue name:
+    - `<queue>`: Tasks queued before priority classes existed, served first
+    - `<queue>:pending:<class>`: Tasks waiting for a worker, by virtual finish time
+    - `<queue>:vtime`: Virtual time of every class
+    - `<queue>:finish`: Virtual finish time of the last task of every user and project
+    - `<queue>:class`, `<queue>:score`, `<queue>:enqueued`, `<queue>:member`: Class,
+      virtual finish time, enqueue time and sorted set member of every queued or
+      running task
+    - `<queue>:seq`: Sequence of the sorted set members
+    - `<queue>:wakeup`: Wakes up idle workers when a task is queued
+    - `<queue>:processing:<consumer>`: Tasks a worker slot is running
+    - `<queue>:deadlines`: Visibility deadline of every task being processed
+    - `<queue>:owners`: Consumer of every task being processed
+    - `<queue>:attempts`: Number of deliveries of every task
+    - `<queue>:dead`: Tasks that were given up
+    """
+
+    def __init__(self, connection: redis.Redis = None, name: str = None):
+        """
+        :param connection: Redis connection, defaults to `REDIS_HOST`
+        :param name: Name of the queue, defaults to `REDIS_QUEUE`
+        """
+        self.redis = connection or redis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
+        )
+        self.name = name or settings.REDIS_QUEUE
+        self.classes: List[str] = list(settings.TASK_PRIORITY_CLASSES)
+        self.vtime_key = f"{self.name}:vtime"
+        self.finish_key = f"{self.name}:finish"
+        self.class_key = f"{self.name}:class"
+        self.score_key = f"{self.name}:score"
+        self.enqueued_key = f"{self.name}:enqueued"
+        self.member_key = f"{self.name}:member"
+        self.seq_key = f"{self.name}:seq"
+        self.wakeup_key = f"{self.name}:wakeup"
+        self.deadlines_key = f"{self.name}:deadlines"
+        self.owners_key = f"{self.name}:owners"
+        self.attempts_key = f"{self.name}:attempts"
+        self.dead_key = f"{self.name}:dead"
+        self._enqueue = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._dispatch = self.redis.register_script(DISPATCH_SCRIPT)
+        self._release = self.redis.register_script(RELEASE_SCRIPT)
+
+    def pending_key(self, priority: str) -> str:
+        return f"{self.name}:pending:{priority}"
+
+    def processing_key(self, consumer: str) -> str:
+        return f"{self.name}:processing:{consumer}"
+
+    def push(self, task_id, priority: str = None, user: str = "", project: str = ""):
+        """
+        Queue a task.
+        :param task_id: ID of the task
+        :param priority: One of `TASK_PRIORITY_CLASSES`, defaults to the lowest
+        :param user: GitHub user the task runs for, to share the queue fairly
+        :param project: GitHub project the task runs on, to share the queue fairly
+        """
+        priority = priority or self.classes[-1]
+        if priority not in self.classes:
+            raise ValueError(
+                f"Unknown priority class {priority!r}, expected one of {self.classes}"
+            )
+        weights = settings.TASK_FAIR_SHARE_WEIGHTS
+        weight = weights.get(user) or weights.get(project) or 1
+        self._enqueue(
+            keys=[
+                self.pending_key(priority),
+                self.vtime_key,
+                self.finish_key,
+                self.class_key,
+                self.score_key,
+                self.enqueued_key,
+                self.wakeup_key,
+                self.seq_key,
+                self.member_key,
+            ],
+            args=[
+                str(task_id),
+                priority,
+                f"user:{user}",
+                f"project:{project}",
+                1 / weight,
+                time.time(),
+            ],
+        )
+
+    def pop(self, consumer: str, timeout: float) -> Optional[str]:
+        """
+        Take the next task, waiting for one if the queue is empty.
+        :param consumer: Name of the worker slot, e.g. `<hostname>:<slot>`
+        :param timeout: Seconds to wait for a task
+        :return: ID of the task, or None after the timeout
+        """
+        task_id = self.dispatch(consumer)
+        if task_id is None:
+            self.redis.blpop([self.wakeup_key], timeout=timeout)
+            task_id = self.dispatch(consumer)
+        return task_id
+
+    def dispatch(self, consumer: str) -> Optional[str]:
+        """Move the next task into the processing list of a consumer, if there is one."""
+        task_id = self._dispatch(
+            keys=[
+                self.processing_key(consumer),
+                self.deadlines_key,
+                self.owners_key,
+                self.attempts_key,
+                self.vtime_key,
+                self.name,
+                *[self.pending_key(priority) for priority in self.classes],
+            ],
+            args=[consumer, self.next_deadline(), *self.classes],
+        )
+        return task_id.decode("utf-8") if task_id else None
+
+    def next_deadline(self) -> float:
+        return time.time() + settings.TASK_VISIBILITY_TIMEOUT_SECONDS
+
+    def extend(self, task_id: str):
+        """Push back the visibility deadline of a task that is still running."""
+        self.redis.zadd(self.deadlines_key, {task_id: self.next_deadline()}, xx=True)
+
+    def ack(self, consumer: str, task_id: str):
+        """Forget a task that was processed, successfully or not."""
+        pipeline = self.redis.pipeline()
+        pipeline.lrem(self.processing_key(consumer), 0, task_id)
+        pipeline.zrem(self.deadlines_key, task_id)
+        for key in (
+            self.owners_key,
+            self.attempts_key,
+            self.class_key,
+            self.score_key,
+            self.enqueued_key,
+            self.member_key,
+        ):
+            pipeline.hdel(key, task_id)
+        pipeline.execute()
+
+    def release(self, consumer: str, task_id: str) -> Optional[bool]:
+        """
+        Give a task back to the queue, or to the dead letter list once it ran out of
+        attempts.
+        :return: True if it was queued again, False if it is dead, None if the
+            consumer was not processing it (anymore)
+        """
+        pipeline = self.redis.pipeline()
+        pipeline.hget(self.class_key, task_id)
+        pipeline.hget(self.score_key, task_id)
+        priority, score = pipeline.execute()
+        if priority is None:
+            pending_key, score = self.name, b""
+        else:
+            pending_key = self.pending_key(priority.decode("utf-8"))
+        released = self._release(
+            keys=[
+                self.processing_key(consumer),
+                pending_key,
+                self.deadlines_key,
+                self.owners_key,
+                self.attempts_key,
+                self.dead_key,
+                self.class_key,
+                self.score_key,
+                self.enqueued_key,
+                self.member_key,
+            ],
+            args=[task_id, settings.TASK_MAX_ATTEMPTS, score or b""],
+        )
+        if released == -1:
+            return None
+        if released == 0:
+            logger.error(
+                f"Task {task_id} failed too often, moved it to {self.dead_key}"
+            )
+        else:
+            self.redis.lpush(self.wakeup_key, "1")
+        return released == 1
+
+    def recover(self, consumer: str) -> Tuple[List[str], List[str]]:
+        """
+        Release the tasks a previous run of a consumer left behind, e.g. because its
+        worker was killed.
+        :return: IDs of the tasks that were queued again, and of those that are dead
+        """
+        requeued, dead = [], []
+        for task_id in self.redis.lrange(self.processing_key(consumer), 0, -1):
+            task_id = task_id.decode("utf-8")
+            released = self.release(consumer, task_id)
+            if released is not None:
+                (requeued if released else dead).append(task_id)
+        if requeued or dead:
+            logger.warning(
+                f"Recovered {len(requeued) + len(dead)} tasks of consumer {consumer}"
+            )
+        return requeued, dead
+
+    def requeue_expired(self) -> Tuple[List[str], List[str]]:
+        """
+        Release the tasks whose visibility deadline has passed, whoever processed them.
+        :return: IDs of the tasks that were queued again, and of those that are dead
+        """
+        requeued, dead = [], []
+        expired = self.redis.zrangebyscore(self.deadlines_key, 0, time.time())
+        for task_id in expired:
+            task_id = task_id.decode("utf-8")
+            consumer = self.redis.hget(self.owners_key, task_id)
+            if consumer is None:
+                # Acknowledged in the meantime
+                continue
+            released = self.release(consumer.decode("utf-8"), task_id)
+            if released is not None:
+                logger.warning(f"Visibility timeout of task {task_id} expired")
+                (requeued if released else dead).append(task_id)
+        return requeued, dead
+
+    def dead_letters(self) -> List[str]:
+        """IDs of the tasks that were given up."""
+        return [
+            task_id.decode("utf-8")
+            for task_id in self.redis.lrange(self.dead_key, 0, -1)
+        ]
+
+    def depth(self) -> Dict[str, int]:
+        """Number of tasks waiting in every priority class."""
+        pipeline = self.redis.pipeline()
+        for priority in self.classes:
+            pipeline.zcard(self.pending_key(priority))
+        return dict(zip(self.classes, pipeline.execute()))
+
+    def status(self, task_id) -> Optional[QueueStatus]:
+        """
+        Where a task is in the queue.
+        :return: None if the task is not waiting, e.g. because it is running
+        """
+        task_id = str(task_id)
+        priority = self.redis.hget(self.class_key, task_id)
+        if priority is None:
+            return None
+        priority = priority.decode("utf-8")
+        member = self.redis.hget(self.member_key, task_id)
+        rank = member and self.redis.zrank(self.pending_key(priority), member)
+        if rank is None:
+            return None
+        depth = self.depth()
+        ahead = self.redis.llen(self.name) + sum(
+            depth[higher] for higher in self.classes[: self.classes.index(priority)]
+        )
+        enqueued = float(self.redis.hget(self.enqueued_key, task_id) or time.time())
+        return QueueStatus(
+            priority=priority,
+            position=ahead + rank + 1,
+            wait_seconds=max(time.time() - enqueued, 0.0),
+            depth=sum(depth.values()) + self.redis.llen(self.name),
+        )
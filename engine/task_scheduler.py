@@ -1,12 +1,14 @@
 import logging
+import math
 import os
 import threading
 
-import redis
-
 from accounts.models import UserBudget
 from engine.job import KubernetesJob
+from engine.rate_limit import RateLimit, RateLimiter
+from engine.task_queue import TaskQueue
 from engine.util import run_task_in_background
+from engine.warm_pool import WarmPool
 from prpilot import settings
 
 logger = logging.getLogger(__name__)
@@ -17,14 +19,20 @@ class SchedulerError(Exception):
         super().__init__(message)
 
 
+class RateLimitExceeded(SchedulerError):
+    def __init__(self, message, rate_limit: RateLimit):
+        super().__init__(message)
+        self.rate_limit = rate_limit
+        self.retry_after = rate_limit.retry_after
+        self.remaining = rate_limit.remaining
+
+
 class TaskScheduler:
 
     def __init__(self, task):
         self.task = task
         self.context = self.task.context
-        self.redis_queue = redis.Redis(
-            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
-        )
+        self.rate_limiter = RateLimiter()
 
     def user_budget_empty(self):
         budget = UserBudget.get_user_budget(self.task.github_user)
@@ -36,6 +44,18 @@ class TaskScheduler:
         permission = repo.get_collaborator_permission(self.task.github_user)
         return permission == "write" or permission == "admin"
 
+    def priority_class(self) -> str:
+        """Comments on GitHub first, then API and dashboard tasks, then labs experiments."""
+        if self.task.experiment_set.exists():
+            return "labs"
+        if self.task.task_type == "standalone":
+            return "api"
+        return "interactive"
+
+    def requires_isolation(self) -> bool:
+        """Whether the task must run in a job of its own, see `TASK_ISOLATED_PROJECTS`."""
+        return self.task.github_project in settings.TASK_ISOLATED_PROJECTS
+
     def schedule(self):
         self.context.acknowledge_user_prompt()
         if self.user_budget_empty():
@@ -56,17 +76,21 @@ class TaskScheduler:
             self.context.respond_to_user(message)
             raise SchedulerError(message)
 
-        if self.task.would_reach_rate_limit():
+        rate_limit = self.rate_limiter.hit(
+            self.task.id, project=self.task.github_project, user=self.task.github_user
+        )
+        if not rate_limit.allowed:
             message = (
-                f"Sorry @{self.task.github_user}, the project `{self.task.github_project}` has reached the rate "
-                f"limit of {settings.TASK_RATE_LIMIT} per {settings.TASK_RATE_LIMIT_WINDOW} minutes. Please "
-                f"try again later."
+                f"Sorry @{self.task.github_user}, you or the project `{self.task.github_project}` reached the "
+                f"rate limit of {settings.TASK_RATE_LIMIT} tasks per {settings.TASK_RATE_LIMIT_WINDOW} minutes. "
+                f"Please try again in {math.ceil(rate_limit.retry_after)} seconds."
             )
             logger.info(
-                f"Project {self.task.github_project} has reached the rate limit"
+                f"User {self.task.github_user} or project {self.task.github_project} "
+                f"reached the rate limit"
             )
             self.context.respond_to_user(message)
-            raise SchedulerError(message)
+            raise RateLimitExceeded(message, rate_limit)
 
         if settings.JOB_STRATEGY == "thread":
             # In local development, just run the task in a background thread
@@ -81,12 +105,24 @@ class TaskScheduler:
             # In production, run the task in a Kubernetes job
             job = KubernetesJob(self.task)
             job.spawn()
+        elif settings.JOB_STRATEGY == "warm_pool":
+            # Run the task on an idle warm worker, or in a job of its own
+            WarmPool().schedule(
+                self.task,
+                priority=self.priority_class(),
+                isolated=self.requires_isolation(),
+            )
         elif settings.JOB_STRATEGY == "log":
             # In testing, just log the task
             logger.info(f"Running task in log mode: {self.task.id}")
         elif settings.JOB_STRATEGY == "redis":
             logger.info(f"Scheduling task via Redis: {self.task.id}")
-            self.redis_queue.rpush(settings.REDIS_QUEUE, str(self.task.id))
+            TaskQueue().push(
+                self.task.id,
+                priority=self.priority_class(),
+                user=self.task.github_user,
+                project=self.task.github_project,
+            )
         else:
             raise ValueError(f"Invalid JOB_STRATEGY: {settings.JOB_STRATEGY}")
 
@@ -1,46 +1,240 @@
+import json
 import logging
-import os
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
 
 import redis
 from django.conf import settings
-from sentry_sdk import configure_scope
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from pydantic import BaseModel, Field
+from sentry_sdk import Hub
 
 from engine.models.task import Task
 from engine.task_engine import TaskEngine
+from engine.task_queue import TaskQueue
 
 logger = logging.getLogger(__name__)
 
+# Slots stop waiting for tasks at this interval, to notice a drain
+POLL_TIMEOUT_SECONDS = 5
+# Slots wait this long before they talk to Redis again after an error
+REDIS_RETRY_SECONDS = 5
+
+
+class SlotStats(BaseModel):
+    """Utilisation of a worker slot."""
+
+    slot: int = Field(description="Number of the slot")
+    consumer: str = Field(description="Name of the slot in the task queue")
+    task_id: Optional[str] = Field(default=None, description="Task running right now")
+    tasks_run: int = Field(default=0, description="Number of tasks run")
+    busy_seconds: float = Field(default=0.0, description="Time spent running tasks")
+    started: float = Field(default_factory=time.monotonic)
+    busy_since: Optional[float] = None
+
+    def utilisation(self) -> float:
+        """Fraction of the slot's lifetime spent running tasks."""
+        now = time.monotonic()
+        busy = self.busy_seconds
+        if self.busy_since is not None:
+            busy += now - self.busy_since
+        return busy / max(now - self.started, 1e-9)
+
 
 class TaskWorker:
+    """
+    Runs the tasks of the `TaskQueue` in a pool of `TASK_CONCURRENCY` threads.
 
-    def __init__(self):
-        self.redis_queue = redis.Redis(
+    Tasks mostly wait for the LLM and GitHub, so one process runs several of them. Each
+    slot runs its task in its own task context and workspace, see `use_task`. On
+    SIGTERM, the worker stops taking new tasks and exits once the running ones are done.
+
+    While tasks run, the worker extends their visibility deadlines. Tasks of workers
+    that died are delivered again: the slots' own leftovers when the worker starts,
+    and those of other workers once their deadline passed.
+    """
+
+    def __init__(self, concurrency: int = None, name: str = None):
+        """
+        :param concurrency: Number of slots, defaults to `TASK_CONCURRENCY`
+        :param name: Name of the worker, defaults to the hostname
+        """
+        self.concurrency = concurrency or settings.TASK_CONCURRENCY
+        if self.concurrency > 1 and not settings.TASK_WORKSPACE_ROOT:
+            raise ImproperlyConfigured(
+                "TASK_WORKSPACE_ROOT must be set to run tasks concurrently"
+            )
+        self.redis = redis.Redis(
             host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
         )
+        self.queue = TaskQueue(self.redis)
+        # Stable in a StatefulSet, so a restarted worker finds its slots' leftovers
+        self.name = name or socket.gethostname()
+        self.draining = threading.Event()
+        self.slots: List[SlotStats] = [
+            SlotStats(slot=slot, consumer=f"{self.name}:{slot}")
+            for slot in range(self.concurrency)
+        ]
+        self.last_report = 0.0
 
     def run(self):
-        logger.info("Running task worker")
+        logger.info(f"Running task worker with {self.concurrency} slots")
+        signal.signal(signal.SIGTERM, self.drain)
+        for slot in self.slots:
+            _, dead = self.queue.recover(slot.consumer)
+            self.give_up(dead)
+        threads = [
+            threading.Thread(
+                target=self.run_slot, args=(slot,), name=f"slot-{slot.slot}"
+            )
+            for slot in self.slots
+        ]
+        for thread in threads:
+            thread.start()
+        interval = min(
+            settings.TASK_VISIBILITY_TIMEOUT_SECONDS / 3,
+            settings.WORKER_METRICS_INTERVAL_SECONDS,
+        )
         while True:
-            _, task_id = self.redis_queue.blpop([settings.REDIS_QUEUE])
-            task_id = task_id.decode("utf-8")
-            settings.TASK_ID = task_id
-            os.environ["TASK_ID"] = task_id
-            logger.info(f"Received task {task_id}")
-            task = Task.objects.get(id=task_id)
-            engine = TaskEngine(task)
-            with configure_scope() as scope:
-                scope.set_tag("task_id", str(task.id))
-                scope.set_tag("github_user", task.github_user)
-                scope.set_tag("github_project", task.github_project)
-                scope.set_tag("github_issue", task.issue_number)
-                scope.set_tag("github_pr", task.pr_number)
-
-                additional_knowledge = ""
-                if task.experiment_set.count() > 0:
-                    experiment = task.experiment_set.first()
-                    additional_knowledge = experiment.knowledge
-                    skills = list(experiment.skills.all())
-                engine.run(
-                    additional_knowledge=additional_knowledge,
-                    overwrite_pilot_skills=skills,
-                )
+            alive = [thread for thread in threads if thread.is_alive()]
+            if not alive:
+                break
+            alive[0].join(interval)
+            self.heartbeat()
+        self.report_metrics()
+        logger.info("All slots are drained, stopping task worker")
+
+    def drain(self, signum=None, frame=None):
+        """Stop taking new tasks, the running ones are finished."""
+        logger.info("Draining task worker")
+        self.draining.set()
+
+    def heartbeat(self):
+        """Keep the running tasks invisible to other workers, and recover dead ones."""
+        try:
+            for slot in self.slots:
+                task_id = slot.task_id
+                if task_id:
+                    self.queue.extend(task_id)
+            _, dead = self.queue.requeue_expired()
+            self.give_up(dead)
+        except redis.RedisError:
+            logger.exception("Failed to extend running tasks or requeue expired ones")
+        if (
+            time.monotonic() - self.last_report
+            >= settings.WORKER_METRICS_INTERVAL_SECONDS
+        ):
+            self.report_metrics()
+            self.last_report = time.monotonic()
+
+    def give_up(self, task_ids: List[str]):
+        """Fail the tasks that were moved to the dead letter list."""
+        for task_id in task_ids:
+            logger.error(f"Giving up on task {task_id}")
+            Task.objects.filter(id=task_id).update(
+                status="failed", result="The task could not be run, please try again."
+            )
+
+    def run_slot(self, slot: SlotStats):
+        while not self.draining.is_set():
+            try:
+                task_id = self.queue.pop(slot.consumer, timeout=POLL_TIMEOUT_SECONDS)
+            except redis.RedisError:
+                logger.exception(f"Failed to take a task in slot {slot.slot}")
+                self.draining.wait(REDIS_RETRY_SECONDS)
+                continue
+            if task_id is None:
+                continue
+            logger.info(f"Received task {task_id} in slot {slot.slot}")
+            slot.task_id, slot.busy_since = task_id, time.monotonic()
+            self.publish_metrics()
+            try:
+                self.run_task(task_id)
+                self.queue.ack(slot.consumer, task_id)
+            except Exception:
+                # Never let one task stop the slot
+                logger.exception(f"Failed to run task {task_id}")
+                try:
+                    if self.queue.release(slot.consumer, task_id) is False:
+                        self.give_up([task_id])
+                except redis.RedisError:
+                    # Delivered again once its visibility deadline passed
+                    logger.exception(f"Failed to release task {task_id}")
+            finally:
+                slot.busy_seconds += time.monotonic() - slot.busy_since
+                slot.tasks_run += 1
+                slot.task_id, slot.busy_since = None, None
+                self.publish_metrics()
+                # Every slot thread has its own database connection
+                close_old_connections()
+
+    def run_task(self, task_id: str):
+        task = Task.objects.get(id=task_id)
+        engine = TaskEngine(task)
+        # Slots share the global hub, give each task a hub and scope of its own
+        with Hub(Hub.current) as hub, hub.configure_scope() as scope:
+            scope.set_tag("task_id", str(task.id))
+            scope.set_tag("github_user", task.github_user)
+            scope.set_tag("github_project", task.github_project)
+            scope.set_tag("github_issue", task.issue_number)
+            scope.set_tag("github_pr", task.pr_number)
+
+            additional_knowledge = ""
+            skills = []
+            if task.experiment_set.count() > 0:
+                experiment = task.experiment_set.first()
+                additional_knowledge = experiment.knowledge
+                skills = list(experiment.skills.all())
+            engine.run(
+                additional_knowledge=additional_knowledge,
+                overwrite_pilot_skills=skills,
+            )
+
+    def metrics(self) -> dict:
+        """Utilisation of the worker and its slots."""
+        slots = [
+            {
+                "slot": slot.slot,
+                "task_id": slot.task_id,
+                "tasks_run": slot.tasks_run,
+                "utilisation": round(slot.utilisation(), 3),
+            }
+            for slot in self.slots
+        ]
+        return {
+            "worker": self.name,
+            "busy_slots": sum(1 for slot in self.slots if slot.task_id),
+            "utilisation": round(
+                sum(slot["utilisation"] for slot in slots) / len(slots), 3
+            ),
+            "concurrency": self.concurrency,
+            "draining": self.draining.is_set(),
+            "slots": slots,
+            "reported_at": time.time(),
+        }
+
+    def report_metrics(self):
+        """Log the metrics and publish them in `REDIS_WORKER_METRICS_KEY`."""
+        metrics = self.publish_metrics()
+        logger.info(
+            f"Task worker utilisation: {metrics['utilisation']:.0%}, "
+            f"{metrics['busy_slots']}/{self.concurrency} slots busy"
+        )
+
+    def publish_metrics(self) -> dict:
+        """
+        Publish the metrics in `REDIS_WORKER_METRICS_KEY`. Slots publish them whenever
+        they take or finish a task, so the `WarmPool` knows how many are idle.
+        """
+        metrics = self.metrics()
+        try:
+            self.redis.hset(
+                settings.REDIS_WORKER_METRICS_KEY, self.name, json.dumps(metrics)
+            )
+        except redis.RedisError:
+            logger.exception("Failed to publish task worker metrics")
+        return metrics
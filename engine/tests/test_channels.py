@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from engine.channels import Broadcaster
+
+
+class RecordingLayer:
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = fail_for
+        self.release = None
+
+    async def group_send(self, group, data):
+        if self.release is not None:
+            await self.release.wait()
+        if data in self.fail_for:
+            raise ConnectionError("Redis is gone")
+        self.sent.append((group, data))
+
+
+@pytest.fixture
+def layer(mock_get_channel_layer):
+    layer = RecordingLayer()
+    mock_get_channel_layer.return_value = layer
+    return layer
+
+
+def test_messages_are_sent_in_order(layer):
+    broadcaster = Broadcaster(max_pending=10, timeout=1)
+    for i in range(100):
+        broadcaster.send("task", i)
+    broadcaster.flush(timeout=5)
+
+    assert layer.sent == [("task", i) for i in range(100)]
+
+
+def test_failed_message_does_not_stop_the_others(layer):
+    layer.fail_for = (1,)
+    broadcaster = Broadcaster(max_pending=10, timeout=1)
+    futures = [broadcaster.send("task", i) for i in range(3)]
+    broadcaster.flush(timeout=5)
+
+    assert layer.sent == [("task", 0), ("task", 2)]
+    assert isinstance(futures[1].exception(), ConnectionError)
+
+
+def test_slow_channel_layer_applies_backpressure(layer):
+    broadcaster = Broadcaster(max_pending=2, timeout=0.05)
+    release = asyncio.Event()
+    layer.release = release
+
+    assert broadcaster.send("task", 0) and broadcaster.send("task", 1)
+    # Both slots are taken while Redis does not answer, the message is dropped
+    assert broadcaster.send("task", 2) is None
+    assert broadcaster.dropped == 1
+
+    broadcaster.loop.call_soon_threadsafe(release.set)
+    broadcaster.flush(timeout=5)
+    assert broadcaster.send("task", 3) is not None
+    broadcaster.flush(timeout=5)
+    assert [data for _, data in layer.sent] == [0, 1, 3]
@@ -0,0 +1,69 @@
+"""Benchmarks for broadcasting task events. Run with `RUN_BENCHMARKS=1 pytest -s`."""
+
+import asyncio
+import os
+import time
+from contextlib import nullcontext
+from typing import Tuple
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from engine.channels import get_broadcaster
+from engine.event_buffer import buffer_task_events
+from engine.models.task_event import TaskEvent
+
+BENCHMARK_EVENT_COUNT = int(os.getenv("BENCHMARK_EVENT_COUNT", "2000"))
+# Round-trip time of the simulated Redis channel layer
+BENCHMARK_LATENCY_SECONDS = float(os.getenv("BENCHMARK_LATENCY_MS", "0.5")) / 1000
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+
+class SlowChannelLayer:
+    async def group_send(self, group, data):
+        await asyncio.sleep(BENCHMARK_LATENCY_SECONDS)
+
+
+def events_per_second(add_event, context=None) -> Tuple[float, float]:
+    """Rate at which events are added, and at which they are written and sent."""
+    start = time.perf_counter()
+    with context or nullcontext():
+        for i in range(BENCHMARK_EVENT_COUNT):
+            add_event(i)
+        added = time.perf_counter()
+    get_broadcaster().flush()
+    delivered = time.perf_counter()
+    return (
+        BENCHMARK_EVENT_COUNT / (added - start),
+        BENCHMARK_EVENT_COUNT / (delivered - start),
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_task_event_add_throughput(task, mock_get_channel_layer):
+    layer = SlowChannelLayer()
+    mock_get_channel_layer.return_value = layer
+
+    def add_and_broadcast(i):
+        # TaskEvent.add before the broadcaster and the event buffer
+        event = TaskEvent(actor="assistant", action=f"{i}", task_id=task.id)
+        event.save()
+        async_to_sync(layer.group_send)(str(task.id), {"type": "event"})
+
+    def add(i):
+        TaskEvent.add(actor="assistant", action=f"{i}", task_id=task.id)
+
+    results = {
+        "async_to_sync": events_per_second(add_and_broadcast),
+        "broadcaster": events_per_second(add),
+        "buffered": events_per_second(add, buffer_task_events(task.id)),
+    }
+    print(f"\nTaskEvent.add, {BENCHMARK_EVENT_COUNT} events (added/s, delivered/s):")
+    for name, (added, delivered) in results.items():
+        print(f"  {name:<14} {added:>10.0f} {delivered:>10.0f}")
+    assert task.events.count() == len(results) * BENCHMARK_EVENT_COUNT
+    assert results["buffered"][0] > results["broadcaster"][0]
+    assert results["broadcaster"][0] > results["async_to_sync"][0]
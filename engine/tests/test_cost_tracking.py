@@ -0,0 +1,113 @@
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from engine.langchain import cost_tracking
+from engine.langchain.cost_tracking import CostTrackerCallback, encoding_for_model
+from engine.models.cost_item import CostItem
+
+
+@pytest.fixture(autouse=True)
+def clear_encoder_cache():
+    encoding_for_model.cache_clear()
+    yield
+    encoding_for_model.cache_clear()
+
+
+@pytest.fixture
+def get_encoding():
+    encoding = MagicMock()
+    encoding.encode.side_effect = lambda text: text.split()
+    with patch.object(
+        cost_tracking.tiktoken, "get_encoding", return_value=encoding
+    ) as get_encoding:
+        yield get_encoding
+
+
+def llm_result(text="the answer", usage_metadata=None, llm_output=None):
+    message = AIMessage(content=text, usage_metadata=usage_metadata)
+    return LLMResult(
+        generations=[[ChatGeneration(message=message)]], llm_output=llm_output
+    )
+
+
+def call(callback, response, prompts=("one two three",)):
+    run_id = uuid.uuid4()
+    callback.on_llm_start({}, list(prompts), run_id=run_id)
+    callback.on_llm_end(response, run_id=run_id)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "response",
+    [
+        llm_result(
+            usage_metadata={
+                "input_tokens": 120,
+                "output_tokens": 30,
+                "total_tokens": 150,
+            }
+        ),
+        llm_result(
+            llm_output={"token_usage": {"prompt_tokens": 120, "completion_tokens": 30}}
+        ),
+    ],
+)
+def test_reported_usage_is_not_counted_again(task, get_encoding, response):
+    callback = CostTrackerCallback("gpt-4o", "conversation")
+    call(callback, response)
+
+    get_encoding.assert_not_called()
+    cost_item = CostItem.objects.get(task=task)
+    assert cost_item.prompt_token_count == 120
+    assert cost_item.completion_token_count == 30
+    assert cost_item.requests == 1
+    assert cost_item.total_cost_usd > 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "model_name,encoding_name",
+    [("gpt-4o", "o200k_base"), ("gpt-3.5-turbo", "cl100k_base")],
+)
+def test_tokens_are_counted_with_the_model_encoding(
+    task, get_encoding, model_name, encoding_name
+):
+    callback = CostTrackerCallback(model_name, "conversation")
+    call(callback, llm_result("four words of answer"), prompts=["a b", " c"])
+
+    get_encoding.assert_called_once_with(encoding_name)
+    cost_item = CostItem.objects.get(task=task)
+    assert cost_item.prompt_token_count == 3
+    assert cost_item.completion_token_count == 4
+
+
+@pytest.mark.django_db
+def test_encoder_is_loaded_once_per_model(task, get_encoding):
+    callback = CostTrackerCallback("gpt-4o", "conversation")
+    for _ in range(3):
+        call(callback, llm_result())
+
+    get_encoding.assert_called_once_with("o200k_base")
+    assert CostItem.objects.filter(task=task).count() == 3
+    assert callback.successful_requests == 3
+    assert callback.prompt_tokens == 9
+
+
+def test_unknown_model_falls_back_to_default_encoding(get_encoding):
+    encoding_for_model("my-fine-tuned-model")
+
+    get_encoding.assert_called_once_with(cost_tracking.DEFAULT_ENCODING)
+
+
+def test_prompts_of_failed_calls_are_dropped(get_encoding):
+    callback = CostTrackerCallback("gpt-4o", "conversation")
+    run_id = uuid.uuid4()
+    callback.on_llm_start({}, ["prompt"], run_id=run_id)
+
+    callback.on_llm_error(RuntimeError("rate limited"), run_id=run_id)
+
+    assert callback._prompts == {}
@@ -0,0 +1,83 @@
+"""
+Overhead of cost tracking per LLM call. Run with `RUN_BENCHMARKS=1 pytest -s`.
+
+Needs the tiktoken encodings, downloaded on first use or cached in `TIKTOKEN_CACHE_DIR`.
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+import tiktoken
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from engine.langchain.cost_tracking import CostTrackerCallback, encoding_for_model
+
+BENCHMARK_CALL_COUNT = int(os.getenv("BENCHMARK_CALL_COUNT", "30"))
+BENCHMARK_MODEL = os.getenv("BENCHMARK_MODEL", "gpt-4o")
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+STEP = "Observation: " + "def handler(request):\n    return response\n" * 50
+
+
+def agent_calls(usage: bool):
+    """Prompts and responses of an agent run, whose scratchpad grows with every step."""
+    for i in range(BENCHMARK_CALL_COUNT):
+        prompt = "You are PR Pilot.\n" + STEP * i
+        message = AIMessage(
+            content="Thought: read the next file",
+            usage_metadata=(
+                {"input_tokens": 1000 * i, "output_tokens": 10, "total_tokens": 0}
+                if usage
+                else None
+            ),
+        )
+        yield [prompt], LLMResult(generations=[[ChatGeneration(message=message)]])
+
+
+def ms_per_call(callback, usage: bool) -> float:
+    elapsed = 0.0
+    for prompts, response in agent_calls(usage):
+        run_id = uuid.uuid4()
+        start = time.perf_counter()
+        callback.on_llm_start({}, prompts, run_id=run_id)
+        callback.on_llm_end(response, run_id=run_id)
+        elapsed += time.perf_counter() - start
+    return elapsed * 1000 / BENCHMARK_CALL_COUNT
+
+
+class EncodeEveryCall(CostTrackerCallback):
+    """Cost tracking before usage fields: look up cl100k and encode every call."""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        encoding = tiktoken.get_encoding("cl100k_base")
+        self.prompt_tokens = len(encoding.encode("".join(prompts)))
+        super().on_llm_start(serialized, prompts, **kwargs)
+
+    def on_llm_end(self, response, **kwargs):
+        encoding = tiktoken.get_encoding("cl100k_base")
+        len(encoding.encode(response.generations[0][0].text))
+        super().on_llm_end(response, **kwargs)
+
+
+@pytest.mark.django_db
+def test_cost_tracking_overhead(task):
+    # Load the encodings up front, the first load is a download
+    tiktoken.get_encoding("cl100k_base")
+    encoding_for_model(BENCHMARK_MODEL)
+
+    results = {
+        "encode every call": ms_per_call(EncodeEveryCall(BENCHMARK_MODEL, "b"), True),
+        "cached encoder": ms_per_call(CostTrackerCallback(BENCHMARK_MODEL, "b"), False),
+        "usage fields": ms_per_call(CostTrackerCallback(BENCHMARK_MODEL, "b"), True),
+    }
+    print(f"\nCost tracking, {BENCHMARK_CALL_COUNT} calls of {BENCHMARK_MODEL}:")
+    for name, ms in results.items():
+        print(f"  {name:<18} {ms:>8.2f} ms/call")
+    assert results["usage fields"] < results["cached encoder"]
+    assert results["usage fields"] < results["encode every call"]
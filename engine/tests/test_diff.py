@@ -0,0 +1,126 @@
+import git
+import pytest
+
+from engine.diff import parse_diff, summarize_diff
+from engine.project import Project
+from engine.repo_session import RepoSession
+
+DIFF = """diff --git a/README.md b/README.md
+index 1111111..2222222 100644
+--- a/README.md
++++ b/README.md
+@@ -1,2 +1,2 @@ Title
+ # Hello
+-old line
++new line
+diff --git a/new.py b/new.py
+new file mode 100644
+index 0000000..3333333
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1,2 @@
++print("hello")
++--- not a header
+diff --git a/old.txt b/old.txt
+deleted file mode 100644
+index 4444444..0000000
+--- a/old.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-bye
+diff --git a/src/a.py b/lib/a.py
+similarity index 100%
+rename from src/a.py
+rename to lib/a.py
+diff --git a/logo.png b/logo.png
+index 5555555..6666666 100644
+Binary files a/logo.png and b/logo.png differ
+"""
+
+
+def test_parse_diff():
+    files = list(parse_diff(DIFF.splitlines(keepends=True)))
+
+    assert [(f.path, f.change_type) for f in files] == [
+        ("README.md", "modified"),
+        ("new.py", "added"),
+        ("old.txt", "deleted"),
+        ("lib/a.py", "renamed"),
+        ("logo.png", "modified"),
+    ]
+    readme, new, old, renamed, logo = files
+    assert (readme.additions, readme.deletions) == (1, 1)
+    assert readme.hunks[0].header == "@@ -1,2 +1,2 @@ Title"
+    assert readme.hunks[0].lines == [" # Hello", "-old line", "+new line"]
+    assert (new.additions, new.deletions) == (2, 0)
+    assert (old.additions, old.deletions) == (0, 1)
+    assert renamed.old_path == "src/a.py" and not renamed.hunks
+    assert logo.binary
+
+
+@pytest.mark.parametrize("max_chars", [50, 200, 10_000])
+def test_summarize_diff_is_bounded(max_chars):
+    summary = summarize_diff(parse_diff(DIFF.splitlines()), max_chars)
+
+    assert len(summary) <= max_chars
+    assert summary.startswith("5 files changed:")
+    if max_chars == 10_000:
+        assert "- src/a.py => lib/a.py (renamed, +0 -0)" in summary
+        assert "+new line" in summary
+
+
+@pytest.fixture
+def project(tmp_path, settings):
+    repo = git.Repo.init(tmp_path, initial_branch="main")
+    (tmp_path / "README.md").write_text("# Hello\n")
+    repo.index.add(["README.md"])
+    repo.index.commit("Initial commit")
+    repo.git.checkout("-b", "feature")
+    settings.REPO_DIR = str(tmp_path)
+    yield Project(name="owner/repo", main_branch="main")
+    RepoSession.discard(tmp_path)
+
+
+def test_has_changes_to_main(project, tmp_path):
+    repo = RepoSession.current().repo
+    assert not project.has_changes_to_main()
+
+    # Commits that cancel each other out leave the tree unchanged
+    (tmp_path / "README.md").write_text("# Changed\n")
+    repo.index.add(["README.md"])
+    repo.index.commit("Change README")
+    assert project.has_changes_to_main()
+    (tmp_path / "README.md").write_text("# Hello\n")
+    repo.index.add(["README.md"])
+    repo.index.commit("Revert README")
+    assert not project.has_changes_to_main()
+
+
+def test_iter_diff_to_main_detects_renames(project, tmp_path):
+    repo = RepoSession.current().repo
+    repo.git.mv("README.md", "INTRO.md")
+    (tmp_path / "new.txt").write_text("new\n")
+    repo.index.add(["new.txt"])
+    repo.index.commit("Rename README")
+
+    files = list(project.iter_diff_to_main())
+
+    assert [(f.path, f.old_path, f.change_type) for f in files] == [
+        ("INTRO.md", "README.md", "renamed"),
+        ("new.txt", None, "added"),
+    ]
+    assert "new.txt (added, +1 -0)" in project.summarize_diff_to_main(1000)
+
+
+def test_summarize_diff_of_branch_after_checking_out_main(project, tmp_path):
+    repo = RepoSession.current().repo
+    (tmp_path / "new.txt").write_text("new\n")
+    repo.index.add(["new.txt"])
+    repo.index.commit("Add new.txt")
+    # Like TaskEngine after finalize_working_branch()
+    project.checkout_latest_default_branch()
+
+    summary = project.summarize_diff_to_main(1000, branch="feature")
+
+    assert summary.startswith("1 files changed:")
+    assert "new.txt (added, +1 -0)" in summary
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import pytest
+from django.db import DatabaseError
+
+from engine.event_buffer import TaskEventBuffer, buffer_task_events
+from engine.models.task_event import TaskEvent
+
+
+def add_events(task, count):
+    for i in range(count):
+        TaskEvent.add(actor="assistant", action=f"action-{i}", task_id=task.id)
+
+
+@pytest.mark.django_db
+def test_events_are_written_and_broadcast_in_order_when_context_exits(task, settings):
+    settings.TASK_EVENT_FLUSH_SECONDS = 60
+    broadcast = []
+
+    def record_broadcast(group, data):
+        # Events are only broadcast once they can be looked up
+        assert TaskEvent.objects.filter(id=data["data"]["id"]).exists()
+        broadcast.append(data["data"]["action"])
+
+    with patch("engine.models.task_event.broadcast", side_effect=record_broadcast):
+        with buffer_task_events(task.id):
+            add_events(task, 3)
+            assert TaskEvent.objects.count() == 0
+            assert broadcast == []
+
+    actions = [f"action-{i}" for i in range(3)]
+    assert broadcast == actions
+    events = list(task.events.order_by("timestamp"))
+    assert [event.action for event in events] == actions
+
+
+@pytest.mark.django_db
+def test_events_are_written_when_task_fails(task, settings):
+    settings.TASK_EVENT_FLUSH_SECONDS = 60
+    with pytest.raises(RuntimeError):
+        with buffer_task_events(task.id):
+            add_events(task, 2)
+            raise RuntimeError("boom")
+
+    assert task.events.count() == 2
+
+
+@pytest.mark.django_db
+def test_events_of_other_tasks_are_written_right_away(task, settings):
+    with buffer_task_events("another-task"):
+        add_events(task, 1)
+        assert task.events.count() == 1
+
+
+@pytest.mark.django_db
+def test_failed_batch_is_written_with_the_next_one(task):
+    buffer = TaskEventBuffer(task.id)
+    buffer.add(TaskEvent(actor="assistant", action="first", task_id=task.id))
+    with patch.object(
+        TaskEvent.objects, "bulk_create", side_effect=DatabaseError("gone")
+    ):
+        assert buffer.flush() == 0
+    buffer.add(TaskEvent(actor="assistant", action="second", task_id=task.id))
+
+    assert buffer.flush() == 2
+    assert [event.action for event in task.events.order_by("timestamp")] == [
+        "first",
+        "second",
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_full_buffer_is_written_in_the_background(task):
+    buffer = TaskEventBuffer(task.id, interval=60, max_events=2)
+    buffer.start()
+    try:
+        buffer.add(TaskEvent(actor="assistant", action="first", task_id=task.id))
+        buffer.add(TaskEvent(actor="assistant", action="second", task_id=task.id))
+        # Query once the thread is done, sqlite locks the table while it writes
+        assert buffer.flushed.wait(5)
+        assert task.events.count() == 2
+    finally:
+        buffer.close()
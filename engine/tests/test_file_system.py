@@ -0,0 +1,173 @@
+import os
+from pathlib import Path
+
+import pytest
+import yaml
+
+from engine.file_system import FileSystem
+
+
+@pytest.fixture
+def repo_dir(tmp_path, settings):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hello')")
+    (tmp_path / "README.md").write_text("# Hello")
+    settings.REPO_DIR = str(tmp_path)
+    yield tmp_path
+    FileSystem.discard(tmp_path)
+
+
+def rebuilt_yaml(root: Path) -> dict:
+    return yaml.safe_load(FileSystem(root).yaml())
+
+
+def test_current_returns_same_instance(repo_dir):
+    assert FileSystem.current() is FileSystem.current(repo_dir)
+
+
+def test_save_updates_tree_in_place(repo_dir):
+    fs = FileSystem.current()
+    node = fs.save("content", Path("docs/guide/intro.md"))
+    assert node.path == repo_dir / "docs" / "guide" / "intro.md"
+    assert fs.get_node(Path("docs/guide")).is_directory
+    assert yaml.safe_load(fs.yaml()) == rebuilt_yaml(repo_dir)
+
+
+def test_move_copy_delete_update_tree_in_place(repo_dir):
+    fs = FileSystem.current()
+    fs.copy_file("src/main.py", "lib/copy.py")
+    fs.move_file("README.md", "docs/README.md")
+    fs.delete_file("src/main.py")
+    assert fs.get_node(Path("lib/copy.py"))
+    assert fs.get_node(Path("docs/README.md"))
+    assert fs.get_node(Path("README.md")) is None
+    assert fs.get_node(Path("src/main.py")) is None
+    assert yaml.safe_load(fs.yaml()) == rebuilt_yaml(repo_dir)
+
+
+def test_refresh_picks_up_external_changes(repo_dir):
+    fs = FileSystem.current()
+    (repo_dir / "src" / "nested").mkdir()
+    (repo_dir / "src" / "nested" / "new.py").write_text("")
+    os.remove(repo_dir / "README.md")
+    assert fs.get_node(Path("src/nested/new.py")) is None
+    fs.refresh()
+    assert fs.get_node(Path("src/nested/new.py"))
+    assert fs.get_node(Path("README.md")) is None
+    assert yaml.safe_load(fs.yaml()) == rebuilt_yaml(repo_dir)
+
+
+def test_own_writes_do_not_trigger_rescan(repo_dir):
+    fs = FileSystem.current()
+    fs.save("content", Path("src/other.py"))
+    tree = fs.tree
+    fs.refresh()
+    assert fs.tree is tree
+    assert fs.get_node(Path("src/other.py"))
+
+
+def test_get_node_uses_relative_and_absolute_paths(repo_dir):
+    fs = FileSystem.current()
+    assert fs.get_node(Path("src/main.py")) is fs.get_node(repo_dir / "src/main.py")
+    assert fs.get_node(Path(".")) is fs.tree
+    assert fs.get_node(Path("/somewhere/else")) is None
+
+
+def test_index_forgets_removed_subtrees(repo_dir):
+    fs = FileSystem.current()
+    fs.save("content", Path("src/nested/deep.py"))
+    fs.move_file("src", "lib")
+    assert fs.get_node(Path("src/nested/deep.py")) is None
+    assert (
+        fs.get_node(Path("lib/nested/deep.py")).path == repo_dir / "lib/nested/deep.py"
+    )
+
+
+def test_yaml_and_directory_tree_output(tmp_path, settings):
+    settings.REPO_DIR = str(tmp_path)
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "src" / "main.py").touch()
+    (tmp_path / "src" / "sub" / "x.py").touch()
+    fs = FileSystem(tmp_path)
+
+    assert fs.yaml() == ".:\n- src:\n  - main.py\n  - src/sub:\n    - x.py\n"
+    assert fs.get_directory_tree() == [
+        {
+            "id": "src",
+            "text": "src",
+            "type": "default",
+            "children": [
+                (
+                    {"id": "src/main.py", "text": "main.py", "type": "file"}
+                    if child == "main.py"
+                    else {
+                        "id": "src/sub",
+                        "text": "sub",
+                        "type": "default",
+                        "children": [
+                            {"id": "src/sub/x.py", "text": "x.py", "type": "file"}
+                        ],
+                    }
+                )
+                for child in os.listdir(tmp_path / "src")
+            ],
+        }
+    ]
+
+
+def test_node_kind_is_recorded_at_scan_time(repo_dir):
+    fs = FileSystem.current()
+    node = fs.get_node(Path("src/main.py"))
+    os.remove(repo_dir / "src" / "main.py")
+    assert node.is_file and not node.is_directory
+    assert node.relative_path == "src/main.py"
+    assert node.path_relative_to_cwd == Path("src/main.py")
+
+
+def test_scanners_build_identical_trees(repo_dir):
+    (repo_dir / ".gitignore").write_text("*.log\n")
+    for i in range(3):
+        (repo_dir / f"pkg{i}" / "sub").mkdir(parents=True)
+        (repo_dir / f"pkg{i}" / "sub" / "mod.py").touch()
+        (repo_dir / f"pkg{i}" / "debug.log").touch()
+
+    pathlib_fs = FileSystem(repo_dir, scanner="pathlib")
+    scandir_fs = FileSystem(repo_dir, scanner="scandir", scan_workers=4)
+
+    assert scandir_fs.yaml() == pathlib_fs.yaml()
+    assert scandir_fs.get_directory_tree() == pathlib_fs.get_directory_tree()
+    assert scandir_fs._index.keys() == pathlib_fs._index.keys()
+    assert scandir_fs._mtimes == pathlib_fs._mtimes
+    assert scandir_fs.scan_stats.visited == pathlib_fs.scan_stats.visited
+    assert scandir_fs.scan_stats.pruned == pathlib_fs.scan_stats.pruned == 3
+
+
+def test_invalid_scanner(repo_dir):
+    with pytest.raises(ValueError):
+        FileSystem(repo_dir, scanner="magic")
+
+
+def test_iter_yaml_matches_safe_dump(repo_dir):
+    for name in ["yes", "1.0", "a: b", "null", "ü.txt", "#x", "- item"]:
+        (repo_dir / "src" / name).touch()
+    (repo_dir / "src" / "empty").mkdir()
+    fs = FileSystem(repo_dir)
+    for filter in ["", "main", ".md", "does-not-exist"]:
+        expected = yaml.safe_dump(fs.tree.simple_dict(filter))
+        assert "".join(fs.iter_yaml(filter)) == expected
+
+
+def test_directory_tree_depth_and_paging(repo_dir):
+    for i in range(5):
+        (repo_dir / "src" / f"mod{i}.py").touch()
+    fs = FileSystem(repo_dir)
+
+    top = fs.get_directory_tree(depth=1)
+    assert top[0] == {"id": "src", "text": "src", "type": "default", "children": True}
+    page = fs.get_directory_tree("src", offset=2, limit=3)
+    assert [child["text"] for child in page] == ["mod1.py", "mod2.py", "mod3.py"]
+    children, total = fs.list_children(Path("src"), offset=5)
+    assert [child.name for child in children] == ["mod4.py"]
+    assert total == 6
+    with pytest.raises(FileNotFoundError):
+        fs.list_children(Path("missing"))
@@ -0,0 +1,99 @@
+"""Benchmarks for the file system tree. Run with `RUN_BENCHMARKS=1 pytest -s`."""
+
+import os
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from engine.file_system import FileSystem
+from engine.file_system.file_system_node import FileSystemNode
+
+BENCHMARK_FILE_COUNT = int(os.getenv("BENCHMARK_FILE_COUNT", "100000"))
+FILES_PER_DIRECTORY = 100
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+
+@pytest.fixture(scope="module")
+def generated_tree(tmp_path_factory) -> Path:
+    """Generate a tree of `BENCHMARK_FILE_COUNT` empty files, 100 per directory."""
+    root = tmp_path_factory.mktemp("generated_tree")
+    for i in range(BENCHMARK_FILE_COUNT // FILES_PER_DIRECTORY):
+        directory = root / f"package_{i // 10}" / f"module_{i}"
+        directory.mkdir(parents=True)
+        for j in range(FILES_PER_DIRECTORY):
+            (directory / f"file_{j}.py").touch()
+    return root
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def linear_get_node(node: FileSystemNode, path: Path) -> Optional[FileSystemNode]:
+    """Depth-first scan, as `get_node` worked before the path index."""
+    if node.path == path:
+        return node
+    for child in node.nodes:
+        if child.path == path:
+            return child
+        if child.is_directory:
+            result = linear_get_node(child, path)
+            if result:
+                return result
+    return None
+
+
+def test_get_node_index_vs_linear_scan(generated_tree, settings):
+    settings.REPO_DIR = str(generated_tree)
+    fs, build_time = timed(FileSystem, generated_tree)
+    paths = random.Random(0).sample(fs.list_files(), 20)
+
+    _, index_time = timed(lambda: [fs.get_node(path) for path in paths])
+    _, linear_time = timed(lambda: [linear_get_node(fs.tree, path) for path in paths])
+
+    print(
+        f"\n{BENCHMARK_FILE_COUNT} files: build {build_time:.2f}s, "
+        f"{len(paths)} lookups: index {index_time * 1000:.3f}ms, "
+        f"linear scan {linear_time * 1000:.1f}ms"
+    )
+    assert index_time < linear_time
+
+
+def test_tree_memory_and_build_time(generated_tree, settings):
+    settings.REPO_DIR = str(generated_tree)
+    tracemalloc.start()
+    try:
+        fs, build_time = timed(FileSystem, generated_tree)
+        tree_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    _, yaml_time = timed(fs.yaml)
+
+    print(
+        f"\n{BENCHMARK_FILE_COUNT} files: build {build_time:.2f}s (traced), "
+        f"tree {tree_bytes / 1024 / 1024:.1f} MiB "
+        f"({tree_bytes / len(fs.list_files()):.0f} bytes per file), "
+        f"yaml {yaml_time:.2f}s"
+    )
+
+
+@pytest.mark.parametrize(
+    "scanner, scan_workers", [("pathlib", 1), ("scandir", 1), ("scandir", 8)]
+)
+def test_scanner_build_time(generated_tree, settings, scanner, scan_workers):
+    settings.REPO_DIR = str(generated_tree)
+    fs, build_time = timed(FileSystem, generated_tree, scanner, scan_workers)
+    print(
+        f"\n{BENCHMARK_FILE_COUNT} files: {scanner} scanner with {scan_workers} "
+        f"worker(s) built the tree in {build_time:.2f}s"
+    )
+    assert fs.scan_stats.visited > BENCHMARK_FILE_COUNT
@@ -0,0 +1,67 @@
+import pytest
+
+from engine.file_system import FileSystem
+from engine.file_system.ignore import IgnoreMatcher
+
+
+@pytest.mark.parametrize(
+    "patterns, path, is_directory, ignored",
+    [
+        (["*.pyc"], "a/b/c.pyc", False, True),
+        (["*.pyc"], "a/b/c.py", False, False),
+        (["/build"], "build", True, True),
+        (["/build"], "src/build", True, False),
+        (["docs/build"], "docs/build", True, True),
+        (["docs/build"], "src/docs/build", True, False),
+        (["logs/"], "logs", True, True),
+        (["logs/"], "logs", False, False),
+        (["**/*.pyc"], "c.pyc", False, True),
+        (["a/**/b"], "a/x/y/b", False, True),
+        (["a/**/b"], "a/b", False, True),
+        (["vendor/**"], "vendor/lib.py", False, True),
+        (["*.log", "!keep.log"], "keep.log", False, False),
+        (["*.log", "!keep.log"], "other.log", False, True),
+        (["!keep.log", "*.log"], "keep.log", False, True),
+        (["file[0-9].txt"], "file1.txt", False, True),
+        (["file[!0-9].txt"], "file1.txt", False, False),
+        (["# comment", "", "\\#hash"], "#hash", False, True),
+    ],
+)
+def test_gitignore_semantics(patterns, path, is_directory, ignored):
+    assert IgnoreMatcher(patterns).is_ignored(path, is_directory) == ignored
+
+
+def test_files_in_ignored_directories_cannot_be_reincluded():
+    matcher = IgnoreMatcher(["build/", "!build/keep.txt"])
+    assert matcher.is_ignored("build/keep.txt", False)
+
+
+def test_nested_gitignore_patterns_are_relative_to_their_directory():
+    matcher = IgnoreMatcher()
+    matcher.add_patterns(["/generated", "*.tmp"], base="src")
+    assert matcher.is_ignored("src/generated", True)
+    assert matcher.is_ignored("src/deep/x.tmp", False)
+    assert not matcher.is_ignored("generated", True)
+    assert not matcher.is_ignored("x.tmp", False)
+
+
+def test_build_prunes_ignored_directories(tmp_path, settings):
+    settings.REPO_DIR = str(tmp_path)
+    (tmp_path / ".gitignore").write_text("node_modules/\n*.log\n")
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").touch()
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / ".gitignore").write_text("/local.py\n")
+    (tmp_path / "src" / "local.py").touch()
+    (tmp_path / "src" / "main.py").touch()
+    (tmp_path / "debug.log").touch()
+
+    fs = FileSystem(tmp_path)
+
+    files = sorted(str(p.relative_to(tmp_path)) for p in fs.list_files())
+    assert files == [".gitignore", "src/.gitignore", "src/main.py"]
+    # node_modules, debug.log and src/local.py are pruned, pkg is never visited
+    assert fs.scan_stats.pruned == 3
+    assert fs.scan_stats.visited == 7
+    assert fs.should_be_ignored("node_modules/pkg/index.js")
+    assert not fs.should_be_ignored("src/main.py")
@@ -4,7 +4,7 @@ import pytest
 
 from engine.models.cost_item import CostItem
 from engine.models.task import Task
-from engine.task_scheduler import SchedulerError
+from engine.task_scheduler import RateLimitExceeded, SchedulerError
 
 
 @pytest.fixture(autouse=True)
@@ -58,33 +58,29 @@ def test_task_only_schedules_if_user_can_write(task):
 
 
 @pytest.mark.django_db
-def test_task_would_reach_rate_limit(task):
-    task.github_project = "test_user/test_project"
-    task.save()
-
-    # Create 8 tasks in the last 10 minutes
-    for i in range(18):
-        Task.objects.create(
-            github_project="test_user/test_project",
-            status="scheduled",
-            installation_id=123,
-            github_user="test_user",
-            title="Test Task",
-            user_request="Test Request",
-        )
-
-    assert (
-        not task.would_reach_rate_limit()
-    ), "The task should not reach the rate limit with 9 tasks in the last 10 minutes."
-
-    # Create another task
+def test_task_reaches_rate_limit(task, settings):
+    settings.TASK_RATE_LIMIT = 2
+    task.github.get_repo.return_value.get_collaborator_permission.return_value = "write"
+    task.schedule()
+    # Scheduling the same task again does not count twice
+    task.schedule()
     Task.objects.create(
-        github_project="test_user/test_project",
+        github_project=task.github_project,
         status="scheduled",
         installation_id=123,
-        github_user="test_user",
+        github_user="another_user",
         title="Test Task",
         user_request="Test Request",
-    )
+    ).schedule()
 
-    assert task.would_reach_rate_limit(), "The task should reach the rate limit"
+    with pytest.raises(RateLimitExceeded) as error:
+        Task.objects.create(
+            github_project=task.github_project,
+            status="scheduled",
+            installation_id=123,
+            github_user="another_user",
+            title="Test Task",
+            user_request="Test Request",
+        ).schedule()
+    assert error.value.remaining == 0
+    assert 0 < error.value.retry_after <= settings.TASK_RATE_LIMIT_WINDOW * 60
@@ -0,0 +1,63 @@
+import fakeredis
+import pytest
+import redis
+
+from engine.rate_limit import RateLimiter
+
+
+@pytest.fixture
+def limiter(settings):
+    settings.TASK_RATE_LIMIT = 2
+    settings.TASK_RATE_LIMIT_WINDOW = 10
+    return RateLimiter(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+
+
+def test_allows_tasks_up_to_the_limit(limiter):
+    first = limiter.hit("task-1", project="owner/repo", user="alice")
+    second = limiter.hit("task-2", project="owner/repo", user="alice")
+    third = limiter.hit("task-3", project="owner/repo", user="alice")
+
+    assert (first.allowed, first.remaining) == (True, 1)
+    assert (second.allowed, second.remaining) == (True, 0)
+    assert not third.allowed
+    assert third.remaining == 0
+    assert 599 < third.retry_after <= 600
+    assert third.headers() == {
+        "X-RateLimit-Limit": "2",
+        "X-RateLimit-Remaining": "0",
+        "Retry-After": "600",
+    }
+
+
+def test_limits_projects_and_users_separately(limiter):
+    limiter.hit("task-1", project="owner/repo", user="alice")
+    limiter.hit("task-2", project="owner/repo", user="bob")
+
+    # The project is at its limit, whoever asks
+    assert not limiter.hit("task-3", project="owner/repo", user="carol").allowed
+    # Alice still has quota on other projects, and the rejected task used none
+    assert limiter.hit("task-4", project="owner/other", user="alice").allowed
+    assert limiter.hit("task-5", project="owner/other", user="carol").allowed
+    assert not limiter.hit("task-6", project="owner/third", user="alice").allowed
+
+
+def test_window_slides(limiter, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("engine.rate_limit.time.time", lambda: now[0])
+    limiter.hit("task-1", project="owner/repo", user="alice")
+    now[0] += 300
+    limiter.hit("task-2", project="owner/repo", user="alice")
+
+    rejected = limiter.hit("task-3", project="owner/repo", user="alice")
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(300)
+
+    now[0] += 301
+    assert limiter.hit("task-3", project="owner/repo", user="alice").allowed
+    assert not limiter.hit("task-4", project="owner/repo", user="alice").allowed
+
+
+def test_allows_tasks_when_redis_is_down(settings):
+    limiter = RateLimiter(redis.Redis(host="localhost", port=1))
+
+    assert limiter.hit("task-1", project="owner/repo", user="alice").allowed
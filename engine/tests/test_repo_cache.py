@@ -0,0 +1,311 @@
+import json
+import os
+from unittest.mock import patch
+
+import git
+import pytest
+
+from engine.project import Project
+from engine.repo_cache import (
+    RepoCache,
+    evict_least_recently_used,
+    objects_size,
+    paths_mentioned_in,
+)
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """A local repository standing in for GitHub, with a `main` and a `feature` branch."""
+    repo = git.Repo.init(tmp_path / "origin", initial_branch="main")
+    (tmp_path / "origin" / "README.md").write_text("# Hello")
+    repo.index.add(["README.md"])
+    repo.index.commit("Initial commit")
+    repo.git.branch("feature")
+    return repo
+
+
+@pytest.fixture
+def make_cache(tmp_path, settings, origin):
+    settings.REPO_CACHE_DIR = str(tmp_path / "cache")
+
+    def make(strategy, installation_id=None):
+        cache = RepoCache(
+            "owner/repo",
+            "token",
+            workspace=str(tmp_path / "repo"),
+            strategy=strategy,
+            installation_id=installation_id,
+        )
+        cache.git_repo_url = origin.working_dir
+        return cache
+
+    return make
+
+
+def commit_to_origin(origin, name):
+    path = os.path.join(origin.working_tree_dir, name)
+    with open(path, "w") as f:
+        f.write(name)
+    origin.index.add([name])
+    origin.index.commit(f"Add {name}")
+
+
+@pytest.mark.parametrize("strategy", ["copy", "shared", "worktree"])
+def test_workspace_strategies(make_cache, origin, strategy):
+    cache = make_cache(strategy)
+    cache.setup_workspace()
+    workspace = git.Repo(cache.workspace)
+    assert os.path.exists(os.path.join(cache.workspace, "README.md"))
+
+    # Branches can be created and checked out like in a regular clone
+    workspace.git.checkout("main")
+    workspace.git.checkout("feature")
+    workspace.git.checkout("-b", "pr-pilot/task")
+    assert workspace.remote("origin").url == origin.working_dir
+
+    # The next task starts from a fresh workspace with the latest changes
+    commit_to_origin(origin, "new.txt")
+    cache.setup_workspace()
+    workspace = git.Repo(cache.workspace)
+    workspace.git.checkout("main")
+    assert os.path.exists(os.path.join(cache.workspace, "new.txt"))
+    assert "pr-pilot/task" not in [head.name for head in workspace.heads]
+
+
+def test_worktree_is_removed_from_cache(make_cache):
+    cache = make_cache("worktree")
+    cache.setup_workspace()
+    assert os.path.isfile(os.path.join(cache.workspace, ".git"))
+
+    cache.remove_workspace()
+    assert not os.path.exists(cache.workspace)
+    worktrees = git.Repo(cache.cache_destination).git.worktree("list").splitlines()
+    assert len(worktrees) == 1
+
+
+def test_invalid_strategy(make_cache):
+    with pytest.raises(ValueError):
+        make_cache("magic")
+
+
+@pytest.mark.parametrize(
+    "text, paths",
+    [
+        ("Fix the bug in src/app/main.py", ["src/app"]),
+        ("Update the docs/ and README.md", ["docs"]),
+        ("Look at ./engine/tests/ and engine/tests/x.py", ["engine/tests"]),
+        ("See https://github.com/owner/repo/issues/1", []),
+    ],
+)
+def test_paths_mentioned_in(text, paths):
+    assert paths_mentioned_in(text) == paths
+
+
+@pytest.mark.parametrize("strategy", ["full", "partial", "shallow", "sparse"])
+def test_clone_strategies(make_cache, origin, tmp_path, settings, strategy):
+    settings.REPO_CLONE_DEPTH = 1
+    os.makedirs(os.path.join(origin.working_tree_dir, "src"))
+    commit_to_origin(origin, "src/main.py")
+    commit_to_origin(origin, "other.txt")
+    cache = make_cache("worktree")
+    cache.git_repo_url = f"file://{origin.working_dir}"
+    destination = str(tmp_path / "clone")
+
+    stats = cache.clone(destination, strategy, sparse_paths=["src"])
+
+    assert stats.strategy == strategy
+    assert stats.bytes > 0
+    repo = git.Repo(destination)
+    assert os.path.exists(os.path.join(destination, "src", "main.py"))
+    assert os.path.exists(os.path.join(destination, "other.txt"))
+    shallow = repo.git.rev_parse("--is-shallow-repository") == "true"
+    assert shallow == (strategy == "shallow")
+    repo.git.checkout("feature")
+
+
+def test_sparse_clone_only_checks_out_mentioned_paths(make_cache, origin, tmp_path):
+    os.makedirs(os.path.join(origin.working_tree_dir, "src"))
+    os.makedirs(os.path.join(origin.working_tree_dir, "docs"))
+    commit_to_origin(origin, "src/main.py")
+    commit_to_origin(origin, "docs/guide.md")
+    cache = make_cache("worktree")
+    cache.git_repo_url = f"file://{origin.working_dir}"
+    destination = str(tmp_path / "clone")
+
+    cache.clone(destination, "sparse", sparse_paths=["src"])
+
+    assert os.path.exists(os.path.join(destination, "README.md"))
+    assert os.path.exists(os.path.join(destination, "src", "main.py"))
+    assert not os.path.exists(os.path.join(destination, "docs"))
+
+
+def test_diff_to_main_deepens_shallow_clone(make_cache, origin, tmp_path, settings):
+    origin.git.checkout("feature")
+    commit_to_origin(origin, "feature.txt")
+    origin.git.checkout("main")
+    for i in range(3):
+        commit_to_origin(origin, f"main{i}.txt")
+    settings.REPO_CLONE_DEPTH = 1
+    settings.REPO_DIR = str(tmp_path / "clone")
+    cache = make_cache("worktree")
+    cache.git_repo_url = f"file://{origin.working_dir}"
+    cache.clone(settings.REPO_DIR, "shallow")
+    git.Repo(settings.REPO_DIR).git.checkout("feature")
+
+    diff = Project(name="owner/repo", main_branch="main").get_diff_to_main()
+
+    assert "feature.txt" in diff
+    assert "main0.txt" not in diff
+
+
+def test_private_repos_are_cached_per_installation(make_cache, settings):
+    public = make_cache("worktree")
+    private = make_cache("worktree", installation_id=42)
+    other = make_cache("worktree", installation_id=43)
+    assert (
+        len(
+            {
+                public.cache_destination,
+                private.cache_destination,
+                other.cache_destination,
+            }
+        )
+        == 3
+    )
+
+    private.setup_workspace()
+
+    namespace = os.path.join(settings.REPO_CACHE_DIR, "42")
+    assert os.stat(namespace).st_mode & 0o777 == 0o700
+    assert private.cache_destination.startswith(namespace)
+    assert not other.is_cloned()
+
+
+def test_token_is_never_written_to_git_config():
+    cache = RepoCache("owner/repo", "secret-token", installation_id=42)
+    assert "secret-token" not in cache.git_repo_url
+    assert "secret-token" not in str(cache.git_env)
+    assert cache.git_env["GIT_CONFIG_KEY_0"] == "http.https://github.com/.extraheader"
+
+
+def test_evict_least_recently_used(tmp_path, settings):
+    settings.REPO_CACHE_DIR = str(tmp_path)
+    for name, last_used in [("old", 1), ("current", 2), ("recent", 3)]:
+        git_dir = tmp_path / "public" / "owner" / name / ".git"
+        git_dir.mkdir(parents=True)
+        (git_dir / "pr-pilot-cache.json").write_text(
+            f'{{"last_used": {last_used}, "bytes": 100}}'
+        )
+    (tmp_path / "owner" / "legacy" / ".git").mkdir(parents=True)
+
+    evict_least_recently_used(
+        150, keep=[str(tmp_path / "public" / "owner" / "current")]
+    )
+
+    remaining = [path.name for path in (tmp_path / "public" / "owner").iterdir()]
+    assert sorted(name for name in remaining if "." not in name) == ["current"]
+    assert not (tmp_path / "owner" / "legacy").exists()
+
+
+def test_warm_fetches_cached_repos_only(make_cache, origin):
+    cache = make_cache("worktree")
+    assert not cache.warm(clone=False)
+    assert not cache.is_cloned()
+
+    assert cache.warm()
+    commit_to_origin(origin, "new.txt")
+    assert cache.warm(clone=False)
+
+    cached = git.Repo(cache.cache_destination)
+    assert cached.commit("origin/main") == origin.commit("main")
+    usage_file = os.path.join(cache.cache_destination, ".git", "pr-pilot-cache.json")
+    assert os.path.exists(usage_file)
+
+
+def test_concurrent_tasks_get_separate_workspaces(make_cache, tmp_path, settings):
+    settings.TASK_CONCURRENCY = 2
+    caches = [
+        RepoCache("owner/repo", "token", workspace=str(tmp_path / "tasks" / task_id))
+        for task_id in ("1", "2")
+    ]
+    for cache in caches:
+        # Worktrees would share their branches with the cache
+        assert cache.strategy == "shared"
+        cache.git_repo_url = make_cache("worktree").git_repo_url
+        cache.setup_workspace()
+
+    for i, cache in enumerate(caches):
+        workspace = git.Repo(cache.workspace)
+        workspace.git.checkout("-b", "pr-pilot/task")
+        commit_to_origin(workspace, f"task{i}.txt")
+    caches[0].remove_workspace()
+
+    assert not os.path.exists(caches[0].workspace)
+    workspace = git.Repo(caches[1].workspace)
+    assert workspace.active_branch.name == "pr-pilot/task"
+    assert os.path.exists(os.path.join(caches[1].workspace, "task1.txt"))
+
+
+def test_worktree_removal_keeps_branches_of_others(make_cache):
+    cache = make_cache("worktree")
+    cache.setup_workspace()
+    cached = git.Repo(cache.cache_destination)
+    cached.git.branch("other-task", "origin/main")
+    git.Repo(cache.workspace).git.checkout("-b", "pr-pilot/task")
+
+    cache.remove_workspace()
+
+    branches = [head.name for head in cached.heads]
+    assert "other-task" in branches
+    assert "pr-pilot/task" not in branches
+
+
+def test_busy_worktree_falls_back_to_shared_clone(make_cache, origin, tmp_path):
+    first = make_cache("worktree")
+    first.setup_workspace()
+    git.Repo(first.workspace).git.checkout("main")
+    second = make_cache("worktree")
+    second.workspace = str(tmp_path / "other")
+
+    # Another process would hold the worktree slot the same way
+    commit_to_origin(origin, "new.txt")
+    second.setup_workspace()
+
+    assert os.path.isdir(os.path.join(second.workspace, ".git"))
+    workspace = git.Repo(second.workspace)
+    assert workspace.active_branch.name == "main"
+    assert os.path.exists(os.path.join(second.workspace, "new.txt"))
+    second.remove_workspace()
+    first.remove_workspace()
+    assert make_cache("worktree").hold_worktree() is not None
+
+
+@pytest.mark.parametrize("strategy", ["shared", "worktree"])
+def test_caches_with_workspaces_are_not_evicted(make_cache, strategy):
+    cache = make_cache(strategy)
+    cache.setup_workspace()
+
+    # Workspaces of other processes hold the same lock
+    evict_least_recently_used(0)
+    assert cache.is_cloned()
+
+    cache.remove_workspace()
+    evict_least_recently_used(0)
+    assert not os.path.exists(cache.cache_destination)
+
+
+def test_usage_counts_objects_and_checked_out_files(make_cache, origin):
+    cache = make_cache("worktree")
+    cache.warm()
+    usage_file = os.path.join(cache.cache_destination, ".git", "pr-pilot-cache.json")
+    usage = json.loads(open(usage_file).read())
+    assert usage["checkout_bytes"] == len("# Hello")
+    assert usage["bytes"] == objects_size(cache.cache_destination) + len("# Hello")
+
+    # Later fetches only count the objects again
+    commit_to_origin(origin, "new.txt")
+    with patch.object(RepoCache, "checkout_size") as checkout_size:
+        cache.setup_workspace()
+    checkout_size.assert_not_called()
+    assert json.loads(open(usage_file).read())["last_used"] > usage["last_used"]
@@ -0,0 +1,97 @@
+from unittest.mock import patch
+
+import git
+import pytest
+
+from engine.project import Project
+from engine.repo_session import RepoSession
+
+
+@pytest.fixture
+def repo_dir(tmp_path, settings):
+    repo = git.Repo.init(tmp_path, initial_branch="main")
+    (tmp_path / "README.md").write_text("# Hello")
+    repo.index.add(["README.md"])
+    repo.index.commit("Initial commit")
+    settings.REPO_DIR = str(tmp_path)
+    yield tmp_path
+    RepoSession.discard(tmp_path)
+
+
+def test_current_returns_same_session(repo_dir):
+    session = RepoSession.current()
+    assert RepoSession.current(repo_dir) is session
+    RepoSession.discard()
+    assert RepoSession.existing() is None
+    assert RepoSession.current() is not session
+
+
+def test_project_operations_share_one_session(repo_dir):
+    project = Project(name="owner/repo", main_branch="main")
+    project.create_new_branch("feature")
+    (repo_dir / "new.txt").write_text("new")
+    session = RepoSession.current()
+    Project.commit_changes_of_file("new.txt", "Add new.txt")
+    spawn_count = session.spawn_count
+
+    for _ in range(10):
+        assert project.active_branch == "feature"
+    assert session.spawn_count == spawn_count
+    assert "new.txt" in project.get_diff_to_main()
+
+
+def test_branch_names_are_cached_until_invalidated(repo_dir):
+    session = RepoSession.current()
+    session.git.update_ref("refs/remotes/origin/remote-only", "HEAD")
+    session.git.symbolic_ref("refs/remotes/origin/HEAD", "refs/remotes/origin/main")
+    assert session.branch_names() == {"main", "remote-only"}
+    spawn_count = session.spawn_count
+    session.branch_names()
+    assert session.spawn_count == spawn_count
+
+    Project(name="owner/repo", main_branch="main").create_new_branch("feature")
+
+    assert session.branch_names() == {"main", "remote-only", "feature"}
+    assert session.active_branch == "feature"
+
+
+@pytest.fixture
+def task_events():
+    with patch("engine.project.TaskEvent") as task_event:
+        yield task_event
+
+
+def test_changes_are_committed_together(repo_dir, task_events):
+    (repo_dir / ".gitignore").write_text("*.log\n")
+    (repo_dir / "untouched.txt").write_text("not part of the change")
+    (repo_dir / "a.txt").write_text("a")
+    Project.record_change(["a.txt"], "Add a.txt")
+    (repo_dir / "b.txt").write_text("b")
+    (repo_dir / "debug.log").write_text("ignored")
+    Project.record_change(["/b.txt", "debug.log"], "Add b.txt")
+    (repo_dir / "tmp.txt").write_text("tmp")
+    Project.record_change(["tmp.txt"], "Add tmp.txt")
+    (repo_dir / "tmp.txt").unlink()
+    (repo_dir / "README.md").unlink()
+    Project.record_change(["tmp.txt", "README.md"], "Delete files")
+    repo = RepoSession.current().repo
+    assert repo.head.commit.message == "Initial commit"
+
+    Project.commit_pending_changes()
+
+    commit = repo.head.commit
+    assert commit.message.startswith("Apply 4 changes\n\n- Add a.txt\n- Add b.txt")
+    assert sorted(commit.stats.files) == ["README.md", "a.txt", "b.txt"]
+    assert repo.untracked_files == [".gitignore", "untouched.txt"]
+    task_events.add.assert_called_once()
+    Project.commit_pending_changes()
+    assert repo.head.commit == commit
+
+
+def test_changes_are_committed_immediately_without_batching(
+    repo_dir, task_events, settings
+):
+    settings.COMMIT_BATCHING = False
+    (repo_dir / "a.txt").write_text("a")
+    Project.record_change(["a.txt"], "Add a.txt")
+    assert RepoSession.current().repo.head.commit.message == "Add a.txt"
@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import pytest
+import redis
+
+from engine.models.task import Task
+from engine.repo_warmer import RepoWarmer, busiest_projects, request_warm
+
+
+def create_tasks(github_project, count, installation_id=123):
+    for _ in range(count):
+        Task.objects.create(
+            github_project=github_project,
+            status="completed",
+            installation_id=installation_id,
+            github_user="test_user",
+            title="Test Task",
+            user_request="Test Request",
+        )
+
+
+@pytest.mark.django_db
+def test_busiest_projects_are_ranked_by_task_count():
+    create_tasks("owner/quiet", 1)
+    create_tasks("owner/busy", 3)
+    create_tasks("owner/medium", 2, installation_id=456)
+
+    projects = busiest_projects(limit=2, days=7)
+
+    assert [(p["github_project"], p["installation_id"]) for p in projects] == [
+        ("owner/busy", 123),
+        ("owner/medium", 456),
+    ]
+    assert projects[0]["task_count"] == 3
+
+
+@patch("engine.repo_warmer.get_installation_access_token", return_value="token")
+@patch("engine.repo_warmer.RepoCache")
+def test_warm_uses_installation_namespace_for_private_repos(repo_cache, _):
+    warmer = RepoWarmer()
+    warmer.warm("owner/private", 123, private=True, clone=False)
+    warmer.warm("owner/public", 123, private=False)
+
+    assert repo_cache.call_args_list[0].kwargs["installation_id"] == 123
+    assert repo_cache.call_args_list[1].kwargs["installation_id"] is None
+    repo_cache.return_value.warm.assert_any_call(clone=False)
+    repo_cache.return_value.warm.assert_any_call(clone=True)
+
+
+@patch("engine.repo_warmer.get_installation_access_token", side_effect=Exception)
+def test_warm_failures_do_not_stop_the_warmer(_):
+    RepoWarmer().warm("owner/repo", 123, private=False)
+
+
+@patch("engine.repo_warmer.redis.Redis")
+def test_request_warm_ignores_redis_errors(redis_client):
+    redis_client.return_value.publish.side_effect = redis.ConnectionError
+
+    request_warm("owner/repo", 123, private=False)
+
+    redis_client.return_value.publish.assert_called_once()
@@ -4,7 +4,9 @@ from unittest.mock import patch, MagicMock
 
 import pytest
 
+from engine.event_buffer import buffer_task_events
 from engine.models.task import Task
+from engine.models.task_event import TaskEvent
 from engine.models.task_bill import TaskBill
 from engine.task_engine import TaskEngine, MAX_BRANCH_NAME_LENGTH
 
@@ -68,13 +70,11 @@ def mock_project_class():
 
 
 @pytest.fixture(autouse=True)
-def mock_repo_class():
-    with patch("engine.task_engine.Repo") as MockClass:
-        MockClass.return_value = MagicMock(
-            branches=[],
-            active_branch=MagicMock(name="main"),
-        )
-        yield
+def mock_repo_session():
+    with patch("engine.task_engine.RepoSession") as MockClass:
+        MockClass.current.return_value.branch_names.return_value = set()
+        MockClass.existing.return_value = None
+        yield MockClass
 
 
 @pytest.fixture(autouse=True)
@@ -122,6 +122,12 @@ def test_pr_number_set(task, engine):
     assert task.status == "completed"
     assert task.pr_number == 69
     assert task.branch == "test-branch"
+    # The default branch is checked out by then, the diff is of the working branch
+    engine.project.summarize_diff_to_main.assert_called_once()
+    assert (
+        engine.project.summarize_diff_to_main.call_args.kwargs["branch"]
+        == "test-branch"
+    )
 
 
 @pytest.mark.django_db
@@ -144,19 +150,23 @@ def test_handles_custom_branch_correctly(task, engine, mock_project_class):
         ([], "test-basis"),
         (["origin/test-basis"], "test-basis-1"),
         (["test-basis", "origin/test-basis-1"], "test-basis-2"),
+        (
+            ["test-basis", "test-basis-7", "test-basis-x", "test-basis-1-2"],
+            "test-basis-8",
+        ),
     ],
 )
 def test_create_unique_branch_name__existing_branch(
-    task, existing_branches, expected_branch_name
+    task, mock_repo_session, existing_branches, expected_branch_name
 ):
-    with patch("engine.task_engine.Repo") as MockRepo:
-        mock_repo = MockRepo.return_value
-        mock_repo.refs = existing_branches
+    mock_repo_session.current.return_value.branch_names.return_value = {
+        branch.replace("origin/", "") for branch in existing_branches
+    }
 
-        engine = TaskEngine(task)
-        branch_name = engine.create_unique_branch_name("test-basis")
+    engine = TaskEngine(task)
+    branch_name = engine.create_unique_branch_name("test-basis")
 
-        assert branch_name == expected_branch_name
+    assert branch_name == expected_branch_name
 
 
 @pytest.mark.django_db
@@ -170,11 +180,24 @@ def test_create_unique_branch_name__existing_branch(
     ],
 )
 def test_create_unique_branch_name__slug(task, branch_basis, expected_branch_name):
-    with patch("engine.task_engine.Repo") as MockRepo:
-        mock_repo = MockRepo.return_value
-        mock_repo.branches = []
+    engine = TaskEngine(task)
+    branch_name = engine.create_unique_branch_name(branch_basis)
+
+    assert branch_name == expected_branch_name
+
+
+@pytest.mark.django_db
+def test_status_update_is_broadcast_after_buffered_events(task, engine, settings):
+    settings.TASK_EVENT_FLUSH_SECONDS = 60
+    sent = []
+
+    def record_broadcast(group, data):
+        sent.append(data["type"])
 
-        engine = TaskEngine(task)
-        branch_name = engine.create_unique_branch_name(branch_basis)
+    with patch("engine.models.task_event.broadcast", side_effect=record_broadcast):
+        with patch("engine.task_engine.broadcast", side_effect=record_broadcast):
+            with buffer_task_events(task.id):
+                TaskEvent.add(actor="assistant", action="edit", task_id=task.id)
+                engine.broadcast_status_update("completed")
 
-        assert branch_name == expected_branch_name
+    assert sent == ["event", "status_update"]
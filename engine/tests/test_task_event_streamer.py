@@ -0,0 +1,97 @@
+from datetime import timedelta
+from urllib.parse import urlencode
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.utils import timezone
+
+from engine.models.task_event import TaskEvent
+
+
+@pytest.fixture
+def events(task):
+    start = timezone.now() - timedelta(minutes=1)
+    return [
+        TaskEvent.objects.create(
+            task=task,
+            actor="assistant",
+            action=f"action-{i}",
+            timestamp=start + timedelta(seconds=i),
+        )
+        for i in range(3)
+    ]
+
+
+async def receive_actions(communicator, until="replayed"):
+    actions = []
+    while True:
+        message = await communicator.receive_json()
+        if message["type"] == until:
+            return actions
+        actions.append(message["data"]["action"])
+
+
+@pytest.fixture
+def stream(websocket_client):
+    def connect_to(task, since=""):
+        query = urlencode({"since": since}) if since else ""
+        return websocket_client(f"/ws/tasks/{task.id}/events/", query)
+
+    return connect_to
+
+
+@pytest.mark.django_db(transaction=True)
+def test_live_events_are_forwarded(task, stream):
+    @async_to_sync
+    async def run():
+        communicator = stream(task)
+        await communicator.connect()
+        await get_channel_layer().group_send(
+            str(task.id), TaskEvent(task=task, action="live").as_message()
+        )
+        message = await communicator.receive_json()
+        await communicator.disconnect()
+        return message
+
+    assert run()["data"]["action"] == "live"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_missed_events_are_replayed_before_live_events(task, events, stream):
+    @async_to_sync
+    async def run():
+        communicator = stream(task, since=events[0].id)
+        await communicator.connect()
+        replayed = await receive_actions(communicator)
+        # Broadcast while the client was replaying, it was sent already
+        await get_channel_layer().group_send(str(task.id), events[2].as_message())
+        live = TaskEvent(task=task, action="live")
+        await get_channel_layer().group_send(str(task.id), live.as_message())
+        message = await communicator.receive_json()
+        await communicator.disconnect()
+        return replayed, message["data"]["action"]
+
+    assert run() == (["action-1", "action-2"], "live")
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize(
+    "since,expected",
+    [
+        (lambda events: events[1].timestamp.isoformat(), ["action-1", "action-2"]),
+        (lambda events: "unknown", ["action-0", "action-1", "action-2"]),
+    ],
+)
+def test_replay_since_timestamp_or_unknown_cursor(
+    task, events, since, expected, stream
+):
+    @async_to_sync
+    async def run():
+        communicator = stream(task, since=since(events))
+        await communicator.connect()
+        actions = await receive_actions(communicator)
+        await communicator.disconnect()
+        return actions
+
+    assert run() == expected
@@ -0,0 +1,168 @@
+import fakeredis
+import pytest
+
+from engine.task_queue import TaskQueue
+
+
+@pytest.fixture
+def queue(settings):
+    settings.TASK_VISIBILITY_TIMEOUT_SECONDS = 60
+    settings.TASK_MAX_ATTEMPTS = 2
+    settings.TASK_PRIORITY_CLASSES = ["interactive", "api", "labs"]
+    settings.TASK_FAIR_SHARE_WEIGHTS = {}
+    return TaskQueue(fakeredis.FakeRedis(server=fakeredis.FakeServer()), "tasks")
+
+
+def pop_all(queue):
+    task_ids = []
+    while task_id := queue.pop("worker:0", timeout=0.01):
+        task_ids.append(task_id)
+    return task_ids
+
+
+def test_pop_moves_task_to_processing_list(queue):
+    queue.push("1")
+    queue.push("2")
+
+    assert queue.pop("worker:0", timeout=0.1) == "1"
+
+    assert queue.depth() == {"interactive": 0, "api": 0, "labs": 1}
+    assert queue.redis.lrange("tasks:processing:worker:0", 0, -1) == [b"1"]
+    assert queue.redis.zscore("tasks:deadlines", "1") is not None
+    assert queue.pop("worker:1", timeout=0.1) == "2"
+    assert queue.pop("worker:1", timeout=0.1) is None
+
+
+def test_tasks_queued_before_priority_classes_are_served_first(queue):
+    queue.push("new", priority="interactive")
+    queue.redis.rpush("tasks", "old")
+
+    assert pop_all(queue) == ["old", "new"]
+
+
+def test_higher_priority_classes_are_served_first(queue):
+    queue.push("labs", priority="labs")
+    queue.push("api", priority="api")
+    queue.push("interactive", priority="interactive")
+
+    assert pop_all(queue) == ["interactive", "api", "labs"]
+    with pytest.raises(ValueError):
+        queue.push("4", priority="urgent")
+
+
+def test_users_share_the_queue_fairly(queue):
+    for i in range(3):
+        queue.push(f"batch-{i}", priority="api", user="batch", project="org/batch")
+    queue.push("alice-0", priority="api", user="alice", project="org/app")
+    queue.push("alice-1", priority="api", user="alice", project="org/app")
+
+    assert pop_all(queue) == ["batch-0", "alice-0", "batch-1", "alice-1", "batch-2"]
+
+
+def test_projects_share_the_queue_fairly(queue):
+    for i in range(3):
+        queue.push(f"busy-{i}", priority="api", user=f"user{i}", project="org/busy")
+    queue.push("quiet", priority="api", user="user9", project="org/quiet")
+
+    assert pop_all(queue)[:2] == ["busy-0", "quiet"]
+
+
+def test_weights_shape_the_shares(queue, settings):
+    settings.TASK_FAIR_SHARE_WEIGHTS = {"vip": 2}
+    for i in range(4):
+        queue.push(f"vip-{i}", priority="api", user="vip", project="org/a")
+        queue.push(f"other-{i}", priority="api", user="other", project="org/b")
+
+    assert pop_all(queue)[:6] == [
+        "vip-0",
+        "other-0",
+        "vip-1",
+        "vip-2",
+        "other-1",
+        "vip-3",
+    ]
+
+
+def test_late_flows_do_not_catch_up_on_idle_time(queue):
+    queue.push("a-0", priority="api", user="a", project="p")
+    queue.push("a-1", priority="api", user="a", project="p")
+    pop_all(queue)
+    # Virtual time moved on, a new user does not get a burst of credit
+    queue.push("a-2", priority="api", user="a", project="p")
+    queue.push("b-0", priority="api", user="b", project="q")
+    queue.push("b-1", priority="api", user="b", project="q")
+
+    assert pop_all(queue) == ["a-2", "b-0", "b-1"]
+
+
+def test_status_reports_position(queue):
+    queue.push("labs", priority="labs")
+    queue.push("api-0", priority="api", user="a")
+    queue.push("api-1", priority="api", user="a")
+    queue.push("interactive", priority="interactive")
+
+    status = queue.status("labs")
+    assert (status.priority, status.position, status.depth) == ("labs", 4, 4)
+    assert status.wait_seconds >= 0
+    assert queue.status("api-1").position == 3
+
+    queue.pop("worker:0", timeout=0.1)
+    assert queue.status("interactive") is None
+    assert queue.status("labs").position == 3
+    assert queue.status("unknown") is None
+
+
+def test_ack_forgets_task(queue):
+    queue.push("1")
+    queue.pop("worker:0", timeout=0.1)
+
+    queue.ack("worker:0", "1")
+
+    assert queue.redis.llen("tasks:processing:worker:0") == 0
+    assert queue.redis.zcard("tasks:deadlines") == 0
+    for key in ["owners", "attempts", "class", "score", "enqueued", "member"]:
+        assert not queue.redis.exists(f"tasks:{key}")
+    assert queue.release("worker:0", "1") is None
+
+
+def test_failed_task_is_retried_at_its_place_then_dead_lettered(queue):
+    queue.push("1", priority="api", user="a")
+    queue.pop("worker:0", timeout=0.1)
+    queue.push("2", priority="api", user="b")
+    assert queue.release("worker:0", "1") is True
+    assert queue.status("1").position == 1
+
+    assert queue.pop("worker:1", timeout=0.1) == "1"
+    assert queue.release("worker:1", "1") is False
+
+    assert pop_all(queue) == ["2"]
+    assert queue.dead_letters() == ["1"]
+    assert not queue.redis.hexists("tasks:attempts", "1")
+
+
+def test_expired_tasks_are_delivered_again(queue):
+    queue.push("1")
+    queue.push("2")
+    queue.pop("crashed:0", timeout=0.1)
+    queue.pop("alive:0", timeout=0.1)
+    queue.redis.zadd("tasks:deadlines", {"1": 0, "2": 0})
+    # The live worker extends the deadline of its task in time
+    queue.extend("2")
+
+    assert queue.requeue_expired() == (["1"], [])
+    assert queue.status("1").position == 1
+    assert queue.redis.llen("tasks:processing:crashed:0") == 0
+    assert queue.redis.lrange("tasks:processing:alive:0", 0, -1) == [b"2"]
+    assert queue.requeue_expired() == ([], [])
+
+
+def test_recover_releases_leftovers_of_consumer(queue):
+    for task_id in ["1", "2"]:
+        queue.push(task_id)
+        queue.pop("worker:0", timeout=0.1)
+    queue.release("worker:0", "2")
+    queue.pop("worker:0", timeout=0.1)
+
+    assert queue.recover("worker:0") == (["1"], ["2"])
+    assert pop_all(queue) == ["1"]
+    assert queue.dead_letters() == ["2"]
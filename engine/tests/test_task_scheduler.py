@@ -41,3 +41,17 @@ def test_user_can_write(task, permission, can_write):
         permission
     )
     assert scheduler.user_can_write() == can_write
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "task_type,priority",
+    [
+        ("github_issue", "interactive"),
+        ("github_review_comment", "interactive"),
+        ("standalone", "api"),
+    ],
+)
+def test_priority_class(task, task_type, priority):
+    task.task_type = task_type
+    assert TaskScheduler(task).priority_class() == priority
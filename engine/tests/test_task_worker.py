@@ -0,0 +1,165 @@
+import threading
+import uuid
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+import redis
+from django.core.exceptions import ImproperlyConfigured
+from sentry_sdk import Client, Hub
+
+from engine import task_worker
+from engine.task_worker import TaskWorker
+
+
+@pytest.fixture
+def worker_settings(settings, tmp_path, monkeypatch):
+    settings.TASK_CONCURRENCY = 2
+    settings.TASK_WORKSPACE_ROOT = str(tmp_path / "tasks")
+    settings.WORKER_METRICS_INTERVAL_SECONDS = 0.05
+    monkeypatch.setattr(task_worker, "POLL_TIMEOUT_SECONDS", 0.1)
+    server = fakeredis.FakeServer()
+    with patch(
+        "engine.task_worker.redis.Redis",
+        lambda **kwargs: fakeredis.FakeRedis(server=server),
+    ):
+        yield settings
+
+
+def test_concurrency_requires_task_workspaces(worker_settings):
+    worker_settings.TASK_WORKSPACE_ROOT = None
+    with pytest.raises(ImproperlyConfigured):
+        TaskWorker()
+
+
+def test_slots_run_tasks_concurrently_and_drain(worker_settings):
+    worker = TaskWorker()
+    for task_id in ["1", "2", "3", "4"]:
+        worker.queue.push(task_id)
+    running, max_running, done = 0, 0, []
+    lock = threading.Lock()
+
+    def run_task(task_id):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.2)
+        with lock:
+            running -= 1
+            done.append(task_id)
+        if len(done) == 3:
+            # In-flight tasks are finished, the queue is not drained any further
+            worker.drain()
+
+    with patch.object(worker, "run_task", side_effect=run_task):
+        worker.run()
+
+    assert max_running == 2
+    assert sorted(done) in (["1", "2", "3", "4"], ["1", "2", "3"])
+    metrics = worker.metrics()
+    assert metrics["draining"] and metrics["busy_slots"] == 0
+    assert sum(slot["tasks_run"] for slot in metrics["slots"]) == len(done)
+    assert all(0 < slot["utilisation"] <= 1 for slot in metrics["slots"])
+    assert worker.redis.hget(worker_settings.REDIS_WORKER_METRICS_KEY, worker.name)
+    remaining = worker.redis.llen(worker_settings.REDIS_QUEUE)
+    assert remaining == 4 - len(done)
+
+
+@pytest.mark.django_db
+def test_failing_task_is_retried_and_does_not_stop_slot(worker_settings):
+    worker_settings.TASK_MAX_ATTEMPTS = 2
+    worker = TaskWorker(concurrency=1)
+    failing, working = str(uuid.uuid4()), str(uuid.uuid4())
+    for task_id in [failing, working]:
+        worker.queue.push(task_id)
+    seen = []
+
+    def run_task(task_id):
+        seen.append(task_id)
+        if task_id == failing:
+            raise RuntimeError("boom")
+        worker.drain()
+
+    with patch.object(worker, "run_task", side_effect=run_task):
+        worker.run_slot(worker.slots[0])
+
+    assert seen == [failing, failing, working]
+    assert worker.slots[0].tasks_run == 3
+    assert worker.queue.dead_letters() == [failing]
+
+
+@pytest.mark.django_db
+def test_worker_recovers_its_slots_tasks_on_start(worker_settings):
+    crashed = TaskWorker()
+    crashed.queue.push("1")
+    assert crashed.queue.pop(crashed.slots[1].consumer, timeout=0.1) == "1"
+    # The worker is killed while running the task, and restarted
+    worker = TaskWorker()
+    seen = []
+
+    def run_task(task_id):
+        seen.append(task_id)
+        worker.drain()
+
+    with patch.object(worker, "run_task", side_effect=run_task):
+        worker.run()
+
+    assert seen == ["1"]
+    assert worker.redis.llen(worker.queue.processing_key(worker.slots[1].consumer)) == 0
+
+
+@pytest.mark.django_db
+def test_slot_keeps_running_after_redis_errors(worker_settings, monkeypatch):
+    monkeypatch.setattr(task_worker, "REDIS_RETRY_SECONDS", 0.01)
+    worker = TaskWorker(concurrency=1)
+    worker.queue.push("1")
+    pop = worker.queue.pop
+    errors = [redis.ConnectionError("down")]
+
+    def flaky_pop(*args, **kwargs):
+        if errors:
+            raise errors.pop()
+        return pop(*args, **kwargs)
+
+    def run_task(task_id):
+        worker.drain()
+        raise RuntimeError("boom")
+
+    with patch.object(worker.queue, "pop", side_effect=flaky_pop), patch.object(
+        worker.queue, "release", side_effect=redis.ConnectionError("down")
+    ), patch.object(worker, "run_task", side_effect=run_task):
+        worker.run_slot(worker.slots[0])
+
+    assert worker.slots[0].tasks_run == 1
+
+
+def test_heartbeat_survives_redis_errors(worker_settings):
+    worker = TaskWorker(concurrency=1)
+    worker.slots[0].task_id = "1"
+
+    with patch.object(worker.queue, "extend", side_effect=redis.ConnectionError):
+        worker.heartbeat()
+
+    assert worker.redis.hget(worker_settings.REDIS_WORKER_METRICS_KEY, worker.name)
+
+
+def test_tasks_get_their_own_sentry_scope(worker_settings):
+    worker = TaskWorker(concurrency=1)
+    task = MagicMock(id="1", github_user="user", github_project="owner/repo")
+    task.experiment_set.count.return_value = 0
+    tags = {}
+
+    def run(**kwargs):
+        tags.update(Hub.current.scope._tags)
+
+    with Hub(Client()) as parent, patch(
+        "engine.task_worker.Task.objects.get", return_value=task
+    ), patch("engine.task_worker.TaskEngine") as engine:
+        engine.return_value.run.side_effect = run
+        worker.run_task("1")
+
+    assert tags["task_id"] == "1"
+    # Other slots use the parent's scope, the task's tags never reach it
+    assert "task_id" not in parent.scope._tags
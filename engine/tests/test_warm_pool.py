@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from engine import warm_pool
+from engine.job import ProcessJob
+from engine.warm_pool import ForkedWorkerPool, WarmPool
+from engine.workspace import current_workspace, use_task
+
+
+@pytest.fixture
+def pool(settings):
+    settings.WARM_POOL_OVERFLOW = "process"
+    return WarmPool(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+
+
+def report(pool, worker, busy_slots, slots=2, draining=False, age=0):
+    metrics = {
+        "worker": worker,
+        "busy_slots": busy_slots,
+        "slots": [{"slot": slot} for slot in range(slots)],
+        "draining": draining,
+        "reported_at": time.time() - age,
+    }
+    pool.redis.hset("worker_metrics", worker, json.dumps(metrics))
+
+
+def test_free_slots_are_idle_slots_of_live_workers_minus_queued_tasks(pool, settings):
+    settings.REDIS_WORKER_METRICS_KEY = "worker_metrics"
+    report(pool, "worker-0", busy_slots=1)
+    report(pool, "worker-1", busy_slots=0)
+    report(pool, "draining", busy_slots=0, draining=True)
+    report(pool, "dead", busy_slots=0, age=settings.WORKER_METRICS_INTERVAL_SECONDS * 4)
+    assert pool.free_slots() == 3
+
+    pool.queue.push("queued")
+    assert pool.free_slots() == 2
+
+
+def test_schedule_hands_task_to_idle_pool(pool, settings):
+    settings.REDIS_WORKER_METRICS_KEY = "worker_metrics"
+    report(pool, "worker-0", busy_slots=0, slots=1)
+    task = MagicMock(id="task-1", github_user="alice", github_project="owner/repo")
+
+    with patch.object(ProcessJob, "spawn") as spawn:
+        assert pool.schedule(task, priority="interactive")
+        # The only idle slot is spoken for, the next task overflows into a process
+        assert not pool.schedule(task, priority="interactive")
+
+    assert pool.queue.depth()["interactive"] == 1
+    spawn.assert_called_once()
+
+
+def test_isolated_tasks_always_run_in_a_job(pool, settings):
+    settings.REDIS_WORKER_METRICS_KEY = "worker_metrics"
+    report(pool, "worker-0", busy_slots=0)
+    task = MagicMock(id="task-1", github_user="alice", github_project="owner/repo")
+
+    with patch.object(ProcessJob, "spawn") as spawn:
+        assert not pool.schedule(task, isolated=True)
+
+    spawn.assert_called_once()
+    assert sum(pool.queue.depth().values()) == 0
+
+
+def test_process_job_runs_task_command():
+    task = MagicMock(id="task-1")
+    with patch("engine.job.subprocess.Popen") as popen:
+        ProcessJob(task).spawn()
+
+    command = popen.call_args.args[0]
+    assert command[-2:] == ["run_task", "task-1"]
+    assert popen.call_args.kwargs["env"]["TASK_ID"] == "task-1"
+
+
+def record_start(path):
+    def run_worker(name, concurrency):
+        with open(path, "a") as f:
+            f.write(f"{name}\n")
+
+    return run_worker
+
+
+def test_forked_pool_restarts_workers_until_drained(monkeypatch, tmp_path, settings):
+    settings.TASK_WORKSPACE_ROOT = str(tmp_path / "tasks")
+    started = tmp_path / "started"
+    monkeypatch.setattr(warm_pool, "run_worker", record_start(started))
+    monkeypatch.setattr(warm_pool, "RESTART_DELAY_SECONDS", 0.05)
+    pool = ForkedWorkerPool(processes=2, concurrency=1)
+    timer = threading.Timer(0.5, pool.drain)
+    timer.start()
+
+    pool.run()
+
+    names = started.read_text().split()
+    # Both workers exited right away, and were started again under the same name
+    assert names.count(f"{pool.name}-0") > 1
+    assert names.count(f"{pool.name}-1") > 1
+    assert not any(worker.is_alive() for worker in pool.workers)
+
+
+def test_forked_pool_requires_workspace_root(settings):
+    settings.TASK_WORKSPACE_ROOT = None
+    with pytest.raises(ImproperlyConfigured):
+        ForkedWorkerPool(processes=2, concurrency=1)
+    assert ForkedWorkerPool(processes=1, concurrency=1).processes == 1
+
+
+def test_forked_workers_run_tasks_in_separate_workspaces(
+    monkeypatch, tmp_path, settings
+):
+    settings.TASK_WORKSPACE_ROOT = str(tmp_path / "tasks")
+    workspaces = tmp_path / "workspaces"
+
+    def run_worker(name, concurrency):
+        # What a slot of the worker does around TaskEngine.run
+        with use_task(f"task-of-{name}"):
+            with open(workspaces, "a") as f:
+                f.write(f"{current_workspace()}\n")
+
+    monkeypatch.setattr(warm_pool, "run_worker", run_worker)
+    pool = ForkedWorkerPool(processes=2, concurrency=1)
+    workers = [pool.start(index) for index in range(pool.processes)]
+    for worker in workers:
+        worker.join(5)
+
+    paths = workspaces.read_text().split()
+    assert len(set(paths)) == 2
+    assert all(path.startswith(settings.TASK_WORKSPACE_ROOT) for path in paths)
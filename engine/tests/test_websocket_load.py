@@ -0,0 +1,82 @@
+"""Load test of the task event stream. Run with `RUN_BENCHMARKS=1 pytest -s`."""
+
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from engine.models.task_event import TaskEvent
+
+BENCHMARK_SOCKET_COUNT = int(os.getenv("BENCHMARK_SOCKET_COUNT", "1000"))
+BENCHMARK_MESSAGE_COUNT = int(os.getenv("BENCHMARK_MESSAGE_COUNT", "20"))
+# Use a real Redis channel layer instead of the in-memory stand-in
+BENCHMARK_REDIS_HOST = os.getenv("BENCHMARK_REDIS_HOST")
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("RUN_BENCHMARKS"), reason="Set RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def test_event_fan_out_latency(websocket_client, settings):
+    if BENCHMARK_REDIS_HOST:
+        settings.CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {"hosts": [(BENCHMARK_REDIS_HOST, 6379)]},
+            }
+        }
+    task_id = str(uuid.uuid4())
+
+    @async_to_sync
+    async def run():
+        clients = [
+            websocket_client(f"/ws/tasks/{task_id}/events/")
+            for _ in range(BENCHMARK_SOCKET_COUNT)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*(client.connect(timeout=60) for client in clients))
+        connect_time = time.perf_counter() - start
+
+        latencies = []
+        for i in range(BENCHMARK_MESSAGE_COUNT):
+            message = TaskEvent(task_id=task_id, action=f"action-{i}").as_message()
+            sent = time.perf_counter()
+            await get_channel_layer().group_send(task_id, message)
+
+            async def receive(client):
+                received = await client.receive_json(timeout=60)
+                assert received["data"]["action"] == f"action-{i}"
+                return time.perf_counter() - sent
+
+            latencies.append(await asyncio.gather(*map(receive, clients)))
+        await asyncio.gather(*(client.disconnect() for client in clients))
+        return connect_time, latencies
+
+    connect_time, latencies = run()
+    # Time until the last socket received a message, and per socket
+    fan_out = [max(message) * 1000 for message in latencies]
+    per_socket = [latency * 1000 for message in latencies for latency in message]
+    layer = "redis" if BENCHMARK_REDIS_HOST else "in-memory"
+    print(
+        f"\n{BENCHMARK_SOCKET_COUNT} sockets on the {layer} channel layer, "
+        f"connected in {connect_time:.2f}s"
+    )
+    print(
+        f"Fan-out of {BENCHMARK_MESSAGE_COUNT} messages to all sockets: "
+        f"median {statistics.median(fan_out):.1f} ms, max {max(fan_out):.1f} ms"
+    )
+    print(
+        f"Latency per socket: p50 {percentile(per_socket, 0.5):.1f} ms, "
+        f"p99 {percentile(per_socket, 0.99):.1f} ms"
+    )
+    assert len(per_socket) == BENCHMARK_SOCKET_COUNT * BENCHMARK_MESSAGE_COUNT
@@ -0,0 +1,118 @@
+import contextvars
+import threading
+
+import pytest
+
+from engine import workspace
+from engine.file_system import FileSystem
+from engine.workspace import (
+    current_task_id,
+    current_workspace,
+    is_shared_workspace,
+    task_slot,
+    use_task,
+    use_workspace,
+    workspace_for_task,
+)
+
+
+def test_current_workspace_defaults_to_repo_dir(settings, tmp_path):
+    settings.REPO_DIR = str(tmp_path)
+    assert current_workspace() == str(tmp_path)
+
+    with use_workspace(str(tmp_path / "task")):
+        assert current_workspace() == str(tmp_path / "task")
+    assert current_workspace() == str(tmp_path)
+
+
+def test_workspace_for_task(settings, tmp_path):
+    settings.REPO_DIR = str(tmp_path / "repo")
+    settings.TASK_WORKSPACE_ROOT = None
+    assert workspace_for_task("abc") == str(tmp_path / "repo")
+    assert is_shared_workspace(workspace_for_task("abc"))
+
+    settings.TASK_WORKSPACE_ROOT = str(tmp_path / "tasks")
+    assert workspace_for_task("abc") == str(tmp_path / "tasks" / "abc")
+    assert not is_shared_workspace(workspace_for_task("abc"))
+
+
+def test_tasks_see_their_own_file_system(tmp_path):
+    roots = []
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.txt").write_text(name)
+        roots.append(str(tmp_path / name))
+    seen = {}
+
+    def work(root):
+        with use_workspace(root):
+            seen[root] = str(FileSystem.current().yaml())
+
+    threads = [
+        threading.Thread(target=contextvars.copy_context().run, args=(work, root))
+        for root in roots
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert "one.txt" in seen[roots[0]] and "two.txt" not in seen[roots[0]]
+    assert "two.txt" in seen[roots[1]] and "one.txt" not in seen[roots[1]]
+    for root in roots:
+        FileSystem.discard(root)
+
+
+@pytest.fixture
+def task_slots(settings, monkeypatch):
+    settings.TASK_CONCURRENCY = 2
+    monkeypatch.setattr(workspace, "_task_slots", None)
+
+
+def test_task_slots_limit_concurrency(task_slots):
+    running, max_running = 0, 0
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def run_task():
+        nonlocal running, max_running
+        with task_slot():
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            release.wait(5)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=run_task) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert max_running == 2
+
+
+def test_tasks_have_their_own_task_id(settings, tmp_path):
+    settings.TASK_ID = None
+    settings.TASK_WORKSPACE_ROOT = str(tmp_path)
+    seen = {}
+    both_running = threading.Barrier(2)
+
+    def run_task(task_id):
+        with use_task(task_id):
+            both_running.wait(5)
+            seen[task_id] = (current_task_id(), current_workspace())
+
+    threads = [threading.Thread(target=run_task, args=(i,)) for i in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert seen == {
+        "a": ("a", str(tmp_path / "a")),
+        "b": ("b", str(tmp_path / "b")),
+    }
+    assert current_task_id() is None
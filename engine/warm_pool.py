@@ -0,0 +1,166 @@
+import json
+import logging
+import multiprocessing
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+from typing import List
+
+import redis
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from engine.job import KubernetesJob, ProcessJob
+from engine.task_queue import TaskQueue
+
+logger = logging.getLogger(__name__)
+
+# Seconds a forked worker that exited is given before it is started again
+RESTART_DELAY_SECONDS = 1
+
+
+class WarmPool:
+    """
+    Pool of warm task workers: processes that have Django set up, LangChain imported
+    and the repository cache at hand, waiting on the `TaskQueue`.
+
+    Short tasks are dominated by the start-up of a new job, so tasks are handed to the
+    pool while it has idle slots. Tasks that arrive when all slots are busy, or that
+    must run in isolation, are spawned as one-off jobs instead, so they do not wait.
+    """
+
+    def __init__(self, connection: redis.Redis = None):
+        """
+        :param connection: Redis connection, defaults to `REDIS_HOST`
+        """
+        self.redis = connection or redis.Redis(
+            host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
+        )
+        self.queue = TaskQueue(self.redis)
+
+    def workers(self) -> List[dict]:
+        """Metrics of the workers that recently reported and take new tasks."""
+        stale = time.time() - 3 * settings.WORKER_METRICS_INTERVAL_SECONDS
+        workers = []
+        for metrics in self.redis.hvals(settings.REDIS_WORKER_METRICS_KEY):
+            metrics = json.loads(metrics)
+            if metrics["reported_at"] >= stale and not metrics["draining"]:
+                workers.append(metrics)
+        return workers
+
+    def free_slots(self) -> int:
+        """Idle slots of the pool that no queued task is waiting for."""
+        idle = sum(
+            len(worker["slots"]) - worker["busy_slots"] for worker in self.workers()
+        )
+        waiting = sum(self.queue.depth().values()) + self.redis.llen(self.queue.name)
+        return idle - waiting
+
+    def overflow_job(self, task):
+        """One-off job for a task the pool does not take, see `WARM_POOL_OVERFLOW`."""
+        if settings.WARM_POOL_OVERFLOW == "process":
+            return ProcessJob(task)
+        return KubernetesJob(task)
+
+    def schedule(self, task, priority: str = None, isolated: bool = False) -> bool:
+        """
+        Queue a task for the pool, or spawn a job for it.
+        :param task: Task to run
+        :param priority: Priority class of the task in the queue
+        :param isolated: Run the task in a job of its own, whatever the pool's load
+        :return: Whether the task was handed to the pool
+        """
+        try:
+            warm = not isolated and self.free_slots() > 0
+        except redis.RedisError:
+            logger.exception("Failed to look up the warm pool, spawning a job")
+            warm = False
+        if warm:
+            logger.info(f"Scheduling task on the warm pool: {task.id}")
+            self.queue.push(
+                task.id,
+                priority=priority,
+                user=task.github_user,
+                project=task.github_project,
+            )
+        else:
+            logger.info(f"Spawning a job for task {task.id}")
+            self.overflow_job(task).spawn()
+        return warm
+
+
+def run_worker(name: str, concurrency: int):
+    from engine.task_worker import TaskWorker
+
+    # Forked with the handler of the pool, the worker drains on SIGTERM by itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    TaskWorker(concurrency=concurrency, name=name).run()
+
+
+class ForkedWorkerPool:
+    """
+    Local stand-in for the warm pool: task workers forked from one process that
+    imported everything once. Workers that die are started again, so the pool keeps
+    its size. On SIGTERM, the workers finish their running tasks and the pool exits.
+    """
+
+    def __init__(self, processes: int = None, concurrency: int = None):
+        """
+        :param processes: Number of worker processes, defaults to `WARM_POOL_PROCESSES`
+        :param concurrency: Slots per worker, defaults to `TASK_CONCURRENCY`
+        """
+        self.processes = processes or settings.WARM_POOL_PROCESSES
+        self.concurrency = concurrency or settings.TASK_CONCURRENCY
+        if self.processes > 1 and not settings.TASK_WORKSPACE_ROOT:
+            # Workers would all run their tasks in REPO_DIR
+            raise ImproperlyConfigured(
+                "TASK_WORKSPACE_ROOT must be set to fork more than one task worker"
+            )
+        self.name = socket.gethostname()
+        self.context = multiprocessing.get_context("fork")
+        self.workers: List[multiprocessing.Process] = []
+        self.draining = False
+
+    def start(self, index: int) -> multiprocessing.Process:
+        # Stable names, so a restarted worker recovers the tasks of its predecessor
+        process = self.context.Process(
+            target=run_worker,
+            args=(f"{self.name}-{index}", self.concurrency),
+            name=f"worker-{index}",
+        )
+        process.start()
+        return process
+
+    def run(self):
+        # Import the task engine before forking, so every worker starts warm
+        import engine.task_worker  # noqa: F401
+
+        # Forked workers must not share the database connections of the parent
+        connections.close_all()
+        logger.info(f"Forking {self.processes} task workers")
+        signal.signal(signal.SIGTERM, self.drain)
+        self.workers = [self.start(index) for index in range(self.processes)]
+        while True:
+            alive = [worker for worker in self.workers if worker.is_alive()]
+            if self.draining and not alive:
+                break
+            wait([worker.sentinel for worker in alive], timeout=1)
+            for index, worker in enumerate(self.workers):
+                if not worker.is_alive() and not self.draining:
+                    logger.warning(
+                        f"Task worker {worker.name} exited with {worker.exitcode}, "
+                        f"starting it again"
+                    )
+                    time.sleep(RESTART_DELAY_SECONDS)
+                    self.workers[index] = self.start(index)
+        logger.info("All task workers stopped")
+
+    def drain(self, signum=None, frame=None):
+        """Let the workers finish their running tasks, and stop."""
+        logger.info("Draining the task workers")
+        self.draining = True
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# ID of the task running in the current context
+_task_id: ContextVar[Optional[str]] = ContextVar("task_id", default=None)
+# Root directory of the workspace of the task running in the current context
+_workspace_root: ContextVar[Optional[str]] = ContextVar("workspace_root", default=None)
+
+_task_slots: Optional[threading.BoundedSemaphore] = None
+_task_slots_lock = threading.Lock()
+
+
+def current_task_id() -> Optional[str]:
+    """ID of the running task, `settings.TASK_ID` outside of `use_task`."""
+    return _task_id.get() or settings.TASK_ID
+
+
+def current_workspace() -> str:
+    """Workspace root of the running task, `settings.REPO_DIR` outside of a task."""
+    return _workspace_root.get() or str(settings.REPO_DIR)
+
+
+def workspace_for_task(task_id) -> str:
+    """
+    Workspace root of a task.
+
+    With `TASK_WORKSPACE_ROOT`, every task gets its own directory below it, so tasks
+    can run side by side in one process. Otherwise all tasks share `REPO_DIR`.
+    :param task_id: ID of the task
+    """
+    if settings.TASK_WORKSPACE_ROOT:
+        return os.path.join(settings.TASK_WORKSPACE_ROOT, str(task_id))
+    return str(settings.REPO_DIR)
+
+
+def is_shared_workspace(root: str) -> bool:
+    """Whether tasks take turns in this workspace, instead of owning it."""
+    return os.path.realpath(root) == os.path.realpath(settings.REPO_DIR)
+
+
+@contextmanager
+def use_workspace(root: str):
+    """
+    Resolve all workspace paths against `root` in this context.
+
+    Context variables are not inherited by new threads, so threads working in the
+    workspace must be started with `contextvars.copy_context().run`.
+    :param root: Workspace root of the task
+    """
+    token = _workspace_root.set(str(root))
+    try:
+        yield root
+    finally:
+        _workspace_root.reset(token)
+
+
+@contextmanager
+def use_task(task_id):
+    """
+    Run a task in this context: `Task.current()`, task events and workspace paths
+    resolve to it, whatever other tasks run in the same process.
+    :param task_id: ID of the task
+    """
+    token = _task_id.set(str(task_id))
+    try:
+        with use_workspace(workspace_for_task(task_id)) as root:
+            yield root
+    finally:
+        _task_id.reset(token)
+
+
+@contextmanager
+def task_slot():
+    """Wait for one of the `TASK_CONCURRENCY` slots of this process to run a task."""
+    global _task_slots
+    with _task_slots_lock:
+        if _task_slots is None:
+            _task_slots = threading.BoundedSemaphore(settings.TASK_CONCURRENCY)
+    if not _task_slots.acquire(blocking=False):
+        logger.info(
+            f"All {settings.TASK_CONCURRENCY} task slots are busy, waiting for one"
+        )
+        _task_slots.acquire()
+    try:
+        yield
+    finally:
+        _task_slots.release()
@@ -13,26 +13,18 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
-from django.urls import re_path
-
-from engine.task_event_streamer import TaskEventStreamConsumer
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "prpilot.settings")
+# Set up Django before the consumers import the models
+django_asgi_app = get_asgi_application()
+
+from prpilot.urls import websocket_urlpatterns  # noqa: E402
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": django_asgi_app,
         "websocket": AllowedHostsOriginValidator(
-            AuthMiddlewareStack(
-                URLRouter(
-                    [
-                        re_path(
-                            r"^ws/tasks/(?P<pk>[0-9a-f-]+)/events/$",
-                            TaskEventStreamConsumer.as_asgi(),
-                        ),
-                    ]
-                )
-            )
+            AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
         ),
     }
 )
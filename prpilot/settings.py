@@ -229,18 +229,53 @@ PRIVATE_KEY_PATH = os.getenv(
 )
 TASK_ID = os.getenv("TASK_ID")
 REPO_DIR = os.getenv("REPO_DIR", "/repo")
+# Give every task its own workspace below this directory, instead of sharing REPO_DIR
+TASK_WORKSPACE_ROOT = os.getenv("TASK_WORKSPACE_ROOT")
+# Number of tasks a worker process runs at the same time
+TASK_CONCURRENCY = int(os.getenv("TASK_CONCURRENCY", "1"))
+# Task events are written in batches, every TASK_EVENT_FLUSH_SECONDS or as soon as
+# TASK_EVENT_BUFFER_SIZE events are waiting
+TASK_EVENT_FLUSH_SECONDS = float(os.getenv("TASK_EVENT_FLUSH_SECONDS", "1"))
+TASK_EVENT_BUFFER_SIZE = int(os.getenv("TASK_EVENT_BUFFER_SIZE", "50"))
 REPO_CACHE_DIR = os.getenv("REPO_CACHE_DIR", "/repo_cache")
+REPO_CACHE_ENABLED = os.getenv("REPO_CACHE_ENABLED", "true").lower() == "true"
+# Least recently used repositories are evicted from the cache beyond this size
+REPO_CACHE_MAX_SIZE_GB = float(os.getenv("REPO_CACHE_MAX_SIZE_GB", "15"))
+# How workspaces are created from the repo cache: `worktree`, `shared` or `copy`
+REPO_WORKSPACE_STRATEGY = os.getenv("REPO_WORKSPACE_STRATEGY", "worktree")
+# How repositories are cloned when they are not cached: `full`, `partial`, `shallow`
+# or `sparse`. Can be overridden per repository.
+REPO_CLONE_STRATEGY = os.getenv("REPO_CLONE_STRATEGY", "full")
+REPO_CLONE_DEPTH = int(os.getenv("REPO_CLONE_DEPTH", "50"))
 MAX_FILE_LINES = 600
 MAX_FILE_SEARCH_RESULTS = 50
 MAX_READ_FILES = 5
+MAX_LIST_DIRECTORY_ENTRIES = 200
+# Length of the description and of the diff summary used to generate PR titles
+PR_INFO_MAX_CHARS = 4000
+# Commit the agent's file changes together at the end of its turn, or at this interval
+COMMIT_BATCHING = os.getenv("COMMIT_BATCHING", "true").lower() == "true"
+COMMIT_BATCH_INTERVAL_SECONDS = int(os.getenv("COMMIT_BATCH_INTERVAL_SECONDS", "0"))
 IGNORE_FILE_PATH = Path(os.getcwd()) / ".pilotignore"
+# How the file system tree is scanned: `scandir` (parallel) or `pathlib`
+FILE_SYSTEM_SCANNER = os.getenv("FILE_SYSTEM_SCANNER", "scandir")
+FILE_SYSTEM_SCAN_WORKERS = int(os.getenv("FILE_SYSTEM_SCAN_WORKERS", "8"))
 CREDIT_MULTIPLIER = 2
 OPEN_SOURCE_CONTRIBUTOR_THRESHOLD = 5
 OPEN_SOURCE_CONTRIBUTOR_DISCOUNT_PERCENT = 20.0
 OPEN_SOURCE_COMMITS_THRESHOLD = 10
 APPEND_SLASH = True  # Default is True
-# Defines where jobs are executed: kubernetes, thread or log
+# Defines where jobs are executed: kubernetes, warm_pool, redis, thread or log
 JOB_STRATEGY = os.getenv("JOB_STRATEGY", "kubernetes")
+# With the warm_pool strategy, tasks the pool has no idle slot for run in a one-off
+# kubernetes job or, locally, in a new process
+WARM_POOL_OVERFLOW = os.getenv("WARM_POOL_OVERFLOW", "kubernetes")
+# Number of worker processes forked by the run_warm_pool command
+WARM_POOL_PROCESSES = int(os.getenv("WARM_POOL_PROCESSES", "2"))
+# Projects whose tasks always run in a one-off job, never on the warm pool
+TASK_ISOLATED_PROJECTS = [
+    project for project in os.getenv("TASK_ISOLATED_PROJECTS", "").split(",") if project
+]
 
 license_json = json.loads(Path(BASE_DIR / "licenses.json").read_text())
 OSI_APPROVED_LICENSES = [
@@ -310,12 +345,36 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
 ]
 CORS_ALLOW_ALL_ORIGINS = True
 
-TASK_RATE_LIMIT_WINDOW = 10  # Minutes
-TASK_RATE_LIMIT = 20  # per 10 minutes
+# Tasks per project and per user within the window
+TASK_RATE_LIMIT_WINDOW = int(os.getenv("TASK_RATE_LIMIT_WINDOW", "10"))  # Minutes
+TASK_RATE_LIMIT = int(os.getenv("TASK_RATE_LIMIT", "20"))  # per window
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = os.getenv("REDIS_PORT", 6379)
 REDIS_QUEUE = os.getenv("REDIS_QUEUE", "tasks")
+# Tasks are delivered to another worker if theirs does not report back in time, and
+# given up after TASK_MAX_ATTEMPTS deliveries
+TASK_VISIBILITY_TIMEOUT_SECONDS = int(
+    os.getenv("TASK_VISIBILITY_TIMEOUT_SECONDS", "300")
+)
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+# Queued tasks are served by priority class, highest first
+TASK_PRIORITY_CLASSES = ["interactive", "api", "labs"]
+# Within a class, users and projects share the workers in proportion to their weight,
+# e.g. {"my-org/busy-repo": 0.5}. The default weight is 1.
+TASK_FAIR_SHARE_WEIGHTS = json.loads(os.getenv("TASK_FAIR_SHARE_WEIGHTS", "{}"))
+# Task workers report the utilisation of their slots in this hash, one field per worker
+REDIS_WORKER_METRICS_KEY = os.getenv("REDIS_WORKER_METRICS_KEY", "worker_metrics")
+WORKER_METRICS_INTERVAL_SECONDS = int(
+    os.getenv("WORKER_METRICS_INTERVAL_SECONDS", "60")
+)
+# Channel on which pushes are announced to the repo cache warmers of the workers
+REDIS_WARM_CHANNEL = os.getenv("REDIS_WARM_CHANNEL", "repo_cache_warm")
+# The repositories with the most tasks in the last REPO_WARM_LOOKBACK_DAYS are
+# warmed every REPO_WARM_INTERVAL_MINUTES
+REPO_WARM_INTERVAL_MINUTES = int(os.getenv("REPO_WARM_INTERVAL_MINUTES", "15"))
+REPO_WARM_LOOKBACK_DAYS = int(os.getenv("REPO_WARM_LOOKBACK_DAYS", "7"))
+REPO_WARM_TOP_REPOS = int(os.getenv("REPO_WARM_TOP_REPOS", "20"))
 
 DEFAULT_GPT_MODEL = "gpt-4o"
 
@@ -347,5 +406,10 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Messages to the channel layer that may wait for Redis, before senders are slowed down
+BROADCAST_MAX_PENDING = int(os.getenv("BROADCAST_MAX_PENDING", "1000"))
+# Seconds a sender waits for room before its message is dropped
+BROADCAST_TIMEOUT_SECONDS = float(os.getenv("BROADCAST_TIMEOUT_SECONDS", "1"))
+
 ASGI_APPLICATION = "prpilot.asgi.application"
 LABS_GITHUB_TOKEN = os.getenv("LABS_GITHUB_TOKEN")
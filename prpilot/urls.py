@@ -46,7 +46,11 @@ urlpatterns = [
     path("", home, name="home"),
 ]
 
+# Served by the ASGI application, see prpilot/asgi.py
 websocket_urlpatterns = [
+    re_path(
+        r"^ws/tasks/(?P<pk>[0-9a-f-]+)/events/$", TaskEventStreamConsumer.as_asgi()
+    ),
     re_path(
         r"^ws/tasks/(?P<pk>[0-9a-f-]+)/stream/$", TaskEventStreamConsumer.as_asgi()
     ),
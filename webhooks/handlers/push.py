@@ -0,0 +1,22 @@
+import logging
+
+from django.http import JsonResponse
+
+from engine.repo_warmer import request_warm
+
+logger = logging.getLogger(__name__)
+
+
+def handle_push(payload):
+    repository = payload["repository"]
+    if "installation" not in payload:
+        return JsonResponse({"status": "ignored", "message": "Not an app installation"})
+    logger.info(f"Push to {repository['full_name']}, requesting repo cache warm-up")
+    request_warm(
+        repository["full_name"],
+        payload["installation"]["id"],
+        repository["private"],
+    )
+    return JsonResponse(
+        {"status": "success", "message": "Repo cache warm-up requested"}
+    )
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webhooks", "0004_githubrepository_skills_file_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="githubrepository",
+            name="clone_strategy",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("full", "Full clone"),
+                    ("partial", "Partial clone, file contents are fetched on demand"),
+                    ("shallow", "Shallow clone, history is fetched on demand"),
+                    ("sparse", "Sparse checkout of the paths mentioned in the task"),
+                ],
+                max_length=16,
+                null=True,
+            ),
+        ),
+    ]
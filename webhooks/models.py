@@ -20,6 +20,18 @@ class GithubRepository(models.Model):
     )
     knowledge = models.TextField(null=True, blank=True)
     skills_file_hash = models.CharField(max_length=255, null=True, blank=True)
+    # How the repository is cloned when it is not cached, defaults to REPO_CLONE_STRATEGY
+    clone_strategy = models.CharField(
+        max_length=16,
+        null=True,
+        blank=True,
+        choices=[
+            ("full", "Full clone"),
+            ("partial", "Partial clone, file contents are fetched on demand"),
+            ("shallow", "Shallow clone, history is fetched on demand"),
+            ("sparse", "Sparse checkout of the paths mentioned in the task"),
+        ],
+    )
 
 
 class GitHubAppInstallation(models.Model):
@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 import pytest
 
 from api.models import UserAPIKey
+from webhooks.handlers.push import handle_push
 from webhooks.handlers.util import install_repository
 from webhooks.models import GitHubAppInstallation, GitHubAccount
 
@@ -44,3 +45,14 @@ def test_install_repository_truncates_api_key_name(mock_github):
     # Verify the API key name was truncated
     api_key = UserAPIKey.objects.last()
     assert len(api_key.name) <= 49, "API key name should be truncated to 49 characters"
+
+
+@patch("webhooks.handlers.push.request_warm")
+def test_push_requests_repo_cache_warm_up(request_warm):
+    payload = {
+        "repository": {"full_name": "owner/repo", "private": True},
+        "installation": {"id": 123},
+    }
+    response = handle_push(payload)
+    assert response.status_code == 200
+    request_warm.assert_called_once_with("owner/repo", 123, True)
@@ -17,6 +17,7 @@ from webhooks.handlers.handle_issue_comment import handle_issue_comment
 from webhooks.handlers.pull_request_review_comment import (
     handle_pull_request_review_comment,
 )
+from webhooks.handlers.push import handle_push
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +108,10 @@ def github_webhook(request):
             # The user changed which repositories the app can access, need to update our DB
             return handle_app_installation_change(payload)
 
+        elif event == "push":
+            # Keep the repo caches of the workers fresh
+            return handle_push(payload)
+
         else:
             logger.info(f"Received unhandled event: {event}")
             return JsonResponse({"status": "ignored", "message": "Unhandled event"})